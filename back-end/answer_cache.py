@@ -0,0 +1,152 @@
+import hashlib
+import json
+import mmap
+import os
+import threading
+import time
+from collections import OrderedDict
+from retrieval_cache import normalize_question
+import metrics
+
+# Replay stored answer audio for repeated questions instead of generating it again
+ANSWER_CACHE = os.environ.get("ANSWER_CACHE", "true").lower() in ("1", "true", "yes")
+ANSWER_CACHE_DIR = os.environ.get("ANSWER_CACHE_DIR", "./data/answer_cache")
+ANSWER_CACHE_MAX_BYTES = int(os.environ.get("ANSWER_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+INDEX_FILE = "index.json"
+
+ANSWER_CACHE_HITS = metrics.answer_cache_requests.child("hit")
+ANSWER_CACHE_MISSES = metrics.answer_cache_requests.child("miss")
+
+def answer_key(question, collection_version):
+    """Cache key: the normalized question under one version of the collection."""
+    return f"{collection_version}\n{normalize_question(question)}"
+
+class AnswerAudioCache:
+    """
+    On-disk store of final answer audio (PCM16 at the client rate), one file
+    per answer, memory-mapped on replay. Entries are kept in LRU order and
+    evicted once the total exceeds max_bytes. The index (key, file, size,
+    sample rate) is written to index.json on every put or eviction so the
+    cache survives restarts; recency across restarts follows last use.
+    """
+
+    def __init__(self, directory=ANSWER_CACHE_DIR, max_bytes=ANSWER_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # key -> {"file", "size", "sample_rate", "last_used"}, in LRU order
+        self._entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.bytes_served = 0
+        self._loaded = False
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(os.path.join(self.directory, INDEX_FILE)) as f:
+                entries = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        for key, entry in sorted(entries.items(), key=lambda item: item[1]["last_used"]):
+            if os.path.exists(os.path.join(self.directory, entry["file"])):
+                self._entries[key] = entry
+                self.bytes += entry["size"]
+
+    def _save_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = os.path.join(self.directory, INDEX_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self._entries, f)
+        os.replace(tmp, os.path.join(self.directory, INDEX_FILE))
+
+    def get(self, key):
+        """Return (memoryview over the PCM, sample_rate) or None. The view stays valid until released."""
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                ANSWER_CACHE_MISSES.inc()
+                return None
+            self._entries.move_to_end(key)
+            entry["last_used"] = time.time()
+            self.hits += 1
+            self.bytes_served += entry["size"]
+            ANSWER_CACHE_HITS.inc()
+            metrics.answer_cache_served_bytes.inc(entry["size"])
+            path = os.path.join(self.directory, entry["file"])
+        try:
+            with open(path, "rb") as f:
+                # The mapping outlives the file descriptor
+                return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)), entry["sample_rate"]
+        except (OSError, ValueError):
+            self.discard(key)
+            return None
+
+    def put(self, key, pcm, sample_rate):
+        size = len(pcm)
+        if size == 0 or size > self.max_bytes:
+            return False
+        name = hashlib.sha256(key.encode("utf-8")).hexdigest()[:32] + ".pcm"
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = os.path.join(self.directory, name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(pcm)
+        os.replace(tmp, os.path.join(self.directory, name))
+
+        with self._lock:
+            self._load()
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old["size"]
+            self._entries[key] = {"file": name, "size": size, "sample_rate": sample_rate, "last_used": time.time()}
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= evicted["size"]
+                self._remove_file(evicted["file"])
+            self._save_index()
+        return True
+
+    def discard(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.bytes -= entry["size"]
+                self._remove_file(entry["file"])
+                self._save_index()
+
+    def clear(self):
+        """Drop every entry, e.g. after fill_db re-ingests the collection."""
+        with self._lock:
+            self._load()
+            for entry in self._entries.values():
+                self._remove_file(entry["file"])
+            self._entries.clear()
+            self.bytes = 0
+            self._save_index()
+
+    def _remove_file(self, name):
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "bytes_served": self.bytes_served
+            }
+
+answer_cache = AnswerAudioCache()
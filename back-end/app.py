@@ -1,21 +1,25 @@
-from fastapi import FastAPI, WebSocket
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Header, HTTPException, WebSocket
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import json
 import base64
+import hmac
 import logging
 import time
 import asyncio
-from transcription import OpenAITranscriber
-from rag import rag
-import uuid
+from transcription import OpenAITranscriber, OUTPUT_SAMPLE_RATE
+from audio_protocol import FRAME_AUDIO_INPUT, FrameError, unpack_frame
+from session_pool import RealtimeSessionPool
+from session_registry import SessionRegistry
+from contextlib import asynccontextmanager
+import rag
+from answer_cache import answer_cache
+from ephemeral_keys import ephemeral_keys
+import metrics
 import traceback
-from typing import Dict
 import asyncio
-from dotenv import load_dotenv
 import os
-import requests
 
 #LOG_FILENAME = "server_logs.txt"
 
@@ -27,8 +31,45 @@ logging.basicConfig(
 logger = logging.getLogger("websocket-audio")
 #reset_logs(LOG_FILENAME)
 
-app = FastAPI()
-transcriber_instances: Dict[str, OpenAITranscriber] = {}
+# When the retrieval clients are built: "background" (after the port is
+# bound), "blocking" (before it is) or "lazy" (on the first question)
+STARTUP_WARMUP = os.environ.get("STARTUP_WARMUP", "background")
+# Shared secret fill_db sends as X-Refresh-Token, /refreshRetrieval is refused while unset
+RAG_REFRESH_TOKEN = os.environ.get("RAG_REFRESH_TOKEN")
+
+realtime_pool = RealtimeSessionPool()
+# Open /ws sessions, with a reaper for idle or half-dead ones
+sessions = SessionRegistry()
+
+async def warm_retrieval():
+    # Imports the embedding and Qdrant clients in a thread, off the event loop
+    start = time.perf_counter()
+    try:
+        await asyncio.to_thread(rag.retrieval_service.warm)
+        logger.info(f"Retrieval warmed up in {(time.perf_counter() - start) * 1000:.0f} ms")
+    except Exception as e:
+        logger.error(f"Failed to load vector store at startup: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pre-warm upstream realtime sessions so callers skip the cold handshake
+    await realtime_pool.start()
+    await sessions.start()
+    # Mint browser keys ahead of time so /getEphemeralKey answers from memory
+    await ephemeral_keys.start()
+    warmup_task = None
+    if STARTUP_WARMUP == "blocking":
+        await warm_retrieval()
+    elif STARTUP_WARMUP == "background":
+        warmup_task = asyncio.create_task(warm_retrieval())
+    yield
+    if warmup_task is not None:
+        warmup_task.cancel()
+    await sessions.close()
+    await ephemeral_keys.close()
+    await realtime_pool.close()
+
+app = FastAPI(lifespan=lifespan)
 # Enable CORS to allow requests from Next.js frontend
 app.add_middleware(
     CORSMiddleware,
@@ -38,77 +79,142 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
-# Store active transcribers by connection
-active_transcribers = {}
-connected_clients = set()
-disconnected_clients = set()
+metrics.queued_frames.set_function(
+    lambda: sum(transcriber.queued_frames() for transcriber in sessions.transcribers())
+)
+metrics.outbound_queued_bytes.set_function(
+    lambda: sum(transcriber.outbound.bytes for transcriber in sessions.transcribers())
+)
+metrics.session_resident_bytes.set_function(sessions.resident_bytes)
 
 @app.get("/")
 async def get():
     logger.info("Root endpoint accessed")
     return {"message": "WebSocket Audio Server"}
 
+@app.get("/sessionPoolStats")
+async def session_pool_stats():
+    return realtime_pool.stats()
+
+@app.post("/refreshRetrieval")
+async def refresh_retrieval(collection_name: str = None, x_refresh_token: str = Header(None)):
+    # Called after fill_db recreates a collection so cached stores are rebuilt.
+    # It also wipes the answer cache, so only callers holding the shared secret may
+    if not RAG_REFRESH_TOKEN or not hmac.compare_digest(x_refresh_token or "", RAG_REFRESH_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid refresh token")
+    rag.retrieval_service.refresh(collection_name)
+    # Cached answers were spoken from the old data
+    await asyncio.to_thread(answer_cache.clear)
+    return {"refreshed": collection_name or "all"}
+
+@app.get("/retrievalCacheStats")
+async def retrieval_cache_stats():
+    return rag.retrieval_service.cache_stats()
+
+@app.get("/answerCacheStats")
+async def answer_cache_stats():
+    return answer_cache.stats()
+
+@app.get("/sessionStats")
+async def session_stats():
+    return sessions.stats()
+
+@app.get("/metrics")
+async def get_metrics():
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/getEphemeralKey")
 async def get_ephemeral_key():
-    load_dotenv()
-    OPEN_AI_API_KEY = os.getenv("OPENAI_API_KEY")
-    url = "https://api.openai.com/v1/realtime/sessions"
-    headers = {
-        "Authorization": f"Bearer {OPEN_AI_API_KEY}",
-        "Content-Type": "application/json",
-        "OpenAI-Beta": "realtime=v1"
-    }
-    payload = {
-        "model": "gpt-4o-realtime-preview-2024-12-17",
-        "voice": "verse"
-    }
-
-    response = requests.post(url, headers=headers, json=payload)
-    response = response.json()
-    ephemeral_key = response["client_secret"]["value"]
-    return ephemeral_key
+    try:
+        return await ephemeral_keys.get_key()
+    except Exception as e:
+        logger.error(f"Failed to mint ephemeral key: {e!r}")
+        raise HTTPException(status_code=502, detail="Could not create a realtime session key")
+
+@app.get("/ephemeralKeyStats")
+async def ephemeral_key_stats():
+    return ephemeral_keys.stats()
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     try:
-        await websocket.accept()
-        logger.info("WebSocket connection accepted")
-        connected_clients.add(websocket)
-        
-        # Create or reuse transcriber for this connection
-        connection_id = str(uuid.uuid4())
-        if connection_id not in transcriber_instances:
-            transcriber_instances[connection_id] = OpenAITranscriber(websocket)
-            await asyncio.sleep(5)
-            await transcriber_instances[connection_id].test()
-            
+        # What the finally below has to undo, set as each step happens
+        counted = False
+        connection_id = None
         try:
+            await websocket.accept()
+            logger.info("WebSocket connection accepted")
+            metrics.active_sessions.inc()
+            counted = True
+            # Clients that connect with ?binary=1 send and receive audio as binary frames
+            binary_audio = websocket.query_params.get("binary") == "1"
+            if binary_audio:
+                await websocket.send_json({
+                    "event_type": "protocol_selected",
+                    "event_data": "binary",
+                    "sample_rate": OUTPUT_SAMPLE_RATE
+                })
+
+            transcriber = OpenAITranscriber(websocket, binary_audio=binary_audio)
+            connection_id = sessions.add(transcriber)
+            await transcriber.initialize_websockets(realtime_pool)
+            # Tell the client as soon as upstream has confirmed the session
+            if await transcriber.wait_until_ready():
+                await transcriber.test()
+            else:
+                logger.error("Realtime session was not ready before the connect timeout")
+                # Without a session nothing would ever answer, let the page know and hang up
+                await websocket.send_json({
+                    "event_type": "checking connectivity",
+                    "event_data": "connection failed"
+                })
+                await websocket.close(code=1011, reason="Realtime session unavailable")
+                return
+
             while True:
-                data = await websocket.receive_json()  
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                transcriber.touch()
+                if message.get("bytes") is not None:
+                    # Binary frame: raw PCM16 behind a small header, no JSON or base64 to parse
+                    try:
+                        frame_type, _, _, pcm = unpack_frame(message["bytes"])
+                    except FrameError as e:
+                        logger.error(f"Dropping malformed audio frame: {e}")
+                        continue
+                    if frame_type == FRAME_AUDIO_INPUT and transcriber.is_openai_connected():
+                        await transcriber.send_pcm_to_openai(pcm)
+                    continue
+                data = json.loads(message["text"])
                 #log(data, LOG_FILENAME)
                 #this one is actually response
                 if data['event_type'] == 'audio_response_transmitting':
                     try:
                         #log("Output Data transmitting", LOG_FILENAME)
-                        await websocket.send_json(data)
+                        # Through the session's bounded queue, not inline on the receive loop
+                        await transcriber.send_json_to_client(data, droppable=True)
                         #log("Output Data transmitted", LOG_FILENAME)
                     except Exception as e:
                         logger.error(f"Failed to send to client: {e}")
                         raise  # This will trigger the outer exception handler
                 elif data['event_type'] == 'audio_input_transmitting':
                     #log("Transmitting data", LOG_FILENAME)
-                    if transcriber_instances[connection_id].is_openai_connected():
-                        transcriber_instances[connection_id].send_audio_to_openai(data['event_data'])
+                    if transcriber.is_openai_connected():
+                        await transcriber.send_audio_to_openai(data['event_data'])
                         #record_audio(data['event_data'])
                     #log("Data transmitted", LOG_FILENAME)
+                elif data['event_type'] == 'audio_flushed':
+                    # The client stopped playback after a barge-in
+                    transcriber.on_client_flushed()
         except Exception as e:
             logger.error(f"WebSocket error: {str(e)}")
         finally:
-            # Clean up
-            connected_clients.discard(websocket)
-            if connection_id in transcriber_instances:
-                transcriber_instances[connection_id].stop_transcription()
-                del transcriber_instances[connection_id]
+            # Clean up, unless the reaper already did
+            if counted:
+                metrics.active_sessions.dec()
+            if connection_id is not None and sessions.remove(connection_id) is not None:
+                await transcriber.stop_transcription()
             logger.info("WebSocket connection closed")
     except Exception as e:
         print(e)
@@ -0,0 +1,65 @@
+import base64
+import binascii
+import numpy as np
+
+PCM16_MAX = 32767
+
+def float_to_pcm16(float32_array, out=None):
+    """
+    Clip float samples to [-1, 1] and convert to int16 in one vectorized pass.
+    Pass a preallocated int16 `out` to avoid allocating per call.
+    """
+    samples = np.asarray(float32_array, dtype=np.float32)
+    if out is None:
+        out = np.empty(samples.shape, dtype=np.int16)
+    scaled = np.multiply(samples, PCM16_MAX, dtype=np.float32)
+    np.clip(scaled, -PCM16_MAX, PCM16_MAX, out=scaled)
+    # Truncate toward zero like int(x * 32767) did in the per-sample version
+    np.trunc(scaled, out=scaled)
+    out[...] = scaled
+    return out
+
+def pcm16_to_float(pcm_bytes, out=None):
+    # A trailing odd byte cannot form a sample, ignore it
+    samples = np.frombuffer(pcm_bytes, dtype=np.int16, count=len(pcm_bytes) // 2)
+    if out is None:
+        out = np.empty(samples.shape, dtype=np.float32)
+    np.multiply(samples, 1.0 / PCM16_MAX, out=out, dtype=np.float32)
+    return out
+
+def apply_gain(samples, gain, out=None):
+    """Multiply float samples by gain and clip to [-1, 1]. Pass out=samples to work in place."""
+    out = np.multiply(samples, gain, out=out, dtype=np.float32)
+    np.clip(out, -1.0, 1.0, out=out)
+    return out
+
+def encode_pcm16_base64(pcm):
+    """Base64-encode PCM16 given as bytes-like or an int16 array, without copying arrays."""
+    return base64.b64encode(memoryview(pcm).cast("B")).decode("ascii")
+
+def join_pcm(chunks):
+    """Concatenate bytes-like chunks into one preallocated bytearray."""
+    total = 0
+    for chunk in chunks:
+        total += len(chunk)
+    joined = bytearray(total)
+    view = memoryview(joined)
+    offset = 0
+    for chunk in chunks:
+        size = len(chunk)
+        view[offset:offset + size] = chunk
+        offset += size
+    return joined
+
+def decode_base64_chunks(base64_chunks):
+    """
+    Decode base64 PCM16 chunks straight into one buffer. This is a pure
+    passthrough: no int16 -> float32 -> int16 round trip.
+    """
+    decoded = []
+    for chunk in base64_chunks:
+        try:
+            decoded.append(binascii.a2b_base64(chunk))
+        except (binascii.Error, TypeError) as e:
+            print(f"Error decoding chunk: {e}")
+    return join_pcm(decoded)
@@ -0,0 +1,34 @@
+import struct
+
+# Binary audio frames on /ws, negotiated with ?binary=1 at connect time.
+# JSON text messages keep carrying everything that is not audio.
+#
+# Header (little endian, 8 bytes), followed by raw PCM16 mono samples:
+#   version   uint8
+#   type      uint8   FRAME_AUDIO_INPUT (browser -> server) or FRAME_AUDIO_OUTPUT
+#   stream    uint16  response counter for output frames, 0 for input
+#   seq       uint32  frame sequence number within the stream
+PROTOCOL_VERSION = 1
+FRAME_AUDIO_INPUT = 1
+FRAME_AUDIO_OUTPUT = 2
+
+HEADER = struct.Struct("<BBHI")
+HEADER_SIZE = HEADER.size
+
+class FrameError(ValueError):
+    pass
+
+def pack_frame(frame_type, stream, seq, pcm):
+    frame = bytearray(HEADER_SIZE + len(pcm))
+    HEADER.pack_into(frame, 0, PROTOCOL_VERSION, frame_type, stream & 0xFFFF, seq & 0xFFFFFFFF)
+    frame[HEADER_SIZE:] = pcm
+    return bytes(frame)
+
+def unpack_frame(frame):
+    """Return (frame_type, stream, seq, pcm memoryview) without copying the payload."""
+    if len(frame) < HEADER_SIZE:
+        raise FrameError(f"Frame too short: {len(frame)} bytes")
+    version, frame_type, stream, seq = HEADER.unpack_from(frame, 0)
+    if version != PROTOCOL_VERSION:
+        raise FrameError(f"Unsupported frame version {version}")
+    return frame_type, stream, seq, memoryview(frame)[HEADER_SIZE:]
@@ -0,0 +1,75 @@
+"""
+Micro-benchmarks for audio_codec against the previous per-sample helpers.
+
+Uses realistic 24 kHz response lengths split into ~100 ms base64 deltas, the
+shape response.audio.delta events arrive in.
+
+    python benchmarks/bench_audio_codec.py
+"""
+import base64
+import os
+import struct
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from audio_codec import decode_base64_chunks, encode_pcm16_base64, float_to_pcm16
+
+SAMPLE_RATE = 24000
+DELTA_SAMPLES = SAMPLE_RATE // 10
+
+# Previous implementations, kept here as the baseline
+def legacy_float_to_16bit_pcm(float32_array):
+    clipped = [max(-1.0, min(1.0, x)) for x in float32_array]
+    return b''.join(struct.pack('<h', int(x * 32767)) for x in clipped)
+
+def legacy_base64_encode_audio(float32_array):
+    return base64.b64encode(legacy_float_to_16bit_pcm(float32_array)).decode('ascii')
+
+def legacy_reconstruct_audio(audio_chunks):
+    decoded = []
+    for chunk in audio_chunks:
+        int16_array = np.frombuffer(base64.b64decode(chunk), dtype=np.int16)
+        decoded.append(int16_array.astype(np.float32) / 32767.0)
+    return np.concatenate(decoded)
+
+def legacy_response_path(audio_chunks):
+    # reconstruct_audio followed by utils.base64_encode_audio, as transcription.py did
+    return legacy_base64_encode_audio(legacy_reconstruct_audio(audio_chunks))
+
+def response_path(audio_chunks):
+    return encode_pcm16_base64(decode_base64_chunks(audio_chunks))
+
+def make_response(seconds):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    audio = (0.4 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+    pcm = float_to_pcm16(audio).tobytes()
+    step = DELTA_SAMPLES * 2
+    return audio, [base64.b64encode(pcm[i:i + step]).decode('ascii') for i in range(0, len(pcm), step)]
+
+def best_of(fn, arg, number):
+    return min(timeit.repeat(lambda: fn(arg), number=number, repeat=3)) / number * 1000
+
+def main():
+    print(f"{'case':<28} {'seconds':>7} {'legacy ms':>10} {'codec ms':>9} {'speedup':>8}")
+    for seconds in (2, 5, 10):
+        audio, deltas = make_response(seconds)
+        assert legacy_float_to_16bit_pcm(audio) == float_to_pcm16(audio).tobytes()
+        assert legacy_response_path(deltas) == response_path(deltas)
+
+        cases = [
+            ("float -> pcm16", legacy_float_to_16bit_pcm, lambda a: float_to_pcm16(a).tobytes(), audio, 1),
+            ("float -> base64", legacy_base64_encode_audio,
+             lambda a: encode_pcm16_base64(float_to_pcm16(a)), audio, 1),
+            ("deltas -> client base64", legacy_response_path, response_path, deltas, 1),
+        ]
+        for name, legacy, codec, arg, number in cases:
+            legacy_ms = best_of(legacy, arg, number)
+            codec_ms = best_of(codec, arg, 20)
+            print(f"{name:<28} {seconds:>7} {legacy_ms:>10.2f} {codec_ms:>9.3f} {legacy_ms / codec_ms:>7.0f}x")
+
+if __name__ == "__main__":
+    main()
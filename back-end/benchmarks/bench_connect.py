@@ -0,0 +1,80 @@
+"""
+Connection-to-ready latency for /ws under concurrent connects.
+
+Runs the FastAPI app and the stand-in realtime server in-process, opens N
+browser-like websockets at once and times each one from connect until the
+"checking connectivity" message arrives.
+
+    python benchmarks/bench_connect.py --clients 50 --handshake-delay 0.05
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "sk-local-stand-in")
+os.environ.setdefault("EPHEMERAL_KEY_POOL_SIZE", "0")
+
+import uvicorn
+from websockets.asyncio.client import connect
+
+import transcription
+from fake_realtime import start_fake_server
+
+async def connect_until_ready(url):
+    start = time.perf_counter()
+    async with connect(url) as ws:
+        async for message in ws:
+            if "checking connectivity" in message:
+                return time.perf_counter() - start
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+async def main(args):
+    fake_server, fake_url = await start_fake_server(handshake_delay=args.handshake_delay)
+    transcription.OPENAI_REALTIME_URL = fake_url
+
+    import app as app_module
+    from app import app
+    app_module.realtime_pool.size = args.pool_size
+    logging.getLogger().setLevel(logging.WARNING)
+    # Client disconnects are logged as errors by the endpoint, silence them here
+    logging.getLogger("websocket-audio").setLevel(logging.CRITICAL)
+    config = uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning")
+    server = uvicorn.Server(config)
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    # Give the session pool a moment to pre-warm before the burst
+    while len(app_module.realtime_pool.idle) < args.pool_size:
+        await asyncio.sleep(0.01)
+
+    url = f"ws://127.0.0.1:{args.port}/ws"
+    latencies = await asyncio.gather(*(connect_until_ready(url) for _ in range(args.clients)))
+    latencies = [l * 1000 for l in latencies]
+    print(f"pool: {app_module.realtime_pool.stats()}")
+    print(f"clients={args.clients} pool_size={args.pool_size} handshake_delay={args.handshake_delay * 1000:.0f}ms")
+    print(f"connect-to-ready ms: p50={percentile(latencies, 50):.1f} "
+          f"p95={percentile(latencies, 95):.1f} max={max(latencies):.1f} "
+          f"mean={statistics.mean(latencies):.1f}")
+
+    server.should_exit = True
+    await server_task
+    fake_server.close()
+    await fake_server.wait_closed()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--handshake-delay", type=float, default=0.05,
+                        help="simulated upstream latency in seconds per handshake step")
+    parser.add_argument("--pool-size", type=int, default=0,
+                        help="number of pre-warmed upstream sessions")
+    parser.add_argument("--port", type=int, default=8010)
+    asyncio.run(main(parser.parse_args()))
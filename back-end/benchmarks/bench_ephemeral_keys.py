@@ -0,0 +1,113 @@
+"""
+/getEphemeralKey paths against the local sessions stand-in (fake_sessions.py).
+
+- blocking: the old handler, a synchronous requests.post inside async code
+- single-flight: EphemeralKeyService with no pool, a burst of concurrent requests
+- pooled: EphemeralKeyService with pre-minted keys
+
+Each run reports per-request latency, upstream calls and connections, and
+the longest event loop stall seen by a 10 ms ticker running alongside, which
+is what every audio session on the server would feel.
+
+    python benchmarks/bench_ephemeral_keys.py --requests 50 --delay 0.2
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "sk-local-stand-in")
+
+import requests
+
+from ephemeral_keys import EphemeralKeyService
+from fake_sessions import start_fake_sessions_server
+
+TICK = 0.01
+
+def start_in_thread(delay):
+    """Run the stand-in on its own loop, the blocking client would deadlock a shared one."""
+    started = threading.Event()
+    box = {}
+
+    def run():
+        loop = asyncio.new_event_loop()
+        box["server"], box["url"] = loop.run_until_complete(start_fake_sessions_server(delay=delay))
+        started.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    started.wait()
+    return box["server"].fake, box["url"]
+
+async def ticker(stalls):
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        stalls.append(time.perf_counter() - start - TICK)
+
+async def measure(name, fake, work):
+    stalls = []
+    tick_task = asyncio.create_task(ticker(stalls))
+    requests_before, connections_before = fake.requests, fake.connections
+    start = time.perf_counter()
+    latencies = await work()
+    wall = time.perf_counter() - start
+    # Let the ticker record a stall that lasted until the end
+    await asyncio.sleep(TICK * 2)
+    tick_task.cancel()
+    latencies = [l * 1000 for l in latencies]
+    print(f"{name:<14} wall {wall * 1000:7.0f} ms  latency p50 {statistics.median(latencies):6.1f} ms "
+          f"max {max(latencies):6.1f} ms  upstream calls {fake.requests - requests_before:3d}  "
+          f"connections {fake.connections - connections_before:3d}  "
+          f"max loop stall {max(stalls, default=0) * 1000:6.1f} ms")
+
+async def timed(call):
+    start = time.perf_counter()
+    await call()
+    return time.perf_counter() - start
+
+async def main(args):
+    fake, url = start_in_thread(args.delay)
+
+    async def blocking_get():
+        # What the old handler did: a synchronous round trip on the event loop
+        response = requests.post(url, headers={"Authorization": "Bearer x"},
+                                 json={"model": "m", "voice": "verse"})
+        return response.json()["client_secret"]["value"]
+
+    async def blocking():
+        return await asyncio.gather(*(timed(blocking_get) for _ in range(args.requests)))
+    await measure("blocking", fake, blocking)
+
+    service = EphemeralKeyService(url=url, pool_size=0)
+    async def single_flight():
+        return await asyncio.gather(*(timed(service.get_key) for _ in range(args.requests)))
+    await measure("single-flight", fake, single_flight)
+    await service.close()
+
+    service = EphemeralKeyService(url=url, pool_size=args.pool_size)
+    await service.start()
+    while len(service.keys) < args.pool_size:
+        await asyncio.sleep(0.01)
+    async def pooled():
+        # Spaced out like callers opening the page, so the pool can keep up
+        latencies = []
+        for _ in range(args.requests):
+            latencies.append(await timed(service.get_key))
+            await asyncio.sleep(args.delay * 2 / args.pool_size)
+        return latencies
+    await measure("pooled", fake, pooled)
+    print(f"pool stats: {service.stats()}")
+    await service.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--delay", type=float, default=0.2, help="simulated upstream latency in seconds")
+    parser.add_argument("--pool-size", type=int, default=2)
+    asyncio.run(main(parser.parse_args()))
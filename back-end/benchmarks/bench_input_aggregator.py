@@ -0,0 +1,77 @@
+"""
+CPU per second of caller audio on the upstream input path, with and
+without the input aggregator, across browser buffer sizes.
+
+With the target "off" (the old behaviour) each browser buffer is resampled
+16 -> 24 kHz and sent as its own append event. Otherwise buffers go into
+the InputAggregator with the given target, which resamples and sends once
+per batch. Every event is written to /dev/null so each send costs one real
+syscall, standing in for the socket write.
+
+    python benchmarks/bench_input_aggregator.py
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from audio_codec import encode_pcm16_base64
+from input_aggregator import InputAggregator
+from resampler import StreamingResampler
+
+CLIENT_SAMPLE_RATE = 16000
+REALTIME_SAMPLE_RATE = 24000
+AUDIO_SECONDS = 30
+REPEATS = 3
+
+async def run(buffer_samples, target_ms, sink):
+    rng = np.random.default_rng(0)
+    buffers = [
+        rng.integers(-8000, 8000, buffer_samples, dtype=np.int16).tobytes()
+        for _ in range(AUDIO_SECONDS * CLIENT_SAMPLE_RATE // buffer_samples)
+    ]
+    resampler = StreamingResampler(CLIENT_SAMPLE_RATE, REALTIME_SAMPLE_RATE)
+    events = 0
+
+    async def send(text):
+        nonlocal events
+        os.write(sink, text.encode("ascii"))
+        events += 1
+        return True
+
+    start = time.perf_counter()
+    if target_ms is None:
+        for pcm in buffers:
+            # What send_pcm_to_openai did before: one json.dumps and one send per buffer
+            event = {"type": "input_audio_buffer.append", "audio": encode_pcm16_base64(resampler.process(pcm))}
+            await send(json.dumps(event))
+    else:
+        # A deadline longer than the run, so only the size target triggers flushes
+        aggregator = InputAggregator(send, CLIENT_SAMPLE_RATE, target_ms=target_ms, max_delay_ms=10 ** 6,
+                                     transform=resampler.process)
+        for pcm in buffers:
+            await aggregator.add(pcm)
+        await aggregator.flush()
+    # Single threaded and never idle, so wall time is CPU time
+    cpu = time.perf_counter() - start
+    return cpu / AUDIO_SECONDS * 1000, events / AUDIO_SECONDS
+
+async def main():
+    sink = os.open(os.devnull, os.O_WRONLY)
+    print(f"{'buffer':>7} {'buffer ms':>9} {'target':>7} {'events/s':>9} {'cpu ms per audio s':>19}")
+    for buffer_samples in (128, 256, 512, 1024, 4096):
+        for target_ms in (None, 40, 60, 100):
+            results = [await run(buffer_samples, target_ms, sink) for _ in range(REPEATS)]
+            cpu_ms, rate = min(results)
+            target = "off" if target_ms is None else f"{target_ms}ms"
+            print(f"{buffer_samples:>7} {buffer_samples / CLIENT_SAMPLE_RATE * 1000:>9.1f} {target:>7} "
+                  f"{rate:>9.1f} {cpu_ms:>19.3f}")
+    os.close(sink)
+
+if __name__ == "__main__":
+    asyncio.run(main())
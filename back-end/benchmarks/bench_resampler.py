@@ -0,0 +1,76 @@
+"""
+Cost and quality of the streaming resampler.
+
+Cost: CPU time to resample browser-sized chunks in both directions, reported
+as how many realtime streams one core can carry.
+
+Quality: chunked streaming output against the offline whole-signal
+reference (must match to float precision, i.e. no seam artifacts), and the
+SNR of a resampled 1 kHz tone against the ideal delayed tone.
+
+    python benchmarks/bench_resampler.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from resampler import StreamingResampler, resample_offline
+
+def streams_per_core(from_rate, to_rate, chunk_samples, seconds=1.0):
+    rng = np.random.default_rng(0)
+    chunk = rng.integers(-8000, 8000, chunk_samples, dtype=np.int16).tobytes()
+    resampler = StreamingResampler(from_rate, to_rate)
+    chunks = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        for _ in range(50):
+            resampler.process(chunk)
+        chunks += 50
+    cpu_per_chunk = (time.perf_counter() - start) / chunks
+    audio_per_chunk = chunk_samples / from_rate
+    return audio_per_chunk / cpu_per_chunk, cpu_per_chunk * 1e6
+
+def seam_error(from_rate, to_rate):
+    rng = np.random.default_rng(1)
+    signal = (rng.standard_normal(from_rate * 2) * 0.2).astype(np.float32)
+    resampler = StreamingResampler(from_rate, to_rate)
+    pieces, i = [], 0
+    while i < len(signal):
+        size = int(rng.integers(1, 1500))
+        pieces.append(resampler.process_float(signal[i:i + size]))
+        i += size
+    streamed = np.concatenate(pieces)
+    reference = resample_offline(signal, from_rate, to_rate)[:len(streamed)]
+    return float(np.max(np.abs(streamed - reference)))
+
+def tone_snr(from_rate, to_rate, freq=1000.0):
+    resampler = StreamingResampler(from_rate, to_rate)
+    t = np.arange(from_rate) / from_rate
+    tone = 0.5 * np.sin(2 * np.pi * freq * t)
+    pieces = [resampler.process_float(tone[i:i + 4096]) for i in range(0, len(tone), 4096)]
+    output = np.concatenate(pieces)
+    # Linear-phase FIR delay, in input-rate seconds
+    delay = (resampler.up * resampler.taps_per_phase - 1) / 2 / (from_rate * resampler.up)
+    n = np.arange(len(output))
+    ideal = 0.5 * np.sin(2 * np.pi * freq * (n / to_rate - delay))
+    steady = slice(200, len(output) - 200)
+    error = output[steady] - ideal[steady]
+    return 10 * np.log10(np.mean(ideal[steady] ** 2) / np.mean(error ** 2))
+
+def main():
+    print(f"{'direction':<14} {'chunk':>6} {'us/chunk':>9} {'streams/core':>13}")
+    for from_rate, to_rate, chunk in ((16000, 24000, 4096), (16000, 24000, 1024), (24000, 16000, 2400)):
+        streams, us = streams_per_core(from_rate, to_rate, chunk)
+        print(f"{from_rate // 1000}k -> {to_rate // 1000}k{'':<5} {chunk:>6} {us:>9.1f} {streams:>13.0f}")
+    print()
+    print(f"{'direction':<14} {'max seam error':>15} {'1 kHz SNR dB':>13}")
+    for from_rate, to_rate in ((16000, 24000), (24000, 16000)):
+        print(f"{from_rate // 1000}k -> {to_rate // 1000}k{'':<5} {seam_error(from_rate, to_rate):>15.2e} "
+              f"{tone_snr(from_rate, to_rate):>13.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Cold start of the server: import time per module and time to the first
+accepted websocket.
+
+Import times come from `python -X importtime -c "import app"` in a fresh
+interpreter. For the websocket numbers the app runs under uvicorn in a child
+process, pointed at the local realtime stand-in, once per STARTUP_WARMUP
+mode. "accepted" is from spawning the process to the /ws handshake
+completing, "ready" to the connectivity message that follows session.updated.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 5 --modes background lazy
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, BACKEND_DIR)
+
+from websockets.asyncio.client import connect
+
+from fake_realtime import start_fake_server
+
+HEAVY_MODULES = ("fastapi", "numpy", "openai", "qdrant_client", "langchain_openai",
+                 "langchain_qdrant", "langchain_core", "requests")
+
+def child_env(**extra):
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "sk-local-stand-in")
+    env.setdefault("EPHEMERAL_KEY_POOL_SIZE", "0")
+    env.update(extra)
+    return env
+
+def import_times():
+    """Cumulative import time in ms per module, from a fresh interpreter."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=BACKEND_DIR, env=child_env(), capture_output=True, text=True, check=True
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Indentation marks nesting, keep the first (outermost) import of each name
+        times.setdefault(name.strip(), int(cumulative) / 1000)
+    return times
+
+async def time_to_websocket(port, realtime_url, mode, timeout):
+    env = child_env(STARTUP_WARMUP=mode, OPENAI_REALTIME_URL=realtime_url)
+    start = time.perf_counter()
+    child = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = start + timeout
+        while True:
+            try:
+                ws = await connect(f"ws://127.0.0.1:{port}/ws")
+                break
+            except OSError:
+                if time.perf_counter() > deadline:
+                    raise RuntimeError(f"No websocket accepted within {timeout}s")
+                await asyncio.sleep(0.005)
+        accepted = time.perf_counter() - start
+        async with ws:
+            async for message in ws:
+                if "connection established" in message:
+                    break
+        ready = time.perf_counter() - start
+        return accepted * 1000, ready * 1000
+    finally:
+        child.terminate()
+        child.wait()
+
+async def main(args):
+    times = import_times()
+    top = sorted(((ms, name) for name, ms in times.items() if "." not in name), reverse=True)
+    print(f"import app: {times.get('app', 0):.0f} ms")
+    print("heaviest top-level imports (cumulative ms):")
+    for ms, name in top[:args.top]:
+        print(f"  {name:<28} {ms:8.1f}")
+    loaded = [name for name in HEAVY_MODULES if name in times]
+    deferred = [name for name in HEAVY_MODULES if name not in times]
+    print(f"loaded at import: {', '.join(loaded) or '-'}")
+    print(f"deferred: {', '.join(deferred) or '-'}")
+
+    # Pooled sessions are cut off mid-handshake when each child exits
+    logging.getLogger("websockets.server").setLevel(logging.CRITICAL)
+    fake_server, fake_url = await start_fake_server()
+    try:
+        for mode in args.modes:
+            runs = [await time_to_websocket(args.port, fake_url, mode, args.timeout) for _ in range(args.runs)]
+            accepted = statistics.median(run[0] for run in runs)
+            ready = statistics.median(run[1] for run in runs)
+            print(f"STARTUP_WARMUP={mode:<10} first websocket accepted {accepted:7.0f} ms, "
+                  f"session ready {ready:7.0f} ms (median of {args.runs})")
+    finally:
+        fake_server.close()
+        await fake_server.wait_closed()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--modes", nargs="+", default=["blocking", "background", "lazy"])
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--port", type=int, default=8021)
+    asyncio.run(main(parser.parse_args()))
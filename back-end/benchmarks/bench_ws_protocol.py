@@ -0,0 +1,75 @@
+"""
+Throughput of the /ws audio framing: JSON + base64 vs binary frames.
+
+Measures the server-side work per browser frame (parse the client message
+and build the upstream append event) and per response chunk (build the
+client message), single threaded, so the numbers are frames per second per
+core. Also reports bytes on the wire per frame.
+
+    python benchmarks/bench_ws_protocol.py
+"""
+import base64
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from audio_codec import encode_pcm16_base64
+from audio_protocol import FRAME_AUDIO_INPUT, FRAME_AUDIO_OUTPUT, pack_frame, unpack_frame
+
+def json_inbound(text):
+    data = json.loads(text)
+    return json.dumps({"type": "input_audio_buffer.append", "audio": data['event_data']})
+
+def binary_inbound(frame):
+    _, _, _, pcm = unpack_frame(frame)
+    return json.dumps({"type": "input_audio_buffer.append", "audio": encode_pcm16_base64(pcm)})
+
+def json_outbound(pcm):
+    return json.dumps({
+        "event_type": "audio_response_chunk",
+        "event_data": encode_pcm16_base64(pcm),
+        "response_id": "resp_0123456789",
+        "seq": 42,
+        "sample_rate": 24000
+    })
+
+def binary_outbound(pcm):
+    return pack_frame(FRAME_AUDIO_OUTPUT, 1, 42, pcm)
+
+def rate(fn, arg, seconds=1.0):
+    count = 0
+    start = time.perf_counter()
+    while True:
+        for _ in range(200):
+            fn(arg)
+        count += 200
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            return count / elapsed
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{'direction':<10} {'samples':>7} {'json B':>8} {'binary B':>8} {'json fps':>10} {'binary fps':>11} {'speedup':>8}")
+    for direction, samples in (("inbound", 4096), ("inbound", 1024), ("outbound", 2400)):
+        pcm = rng.integers(-8000, 8000, samples, dtype=np.int16).tobytes()
+        if direction == "inbound":
+            json_msg = json.dumps({"event_type": "audio_input_transmitting",
+                                   "event_data": base64.b64encode(pcm).decode("ascii")})
+            binary_msg = pack_frame(FRAME_AUDIO_INPUT, 0, 7, pcm)
+            json_fps = rate(json_inbound, json_msg)
+            binary_fps = rate(binary_inbound, binary_msg)
+            json_size, binary_size = len(json_msg), len(binary_msg)
+        else:
+            json_fps = rate(json_outbound, pcm)
+            binary_fps = rate(binary_outbound, pcm)
+            json_size, binary_size = len(json_outbound(pcm)), len(binary_outbound(pcm))
+        print(f"{direction:<10} {samples:>7} {json_size:>8} {binary_size:>8} {json_fps:>10.0f} "
+              f"{binary_fps:>11.0f} {binary_fps / json_fps:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Offline retrieval evaluation: recall@3 and per-query latency of vector-only
+retrieval against hybrid (BM25 short-circuit, else reciprocal rank fusion).
+
+Both run through RetrievalService.retrieve over the chunks fill_db.py makes
+from data/hospital_data.pdf, with the retrieval cache off. A question counts
+as recalled when one of the top 3 chunks contains its expected answer.
+
+By default the embeddings are the hashed bag-of-words stand-in, which
+misses paraphrases the real model catches, so vector-only recall here is a
+floor; --openai embeds with text-embedding-3-small instead (needs
+OPENAI_API_KEY, and then the delays are the real round trips).
+
+    python benchmarks/eval_retrieval.py
+    python benchmarks/eval_retrieval.py --embedding-delay 0.25 --verbose
+    python benchmarks/eval_retrieval.py --openai
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+# Every question has to reach retrieval, not an earlier answer
+os.environ["RAG_CACHE_SIZE"] = "0"
+os.environ.setdefault("OPENAI_API_KEY", "sk-local-stand-in")
+
+from fill_db import load_documents, split_documents
+from fake_retrieval import StandInRetrievalService
+
+# (question, text the answer needs), worded the way callers ask
+QUESTIONS = (
+    ("Where is Greenview Medical Center located?", "1234 Healing Way"),
+    ("What is the hospital's email address?", "info@greenviewmed.org"),
+    ("What are the hospital hours on weekends?", "on weekends from 8:00 AM to 6:00 PM"),
+    ("Are you open on holidays?", "on holidays from 9:00 AM to 5:00 PM"),
+    ("What number do I call for an emergency?", "123-9999"),
+    ("Is the emergency department open all night?", "24 hours a day"),
+    ("Who is the chief of cardiology?", "Dr. James Wilson serves as the Chief of Cardiology"),
+    ("What are Dr. Wilson's office hours?", "Wilson's office hours are Monday and Wednesday"),
+    ("Does Dr. Adams speak French?", "English and French"),
+    ("How do I reach Dr. Adams?", "123-7002"),
+    ("Which neurologist treats movement disorders?", "Movement Disorders"),
+    ("Is Dr. Rodriguez taking new patients?", "Dr. Rodriguez is not accepting new patients"),
+    ("What is Dr. Kim's phone number?", "123-7004"),
+    ("Who is the orthopedic surgeon for sports injuries?", "Sports Medicine"),
+    ("Which languages does Dr. Chen speak?", "Dr. Chen speaks English and Mandarin"),
+    ("Who is the chief of pediatrics?", "Dr. Sarah Johnson serves as the Chief of Pediatrics"),
+    ("When can I see Dr. Johnson?", "Monday, Wednesday, and Thursday from 8:00 AM to 4:00 PM"),
+    ("Who handles high risk pregnancies?", "Maternal-Fetal Medicine"),
+    ("Is the dermatologist accepting new patients?", "Dr. Thompson is not accepting new patients"),
+    ("Where is the lab?", "Ground Floor, East Wing"),
+    ("Do I need an appointment for blood work?", "No appointment is required for laboratory"),
+    ("Can I get an MRI here?", "X-ray, CT Scan, MRI"),
+    ("What is the phone number for radiology?", "123-4581"),
+    ("Where is the pharmacy?", "Main Lobby"),
+    ("Where do I pick up my prescription?", "Main Lobby"),
+    ("When is the pharmacy open?", "pharmacy is open from 8:00 AM to 8:00 PM"),
+    ("Where is physical therapy?", "2nd Floor, West Wing"),
+    ("How early should I arrive for my appointment?", "arrive 15 minutes prior"),
+    ("What should I bring to my visit?", "insurance card, photo ID"),
+    ("Where can I park?", "Main Garage (P1)"),
+    ("How much does parking cost?", "$2 per hour"),
+    ("Is the building wheelchair accessible?", "wheelchair access"),
+    ("Do you have an interpreter for Arabic speakers?", "Russian, and Arabic"),
+    ("How do I request a translator?", "123-4590"),
+)
+
+def normalize(text):
+    # pypdf separates the words of this PDF with newlines
+    return " ".join(text.split())
+
+def evaluate(service, k=3):
+    latencies = []
+    paths = {}
+    recalled = 0
+    misses = []
+    for question, expected in QUESTIONS:
+        timings = {}
+        start = time.perf_counter()
+        contexts = service.retrieve(question, timings=timings)
+        latencies.append((time.perf_counter() - start) * 1000)
+        path = timings.get("path", "vector")
+        paths[path] = paths.get(path, 0) + 1
+        if any(expected in normalize(doc.page_content) for doc in contexts[:k]):
+            recalled += 1
+        else:
+            misses.append((question, path))
+    return {
+        "recall": recalled / len(QUESTIONS),
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": statistics.quantiles(latencies, n=20)[-1],
+        "mean_ms": statistics.fmean(latencies),
+        "paths": paths,
+        "misses": misses
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--source", default="./data/hospital_data.pdf")
+    parser.add_argument("--openai", action="store_true", help="embed with text-embedding-3-small instead of the stand-in")
+    parser.add_argument("--embedding-delay", type=float, default=0.15, help="simulated embedding round trip (stand-in only)")
+    parser.add_argument("--search-delay", type=float, default=0.03, help="simulated vector search round trip")
+    parser.add_argument("--verbose", action="store_true", help="list the questions each mode missed")
+    args = parser.parse_args()
+
+    chunks = split_documents(load_documents([args.source], workers=1))
+    embedding = None
+    if args.openai:
+        from rag import default_embeddings
+        embedding = default_embeddings()
+
+    results = {}
+    for name, hybrid in (("vector", False), ("hybrid", True)):
+        service = StandInRetrievalService(
+            embedding_delay=args.embedding_delay, search_delay=args.search_delay,
+            documents=chunks, embedding=embedding, hybrid=hybrid
+        )
+        results[name] = evaluate(service)
+
+    print(f"{len(QUESTIONS)} questions over {len(chunks)} chunks, "
+          f"embeddings={'openai' if args.openai else f'stand-in ({args.embedding_delay * 1000:.0f}ms)'} "
+          f"search={args.search_delay * 1000:.0f}ms")
+    print(f"{'mode':<8} {'recall@3':>9} {'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8}  paths")
+    for name, r in results.items():
+        paths = ", ".join(f"{path} {count}" for path, count in sorted(r["paths"].items()))
+        print(f"{name:<8} {r['recall']:>9.2f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['mean_ms']:>8.1f}  {paths}")
+        if args.verbose:
+            for question, path in r["misses"]:
+                print(f"    missed ({path}): {question}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Load test for the asyncio realtime session engine.
+
+Opens N concurrent OpenAITranscriber sessions against the local stand-in
+server and reports resident memory per session and the process thread count.
+
+    python benchmarks/load_sessions.py 10 100 500
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "sk-local-stand-in")
+
+import transcription
+from fake_realtime import start_fake_server
+
+class NullClient:
+    """Stands in for the browser websocket and discards everything."""
+
+    async def send_json(self, message):
+        pass
+
+def rss_bytes():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+async def run(n_sessions, url):
+    transcription.OPENAI_REALTIME_URL = url
+    before_rss = rss_bytes()
+    before_threads = threading.active_count()
+
+    start = time.perf_counter()
+    transcribers = [transcription.OpenAITranscriber(NullClient()) for _ in range(n_sessions)]
+    await asyncio.gather(*(t.initialize_websockets() for t in transcribers))
+    elapsed = time.perf_counter() - start
+    connected = sum(1 for t in transcribers if t.is_openai_connected())
+
+    # Let session.created/session.updated settle before sampling
+    await asyncio.sleep(0.5)
+    after_rss = rss_bytes()
+    threads = threading.active_count()
+
+    await asyncio.gather(*(t.stop_transcription() for t in transcribers))
+    per_session = (after_rss - before_rss) / max(connected, 1)
+    print(f"{n_sessions:>6} {connected:>9} {elapsed:>9.2f}s {per_session / 1024:>12.1f} "
+          f"{before_threads:>8} {threads:>7}")
+
+async def main(sizes):
+    server, url = await start_fake_server()
+    print(f"{'N':>6} {'connected':>9} {'connect':>10} {'KiB/session':>12} {'threads0':>8} {'threads':>7}")
+    for n in sizes:
+        await run(n, url)
+    server.close()
+    await server.wait_closed()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("sizes", type=int, nargs="*", default=[10, 100, 500],
+                        help="numbers of concurrent sessions to open, one run each")
+    args = parser.parse_args()
+    asyncio.run(main(args.sizes))
@@ -0,0 +1,305 @@
+"""
+End-to-end load test of /ws without any paid API.
+
+Starts the app in a child process with the realtime endpoint pointed at the
+local stand-in server (fake_realtime.py) and retrieval swapped for the
+offline stand-in (fake_retrieval.py). N browser-like clients then stream
+PCM at real time pace: one utterance per turn followed by silence, the way
+the page keeps sending frames. Turn latency is from the last speech frame
+sent to the first answer audio received.
+
+Reports p50/p95/p99 turn latency plus the server's CPU and resident memory
+per session, measured on the child process only.
+
+    python benchmarks/load_turns.py --clients 50 --turns 3
+    python benchmarks/load_turns.py --pcm recording_16k.raw --json
+"""
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, BACKEND_DIR)
+
+from websockets.asyncio.client import connect
+
+from audio_protocol import FRAME_AUDIO_INPUT, FRAME_AUDIO_OUTPUT, pack_frame, unpack_frame
+from fake_realtime import start_fake_server
+
+CLIENT_SAMPLE_RATE = 16000
+# page.js captures with a 4096-sample ScriptProcessor
+FRAME_SAMPLES = 4096
+
+def synthetic_utterance(seconds=1.2, sample_rate=CLIENT_SAMPLE_RATE):
+    """Noise shaped by a syllable-rate envelope, loud enough to pass both VADs."""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    envelope = 0.6 + 0.4 * np.sin(2 * np.pi * 4 * t)
+    return (rng.standard_normal(t.size) * envelope * 5000).astype(np.int16).tobytes()
+
+def split_frames(pcm):
+    frame_bytes = FRAME_SAMPLES * 2
+    return [pcm[i:i + frame_bytes] for i in range(0, len(pcm), frame_bytes)]
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+def proc_cpu_seconds(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+def proc_rss_bytes(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+class BrowserClient:
+    """Plays the part of page.js: streams mic frames and waits for answer audio."""
+
+    def __init__(self, url, speech_frames, binary, turns, silence_frames, read_delay=0.0, barge_in=False):
+        self.url = url + ("?binary=1" if binary else "")
+        self.speech_frames = speech_frames
+        self.binary = binary
+        self.turns = turns
+        self.silence_frames = silence_frames
+        self.silence = bytes(FRAME_SAMPLES * 2)
+        # Per message, to mimic a caller on a poor network
+        self.read_delay = read_delay
+        # Start the next question as soon as the answer starts playing, talking over it
+        self.barge_in = barge_in
+        self.interrupted_at = None
+        self.barge_in_latencies = []
+        self.latencies = []
+        self.seq = 0
+        self.next_at = None
+        self.speech_ended_at = None
+        self.first_audio = asyncio.Event()
+        self.answer_done = asyncio.Event()
+        self.ready = asyncio.Event()
+
+    async def send_frame(self, ws, pcm):
+        if self.binary:
+            await ws.send(pack_frame(FRAME_AUDIO_INPUT, 0, self.seq, pcm))
+        else:
+            await ws.send(json.dumps({
+                "event_type": "audio_input_transmitting",
+                "event_data": base64.b64encode(pcm).decode("ascii")
+            }))
+        self.seq += 1
+
+    def on_audio(self):
+        if self.speech_ended_at is not None and not self.first_audio.is_set():
+            self.latencies.append(time.perf_counter() - self.speech_ended_at)
+            self.first_audio.set()
+
+    def on_answer_done(self):
+        # The end of an answer that was talked over can arrive while the next question is asked
+        if self.speech_ended_at is not None:
+            self.answer_done.set()
+
+    async def receive(self, ws):
+        async for message in ws:
+            if self.read_delay:
+                await asyncio.sleep(self.read_delay)
+            if isinstance(message, bytes):
+                frame_type = unpack_frame(message)[0]
+                if frame_type == FRAME_AUDIO_OUTPUT:
+                    self.on_audio()
+                continue
+            data = json.loads(message)
+            event_type = data.get('event_type')
+            if event_type == "checking connectivity":
+                self.ready.set()
+            elif event_type in ("audio_response_chunk", "audio_response_transmitting"):
+                self.on_audio()
+                if event_type == "audio_response_transmitting":
+                    self.on_answer_done()
+            elif event_type == "audio_response_done":
+                self.on_answer_done()
+            elif event_type == "audio_flush":
+                if self.interrupted_at is not None:
+                    self.barge_in_latencies.append(time.perf_counter() - self.interrupted_at)
+                    self.interrupted_at = None
+                await ws.send(json.dumps({"event_type": "audio_flushed", "response_id": data.get('response_id')}))
+
+    async def send_paced(self, ws, frame):
+        # Wait for the frame's slot first, so the last frame of a burst is timed when it leaves
+        interval = FRAME_SAMPLES / CLIENT_SAMPLE_RATE
+        now = time.perf_counter()
+        if self.next_at is None or self.next_at < now - interval:
+            self.next_at = now
+        await asyncio.sleep(max(0.0, self.next_at - now))
+        await self.send_frame(ws, frame)
+        self.next_at += interval
+
+    async def stream(self, ws, frames, until=None):
+        """Send frames at real time pace, then keep sending silence until `until` is set."""
+        for frame in frames:
+            await self.send_paced(ws, frame)
+        while until is not None and not until.is_set():
+            await self.send_paced(ws, self.silence)
+
+    async def run(self, timeout):
+        async with connect(self.url, max_size=None) as ws:
+            receiver = asyncio.create_task(self.receive(ws))
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout)
+                for turn in range(self.turns):
+                    interrupting = self.barge_in and turn > 0 and self.first_audio.is_set()
+                    self.first_audio.clear()
+                    self.answer_done.clear()
+                    self.speech_ended_at = None
+                    if interrupting:
+                        self.interrupted_at = time.perf_counter()
+                    await self.stream(ws, self.speech_frames)
+                    self.speech_ended_at = time.perf_counter()
+                    last = turn == self.turns - 1
+                    until = self.first_audio if self.barge_in and not last else self.answer_done
+                    try:
+                        await asyncio.wait_for(self.stream(ws, [], until=until), timeout)
+                    except asyncio.TimeoutError:
+                        continue
+                    if not self.barge_in:
+                        # A short pause before the caller speaks again
+                        await self.stream(ws, [self.silence] * self.silence_frames)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                receiver.cancel()
+
+def serve(args):
+    """Child process: the real app with the stand-ins wired in."""
+    os.environ.setdefault("OPENAI_API_KEY", "sk-local-stand-in")
+    os.environ["OPENAI_REALTIME_URL"] = args.realtime_url
+    # No browser keys are needed, and minting would call the real API
+    os.environ.setdefault("EPHEMERAL_KEY_POOL_SIZE", "0")
+    # Start every run with a cold answer cache unless one is given
+    os.environ.setdefault("ANSWER_CACHE_DIR", tempfile.mkdtemp(prefix="answer_cache_"))
+    import uvicorn
+    import rag
+    from fake_retrieval import StandInRetrievalService
+    service = StandInRetrievalService(embedding_delay=args.embedding_delay, search_delay=args.search_delay)
+    rag.retrieval_service = service
+    import app as app_module
+    logging.getLogger("websocket-audio").setLevel(logging.CRITICAL)
+    uvicorn.run(app_module.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+async def wait_for_server(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} did not come up")
+
+async def main(args):
+    fake_server, fake_url = await start_fake_server(
+        transcription_delay=args.transcription_delay,
+        response_delay=args.response_delay
+    )
+    child_args = [
+        sys.executable, os.path.abspath(__file__), "--serve",
+        "--realtime-url", fake_url, "--port", str(args.port),
+        "--embedding-delay", str(args.embedding_delay), "--search-delay", str(args.search_delay)
+    ]
+    # rag2 prints every question, keep the child quiet
+    child = subprocess.Popen(child_args, cwd=BACKEND_DIR, stdout=subprocess.DEVNULL)
+    try:
+        url = f"ws://127.0.0.1:{args.port}/ws"
+        await wait_for_server(args.port)
+        # Let the session pool pre-warm
+        await asyncio.sleep(1.0)
+
+        if args.pcm:
+            with open(args.pcm, "rb") as f:
+                utterance = f.read()
+        else:
+            utterance = synthetic_utterance()
+        speech_frames = split_frames(utterance)
+
+        idle_rss = proc_rss_bytes(child.pid)
+        cpu_start = proc_cpu_seconds(child.pid)
+        start = time.perf_counter()
+        clients = [
+            BrowserClient(url, speech_frames, not args.json, args.turns, args.pause_frames,
+                          read_delay=args.slow_delay if i < args.slow_clients else 0.0, barge_in=args.barge_in)
+            for i in range(args.clients)
+        ]
+        tasks = [asyncio.create_task(client.run(args.timeout)) for client in clients]
+        peak_rss = idle_rss
+        while not all(task.done() for task in tasks):
+            peak_rss = max(peak_rss, proc_rss_bytes(child.pid))
+            await asyncio.sleep(0.25)
+        await asyncio.gather(*tasks, return_exceptions=True)
+        wall = time.perf_counter() - start
+        cpu = proc_cpu_seconds(child.pid) - cpu_start
+
+        # Slow callers are there to load the server, the latency that matters is everyone else's
+        latencies = [l * 1000 for client in clients[args.slow_clients:] for l in client.latencies]
+        expected = (args.clients - args.slow_clients) * args.turns
+        print(f"clients={args.clients} turns={args.turns} protocol={'json' if args.json else 'binary'} "
+              f"transcription={args.transcription_delay * 1000:.0f}ms response={args.response_delay * 1000:.0f}ms "
+              f"embedding={args.embedding_delay * 1000:.0f}ms search={args.search_delay * 1000:.0f}ms "
+              f"slow_clients={args.slow_clients}")
+        print(f"completed turns: {len(latencies)}/{expected}  upstream turns: {fake_server.fake.turns}")
+        if latencies:
+            print(f"turn latency ms: p50={percentile(latencies, 50):.1f} p95={percentile(latencies, 95):.1f} "
+                  f"p99={percentile(latencies, 99):.1f} max={max(latencies):.1f}")
+        if args.barge_in:
+            interruptions = [l * 1000 for client in clients for l in client.barge_in_latencies]
+            expected_interruptions = args.clients * (args.turns - 1)
+            print(f"barge-ins flushed: {len(interruptions)}/{expected_interruptions}  "
+                  f"upstream responses cancelled: {fake_server.fake.cancelled}")
+            if interruptions:
+                print(f"speech start to audio_flush ms: p50={percentile(interruptions, 50):.1f} "
+                      f"p95={percentile(interruptions, 95):.1f} max={max(interruptions):.1f}")
+        print(f"server cpu: {cpu:.2f}s over {wall:.1f}s = {cpu / wall * 100:.1f}% of a core, "
+              f"{cpu / wall * 100 / args.clients:.2f}% per session")
+        print(f"server rss: idle {idle_rss / 2**20:.1f} MiB, peak {peak_rss / 2**20:.1f} MiB, "
+              f"{(peak_rss - idle_rss) / args.clients / 1024:.1f} KiB per session")
+    finally:
+        child.terminate()
+        child.wait()
+        fake_server.close()
+        await fake_server.wait_closed()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--pcm", help="raw mono PCM16 at 16 kHz to replay as each utterance")
+    parser.add_argument("--json", action="store_true", help="use the JSON + base64 protocol instead of binary frames")
+    parser.add_argument("--barge-in", action="store_true",
+                        help="ask the next question as soon as each answer starts, talking over it")
+    parser.add_argument("--pause-frames", type=int, default=4, help="silent frames between turns")
+    parser.add_argument("--transcription-delay", type=float, default=0.3)
+    parser.add_argument("--response-delay", type=float, default=0.3)
+    parser.add_argument("--embedding-delay", type=float, default=0.15)
+    parser.add_argument("--search-delay", type=float, default=0.03)
+    parser.add_argument("--slow-clients", type=int, default=0, help="clients that read slowly")
+    parser.add_argument("--slow-delay", type=float, default=0.5, help="seconds a slow client spends per message")
+    parser.add_argument("--timeout", type=float, default=20.0)
+    parser.add_argument("--port", type=int, default=8020)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--realtime-url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args)
+    else:
+        asyncio.run(main(args))
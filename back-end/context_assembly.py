@@ -0,0 +1,94 @@
+import math
+import os
+
+# Upper bound on retrieved context sent with each answer, in estimated tokens
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "300"))
+# Chunks whose source ranges are at most this many characters apart are joined
+MERGE_GAP_CHARS = 1
+# A passage cut down to fit the budget is dropped when less than this would remain
+MIN_PASSAGE_TOKENS = 16
+
+def estimate_tokens(text):
+    """Rough token count for English text, about four characters a token."""
+    return math.ceil(len(text) / 4)
+
+class _Passage:
+    def __init__(self, doc, rank):
+        meta = doc.metadata or {}
+        self.source = (meta.get("source"), meta.get("page"))
+        self.start = meta.get("start_index")
+        self.text = doc.page_content
+        self.rank = rank
+
+    @property
+    def end(self):
+        return self.start + len(self.text)
+
+    def absorb(self, other):
+        """Extend this passage with the part of a later one it does not already cover."""
+        if other.end > self.end:
+            self.text += other.text[self.end - other.start:] if other.start <= self.end else " " + other.text
+        self.rank = min(self.rank, other.rank)
+
+def merge_chunks(docs):
+    """
+    Collapse retrieved chunks into passages: chunks of the same page whose
+    start_index ranges overlap or touch are stitched into one, repeated
+    chunks are dropped, and whitespace is collapsed (pypdf puts a newline
+    between every word of the hospital PDF). Passages keep the order of
+    the best ranked chunk in them.
+    """
+    located = {}
+    passages = []
+    # Chunks without a start_index, deduplicated by their text
+    seen = set()
+    for rank, doc in enumerate(docs):
+        passage = _Passage(doc, rank)
+        if passage.start is None:
+            key = " ".join(passage.text.split())
+            if key not in seen:
+                seen.add(key)
+                passages.append(passage)
+        else:
+            located.setdefault(passage.source, []).append(passage)
+
+    for group in located.values():
+        group.sort(key=lambda p: (p.start, -len(p.text)))
+        current = group[0]
+        for passage in group[1:]:
+            if passage.start <= current.end + MERGE_GAP_CHARS:
+                current.absorb(passage)
+            else:
+                passages.append(current)
+                current = passage
+        passages.append(current)
+
+    passages.sort(key=lambda p: p.rank)
+    texts = []
+    emitted = set()
+    for passage in passages:
+        text = " ".join(passage.text.split())
+        if text and text not in emitted:
+            emitted.add(text)
+            texts.append(text)
+    return texts
+
+def assemble_context(docs, token_budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Merged passages for the retrieved chunks, best first, cut off once
+    token_budget is spent. The passage that crosses the budget is trimmed
+    at a word boundary, or left out if too little of it would fit.
+    """
+    texts = []
+    remaining = token_budget
+    for text in merge_chunks(docs):
+        tokens = estimate_tokens(text)
+        if tokens <= remaining:
+            texts.append(text)
+            remaining -= tokens
+            continue
+        if remaining >= MIN_PASSAGE_TOKENS:
+            cut = text[:remaining * 4].rsplit(" ", 1)[0]
+            texts.append(cut + " ...")
+        break
+    return texts
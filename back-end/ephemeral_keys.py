@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+import metrics
+
+logger = logging.getLogger("websocket-audio")
+
+# Overridable so tests can point at a local stand-in (fake_sessions.py)
+OPENAI_SESSIONS_URL = os.environ.get("OPENAI_SESSIONS_URL", "https://api.openai.com/v1/realtime/sessions")
+EPHEMERAL_KEY_MODEL = os.environ.get("EPHEMERAL_KEY_MODEL", "gpt-4o-realtime-preview-2024-12-17")
+EPHEMERAL_KEY_VOICE = os.environ.get("EPHEMERAL_KEY_VOICE", "verse")
+# Keys minted ahead of time (0 disables pre-minting, every request then mints)
+EPHEMERAL_KEY_POOL_SIZE = int(os.environ.get("EPHEMERAL_KEY_POOL_SIZE", "2"))
+# Keys this close to expires_at are never handed out and get replaced
+EPHEMERAL_KEY_REFRESH_MARGIN = float(os.environ.get("EPHEMERAL_KEY_REFRESH_MARGIN", "20"))
+EPHEMERAL_KEY_TIMEOUT = float(os.environ.get("EPHEMERAL_KEY_TIMEOUT", "10"))
+EPHEMERAL_KEY_CONNECTIONS = 4
+
+KEY_REQUESTS_POOL = metrics.ephemeral_key_requests.child("pool")
+KEY_REQUESTS_MINT = metrics.ephemeral_key_requests.child("mint")
+KEY_REQUESTS_SHARED = metrics.ephemeral_key_requests.child("shared")
+
+class EphemeralKeyService:
+    """
+    Hands out realtime client secrets from memory. A background task keeps
+    pool_size keys minted, replacing each one refresh_margin seconds before
+    its expires_at, over one keep-alive async HTTP client.
+
+    When the pool is empty, callers arriving while a mint is in flight wait
+    for it and get the same key rather than each starting their own call.
+    """
+
+    def __init__(self, url=OPENAI_SESSIONS_URL, pool_size=EPHEMERAL_KEY_POOL_SIZE,
+                 refresh_margin=EPHEMERAL_KEY_REFRESH_MARGIN, model=EPHEMERAL_KEY_MODEL,
+                 voice=EPHEMERAL_KEY_VOICE, timeout=EPHEMERAL_KEY_TIMEOUT):
+        self.url = url
+        self.pool_size = pool_size
+        self.refresh_margin = refresh_margin
+        self.model = model
+        self.voice = voice
+        self.timeout = timeout
+        # (value, expires_at) pairs, soonest to expire on the left
+        self.keys = deque()
+        self.minted = 0
+        self.served_from_pool = 0
+        self.shared = 0
+        self.failures = 0
+        self._client = None
+        self._client_lock = asyncio.Lock()
+        self._inflight = None
+        self._wake = asyncio.Event()
+        self._refill_task = None
+
+    def _build_client(self):
+        # Imported here so it stays off the cold start path
+        import httpx
+        return httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=EPHEMERAL_KEY_CONNECTIONS,
+                                max_keepalive_connections=EPHEMERAL_KEY_CONNECTIONS)
+        )
+
+    async def _http(self):
+        async with self._client_lock:
+            if self._client is None:
+                # The import and loading the CA bundle take a few hundred ms, not on the event loop
+                self._client = await asyncio.to_thread(self._build_client)
+        return self._client
+
+    async def start(self):
+        if self.pool_size > 0:
+            self._refill_task = asyncio.create_task(self._refill_loop())
+
+    async def close(self):
+        if self._refill_task:
+            self._refill_task.cancel()
+            self._refill_task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def mint(self):
+        """One upstream call. Returns (value, expires_at)."""
+        client = await self._http()
+        response = await client.post(
+            self.url,
+            headers={
+                "Authorization": f"Bearer {os.getenv('OPENAI_API_KEY')}",
+                "OpenAI-Beta": "realtime=v1"
+            },
+            json={"model": self.model, "voice": self.voice}
+        )
+        response.raise_for_status()
+        secret = response.json()["client_secret"]
+        self.minted += 1
+        return secret["value"], secret["expires_at"]
+
+    async def _mint_shared(self):
+        # Single flight: everyone who finds the pool empty rides on one call
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self.mint())
+            self._inflight.add_done_callback(self._clear_inflight)
+            KEY_REQUESTS_MINT.inc()
+        else:
+            self.shared += 1
+            KEY_REQUESTS_SHARED.inc()
+        return await asyncio.shield(self._inflight)
+
+    def _clear_inflight(self, future):
+        if self._inflight is future:
+            self._inflight = None
+
+    def _drop_stale(self):
+        cutoff = time.time() + self.refresh_margin
+        while self.keys and self.keys[0][1] <= cutoff:
+            self.keys.popleft()
+
+    async def get_key(self):
+        """Return a client secret value, from the pool when one is fresh enough."""
+        self._drop_stale()
+        if self.keys:
+            value, _ = self.keys.pop()
+            self.served_from_pool += 1
+            KEY_REQUESTS_POOL.inc()
+            self._wake.set()
+            return value
+        value, _ = await self._mint_shared()
+        return value
+
+    async def _refill_loop(self):
+        backoff = 1
+        while True:
+            self._drop_stale()
+            while len(self.keys) < self.pool_size:
+                try:
+                    key = await self.mint()
+                except Exception as e:
+                    self.failures += 1
+                    logger.error(f"Failed to pre-mint ephemeral key: {e!r}")
+                    # Back off so a bad API key or a failing upstream is not hammered
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 60)
+                    continue
+                backoff = 1
+                self.keys.append(key)
+                # Keep the deque ordered by expiry
+                self.keys = deque(sorted(self.keys, key=lambda k: k[1]))
+            self._wake.clear()
+            # Sleep until the oldest key needs replacing or one is handed out
+            sleep = self.keys[0][1] - self.refresh_margin - time.time() if self.keys else 0
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=max(sleep, 0.1))
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self):
+        now = time.time()
+        return {
+            "pool_size": self.pool_size,
+            "pooled": len(self.keys),
+            "seconds_left": [round(expires_at - now, 1) for _, expires_at in self.keys],
+            "minted": self.minted,
+            "served_from_pool": self.served_from_pool,
+            "shared": self.shared,
+            "failures": self.failures
+        }
+
+ephemeral_keys = EphemeralKeyService()
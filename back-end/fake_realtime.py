@@ -0,0 +1,221 @@
+import asyncio
+import base64
+import json
+import math
+import time
+import uuid
+import logging
+import numpy as np
+from websockets.asyncio.server import serve
+
+logger = logging.getLogger("fake-realtime")
+
+REALTIME_SAMPLE_RATE = 24000
+
+def canned_answer_audio(seconds=1.5, sample_rate=REALTIME_SAMPLE_RATE):
+    """A voiced-sounding answer: a few harmonics under a syllable-rate envelope, PCM16."""
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    voice = sum(np.sin(2 * np.pi * 180 * h * t) / h for h in range(1, 6))
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t - math.pi / 2)
+    return (voice * envelope * 6000).astype(np.int16).tobytes()
+
+class FakeSession:
+    """
+    State for one upstream connection. Plays the part of server_vad: a turn
+    ends after silence_duration_ms of quiet audio, or of no audio at all,
+    following speech.
+    """
+
+    def __init__(self, server, websocket):
+        self.server = server
+        self.websocket = websocket
+        self.session_id = "sess_" + uuid.uuid4().hex[:12]
+        self.in_speech = False
+        self.silence_ms = 0.0
+        self.last_append = 0.0
+        self.tasks = set()
+        self.active_response = None
+        self.cancelled = set()
+
+    async def send(self, event):
+        await self.websocket.send(json.dumps(event))
+
+    def spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def on_append(self, audio):
+        pcm = np.frombuffer(base64.b64decode(audio), dtype=np.int16)
+        if pcm.size == 0:
+            return
+        self.last_append = time.monotonic()
+        duration_ms = pcm.size * 1000 / REALTIME_SAMPLE_RATE
+        rms = np.sqrt(np.mean((pcm.astype(np.float32) / 32768) ** 2)) + 1e-10
+        if 20 * np.log10(rms) > self.server.speech_db:
+            if not self.in_speech:
+                self.in_speech = True
+                self.spawn(self.send({"type": "input_audio_buffer.speech_started"}))
+            self.silence_ms = 0.0
+        elif self.in_speech:
+            self.silence_ms += duration_ms
+            if self.silence_ms >= self.server.silence_duration_ms:
+                self.end_turn()
+
+    def end_turn(self):
+        self.in_speech = False
+        self.silence_ms = 0.0
+        self.server.turns += 1
+        self.spawn(self.transcribe("item_" + uuid.uuid4().hex[:12]))
+
+    async def watch_idle(self):
+        # The client side VAD stops sending during silence, so quiet can also mean no appends
+        interval = self.server.silence_duration_ms / 1000
+        while True:
+            await asyncio.sleep(interval / 4)
+            if self.in_speech and time.monotonic() - self.last_append >= interval:
+                self.end_turn()
+
+    async def transcribe(self, item_id):
+        await self.send({"type": "input_audio_buffer.speech_stopped", "item_id": item_id})
+        if self.server.transcript_deltas:
+            # Words stream over the first half of the transcription time, like gpt-4o-transcribe
+            words = self.server.transcript.split(" ")
+            interval = self.server.transcription_delay / 2 / len(words)
+            for i, word in enumerate(words):
+                await asyncio.sleep(interval)
+                await self.send({
+                    "type": "conversation.item.input_audio_transcription.delta",
+                    "item_id": item_id,
+                    "content_index": 0,
+                    "delta": word if i == 0 else " " + word
+                })
+            await asyncio.sleep(self.server.transcription_delay / 2)
+        else:
+            await asyncio.sleep(self.server.transcription_delay)
+        await self.send({
+            "type": "conversation.item.input_audio_transcription.completed",
+            "item_id": item_id,
+            "content_index": 0,
+            "transcript": self.server.transcript
+        })
+
+    async def respond(self, request):
+        response_id = "resp_" + uuid.uuid4().hex[:12]
+        metadata = request.get('response', {}).get('metadata')
+        await asyncio.sleep(self.server.response_delay)
+        await self.send({
+            "type": "response.created",
+            "response": {"id": response_id, "metadata": metadata, "conversation_id": None}
+        })
+        self.active_response = response_id
+
+        audio = self.server.answer_audio
+        chunk_bytes = int(REALTIME_SAMPLE_RATE * self.server.audio_chunk_ms / 1000) * 2
+        # Upstream generates audio faster than it plays, stream_speed times real time
+        interval = self.server.audio_chunk_ms / 1000 / self.server.stream_speed
+        for offset in range(0, len(audio), chunk_bytes):
+            if response_id in self.cancelled:
+                self.cancelled.discard(response_id)
+                self.active_response = None
+                self.server.cancelled += 1
+                await self.send({
+                    "type": "response.done",
+                    "response": {"id": response_id, "status": "cancelled", "metadata": metadata}
+                })
+                return
+            await self.send({
+                "type": "response.audio.delta",
+                "response_id": response_id,
+                "item_id": "item_" + response_id,
+                "delta": base64.b64encode(audio[offset:offset + chunk_bytes]).decode("ascii")
+            })
+            await asyncio.sleep(interval)
+        self.active_response = None
+        await self.send({"type": "response.audio.done", "response_id": response_id})
+        await self.send({
+            "type": "response.done",
+            "response": {"id": response_id, "status": "completed", "metadata": metadata}
+        })
+        self.server.responses += 1
+
+    async def run(self):
+        await asyncio.sleep(self.server.handshake_delay)
+        await self.send({"type": "session.created", "session": {"id": self.session_id}})
+        self.spawn(self.watch_idle())
+        try:
+            async for message in self.websocket:
+                data = json.loads(message)
+                if data['type'] == "session.update":
+                    await asyncio.sleep(self.server.handshake_delay)
+                    await self.send({
+                        "type": "session.updated",
+                        "session": {"id": self.session_id, **data.get('session', {})}
+                    })
+                elif data['type'] == "input_audio_buffer.append":
+                    self.on_append(data['audio'])
+                elif data['type'] == "input_audio_buffer.commit" and self.in_speech:
+                    self.end_turn()
+                elif data['type'] == "response.create":
+                    self.spawn(self.respond(data))
+                elif data['type'] == "response.cancel":
+                    response_id = data.get('response_id') or self.active_response
+                    if response_id == self.active_response and response_id is not None:
+                        self.cancelled.add(response_id)
+        finally:
+            for task in list(self.tasks):
+                task.cancel()
+
+class FakeRealtimeServer:
+    """
+    Local stand-in for wss://api.openai.com/v1/realtime. Speaks the subset of
+    the protocol OpenAITranscriber uses: the session handshake, audio
+    appends with a simple energy based turn detector, input transcription,
+    response.create answered with canned audio deltas, and response.cancel.
+    All latencies are in seconds.
+    """
+
+    def __init__(self, handshake_delay=0.0, transcription_delay=0.3, response_delay=0.3,
+                 answer_audio=None, audio_chunk_ms=100, stream_speed=4.0,
+                 silence_duration_ms=500, speech_db=-35.0, transcript_deltas=True,
+                 transcript="What are the visiting hours at Greenview Medical Centre?"):
+        # Simulated server-side latency before session.created / session.updated
+        self.handshake_delay = handshake_delay
+        self.transcription_delay = transcription_delay
+        # response.create until the first audio delta
+        self.response_delay = response_delay
+        self.answer_audio = answer_audio if answer_audio is not None else canned_answer_audio()
+        self.audio_chunk_ms = audio_chunk_ms
+        self.stream_speed = stream_speed
+        self.silence_duration_ms = silence_duration_ms
+        self.speech_db = speech_db
+        self.transcript = transcript
+        # Stream the transcript as delta events before the completed event
+        self.transcript_deltas = transcript_deltas
+        self.sessions = 0
+        self.turns = 0
+        self.responses = 0
+        self.cancelled = 0
+
+    async def handler(self, websocket):
+        self.sessions += 1
+        try:
+            await FakeSession(self, websocket).run()
+        finally:
+            self.sessions -= 1
+
+async def start_fake_server(host="127.0.0.1", port=0, **options):
+    """Start the stand-in server and return (server, ws_url)."""
+    fake = FakeRealtimeServer(**options)
+    server = await serve(fake.handler, host, port, max_size=None)
+    port = server.sockets[0].getsockname()[1]
+    server.fake = fake
+    return server, f"ws://{host}:{port}/v1/realtime"
+
+if __name__ == "__main__":
+    async def main():
+        server, url = await start_fake_server(port=8765)
+        print(f"Fake realtime server listening on {url}")
+        await server.serve_forever()
+
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+import hashlib
+import re
+import time
+import numpy as np
+from langchain_core.documents import Document
+from local_index import LocalVectorIndex
+from lexical_index import BM25Index
+from rag import RetrievalService
+
+CANNED_DOCUMENTS = (
+    "Greenview Medical Centre is located at 42 Elm Street, Greenview.",
+    "Visiting hours are 10am to 8pm every day, with quiet hours from 1pm to 3pm.",
+    "The outpatient clinic is open Monday to Friday from 8am to 6pm.",
+    "Appointments can be booked by phone or at the reception desk on the ground floor.",
+    "The emergency department is open 24 hours a day, 7 days a week.",
+    "Free parking is available for patients in the car park behind the main building.",
+)
+
+class HashingEmbeddings:
+    """
+    Offline stand-in for OpenAIEmbeddings: a hashed bag of words, so similar
+    questions still land near each other. delay simulates the API round trip.
+    """
+
+    def __init__(self, dimension=1536, delay=0.0):
+        self.dimension = dimension
+        self.delay = delay
+
+    def _embed(self, text):
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            vector[int.from_bytes(digest, "little") % self.dimension] += 1.0
+        return vector.tolist()
+
+    def embed_query(self, text):
+        if self.delay:
+            time.sleep(self.delay)
+        return self._embed(text)
+
+    def embed_documents(self, texts):
+        if self.delay:
+            time.sleep(self.delay)
+        return [self._embed(text) for text in texts]
+
+class DelayedStore:
+    """Wraps a vector store and adds a fixed delay per search, standing in for the Qdrant round trip."""
+
+    def __init__(self, store, delay=0.0):
+        self.store = store
+        self.delay = delay
+
+    def similarity_search_by_vector(self, embedding, k=3, **kwargs):
+        if self.delay:
+            time.sleep(self.delay)
+        return self.store.similarity_search_by_vector(embedding, k, **kwargs)
+
+class StandInRetrievalService(RetrievalService):
+    """
+    RetrievalService with the embedding and Qdrant calls replaced by local
+    stand-ins with configurable latency. Everything above them (the
+    retrieval cache, the BM25 index over the same documents, rag2, the
+    executor) is the real code path. documents are strings or Documents.
+    """
+
+    def __init__(self, embedding_delay=0.0, search_delay=0.0, documents=CANNED_DOCUMENTS, embedding=None, **kwargs):
+        embedding = embedding or HashingEmbeddings(delay=0.0)
+        docs = [
+            doc if isinstance(doc, Document) else Document(page_content=doc, metadata={"source": "stand-in"})
+            for doc in documents
+        ]
+        self.index = LocalVectorIndex.from_documents(docs, embedding)
+        self.lexical = BM25Index.from_documents(docs)
+        if isinstance(embedding, HashingEmbeddings):
+            embedding.delay = embedding_delay
+        self.search_delay = search_delay
+        super().__init__(embedding=embedding, backend="local", **kwargs)
+
+    def vector_store(self, collection_name="hospital_db"):
+        return DelayedStore(self.index, self.search_delay)
+
+    def lexical_index(self, collection_name="hospital_db"):
+        return self.lexical if self.hybrid else None
+
+    def collection_version(self, collection_name="hospital_db"):
+        return "stand-in"
@@ -0,0 +1,82 @@
+import asyncio
+import json
+import time
+import uuid
+import logging
+
+logger = logging.getLogger("fake-sessions")
+
+class FakeSessionsServer:
+    """
+    Local stand-in for POST /v1/realtime/sessions, the call that mints
+    ephemeral client secrets. A bare HTTP/1.1 server with keep-alive, so
+    connection reuse shows up in `connections`. delay is the simulated
+    upstream latency in seconds, expires_in the lifetime of each secret.
+    """
+
+    def __init__(self, delay=0.2, expires_in=60):
+        self.delay = delay
+        self.expires_in = expires_in
+        self.requests = 0
+        self.connections = 0
+
+    async def handler(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    return
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", "0")))
+
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                if method == "POST" and path.startswith("/v1/realtime/sessions"):
+                    self.requests += 1
+                    await asyncio.sleep(self.delay)
+                    request = json.loads(body or b"{}")
+                    status, payload = "200 OK", {
+                        "id": "sess_" + uuid.uuid4().hex[:12],
+                        "object": "realtime.session",
+                        "model": request.get("model"),
+                        "voice": request.get("voice"),
+                        "client_secret": {
+                            "value": "ek_" + uuid.uuid4().hex,
+                            "expires_at": int(time.time() + self.expires_in)
+                        }
+                    }
+                else:
+                    status, payload = "404 Not Found", {"error": {"message": "not found"}}
+
+                data = json.dumps(payload).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+async def start_fake_sessions_server(host="127.0.0.1", port=0, **options):
+    """Start the stand-in and return (server, sessions_url)."""
+    fake = FakeSessionsServer(**options)
+    server = await asyncio.start_server(fake.handler, host, port)
+    port = server.sockets[0].getsockname()[1]
+    server.fake = fake
+    return server, f"http://{host}:{port}/v1/realtime/sessions"
+
+if __name__ == "__main__":
+    async def main():
+        server, url = await start_fake_sessions_server(port=8766)
+        print(f"Fake sessions endpoint listening on {url}")
+        await server.serve_forever()
+
+    asyncio.run(main())
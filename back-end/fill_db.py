@@ -1,52 +1,261 @@
-from langchain_community.document_loaders import PyPDFLoader
+from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings
-from langchain_qdrant import QdrantVectorStore
+from qdrant_client import QdrantClient, models
+from local_index import LocalVectorIndex
+from lexical_index import BM25Index
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import glob
+import hashlib
 import os
+import time
+import uuid
+import requests
 from dotenv import load_dotenv
 
-def fill_db(collection_name="hospital_db", file_path="./data/hospital_data.pdf"):
+# Source documents to ingest, comma separated paths or globs
+INGEST_SOURCES = os.environ.get("INGEST_SOURCES", "./data/*.pdf")
+PARSE_WORKERS = int(os.environ.get("INGEST_PARSE_WORKERS", str(os.cpu_count() or 2)))
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "64"))
+EMBED_CONCURRENCY = int(os.environ.get("EMBED_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = int(os.environ.get("EMBED_MAX_RETRIES", "5"))
+UPSERT_BATCH_SIZE = 256
+# Fixed namespace so the same chunk always maps to the same point id
+POINT_NAMESPACE = uuid.UUID("5b0c1f4e-2f7a-4c53-9d1e-8a4f6c2b7e10")
+
+def resolve_sources(sources):
+    if isinstance(sources, str):
+        sources = sources.split(",")
+    paths = []
+    for pattern in sources:
+        matches = sorted(glob.glob(pattern.strip()))
+        paths.extend(matches if matches else [pattern.strip()])
+    return paths
+
+def load_pdf_pages(file_path, page_numbers):
+    """Worker: extract text for a range of pages of one PDF."""
+    from pypdf import PdfReader
+    reader = PdfReader(file_path)
+    return [
+        (reader.pages[i].extract_text() or "", {"source": file_path, "page": i})
+        for i in page_numbers
+    ]
+
+def load_documents(paths, workers=PARSE_WORKERS):
+    """Parse all sources, spreading the pages of each PDF across worker processes."""
+    from pypdf import PdfReader
+    documents = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = []
+        for path in paths:
+            if path.lower().endswith(".pdf"):
+                n_pages = len(PdfReader(path).pages)
+                per_worker = max(1, -(-n_pages // workers))
+                for start in range(0, n_pages, per_worker):
+                    pages = range(start, min(start + per_worker, n_pages))
+                    futures.append(pool.submit(load_pdf_pages, path, pages))
+            else:
+                with open(path, encoding="utf-8") as f:
+                    documents.append(Document(page_content=f.read(), metadata={"source": path, "page": 0}))
+        for future in futures:
+            documents.extend(Document(page_content=text, metadata=meta) for text, meta in future.result())
+    return documents
+
+def split_documents(documents):
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=300,
+        chunk_overlap=100,
+        length_function=len,
+        is_separator_regex=False,
+        add_start_index=True
+    )
+    chunks = text_splitter.split_documents(documents)
+    for chunk in chunks:
+        chunk.metadata["content_hash"] = hashlib.sha256(chunk.page_content.encode("utf-8")).hexdigest()
+    return chunks
+
+def point_id(chunk):
+    meta = chunk.metadata
+    key = f"{meta['source']}:{meta['page']}:{meta.get('start_index', 0)}:{meta['content_hash']}"
+    return str(uuid.uuid5(POINT_NAMESPACE, key))
+
+def embed_with_retry(embeddings, texts):
+    for attempt in range(EMBED_MAX_RETRIES):
+        try:
+            return embeddings.embed_documents(texts)
+        except Exception as e:
+            if attempt == EMBED_MAX_RETRIES - 1:
+                raise
+            delay = 2 ** attempt
+            print(f"Embedding batch failed ({e}), retrying in {delay}s")
+            time.sleep(delay)
+
+def embed_missing(chunks, known_vectors, embeddings):
+    """
+    Embed only the chunks whose content hash has no known vector, in
+    EMBED_BATCH_SIZE batches with EMBED_CONCURRENCY requests in flight.
+    """
+    missing = {}
+    for chunk in chunks:
+        content_hash = chunk.metadata["content_hash"]
+        if content_hash not in known_vectors:
+            missing[content_hash] = chunk.page_content
+
+    vectors = dict(known_vectors)
+    hashes = list(missing)
+    batches = [hashes[i:i + EMBED_BATCH_SIZE] for i in range(0, len(hashes), EMBED_BATCH_SIZE)]
+    with ThreadPoolExecutor(max_workers=EMBED_CONCURRENCY) as pool:
+        results = pool.map(lambda batch: embed_with_retry(embeddings, [missing[h] for h in batch]), batches)
+        for batch, batch_vectors in zip(batches, results):
+            vectors.update(zip(batch, batch_vectors))
+    return vectors, len(hashes)
+
+def existing_qdrant_vectors(client, collection_name):
+    """Vectors already stored behind the live collection or alias, keyed by content hash."""
+    vectors = {}
+    try:
+        offset = None
+        while True:
+            points, offset = client.scroll(
+                collection_name=collection_name,
+                limit=UPSERT_BATCH_SIZE,
+                offset=offset,
+                with_payload=["metadata.content_hash"],
+                with_vectors=True
+            )
+            for point in points:
+                content_hash = (point.payload.get("metadata") or {}).get("content_hash")
+                if content_hash and isinstance(point.vector, list):
+                    vectors[content_hash] = point.vector
+            if offset is None:
+                return vectors
+    except Exception:
+        # No live collection yet, everything gets embedded
+        return vectors
+
+def publish_qdrant(client, alias, chunks, vectors):
+    """
+    Upsert into a fresh shadow collection, then repoint the alias in one
+    atomic alias update so rag.py never queries a half-built collection.
+    """
+    # The uuid keeps two ingests started in the same second apart
+    shadow = f"{alias}_{int(time.time())}_{uuid.uuid4().hex[:8]}"
+    dimension = len(next(iter(vectors.values())))
+    client.create_collection(
+        collection_name=shadow,
+        vectors_config=models.VectorParams(size=dimension, distance=models.Distance.COSINE)
+    )
+    points = [
+        models.PointStruct(
+            id=point_id(chunk),
+            vector=vectors[chunk.metadata["content_hash"]],
+            payload={"page_content": chunk.page_content, "metadata": chunk.metadata}
+        )
+        for chunk in chunks
+    ]
+    for i in range(0, len(points), UPSERT_BATCH_SIZE):
+        client.upsert(collection_name=shadow, points=points[i:i + UPSERT_BATCH_SIZE], wait=True)
+
+    old_collections = [a.collection_name for a in client.get_aliases().aliases if a.alias_name == alias]
+    operations = []
+    if old_collections:
+        operations.append(models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=alias)))
+    elif client.collection_exists(alias):
+        # One-time migration from the old plain collection: the name has to be
+        # freed before it can become an alias, so there is a short gap here
+        client.delete_collection(alias)
+    operations.append(models.CreateAliasOperation(
+        create_alias=models.CreateAlias(collection_name=shadow, alias_name=alias)
+    ))
+    client.update_collection_aliases(change_aliases_operations=operations)
+
+    for old in old_collections:
+        if old != shadow:
+            client.delete_collection(old)
+    return shadow
+
+def existing_local_vectors(index_dir):
+    try:
+        index = LocalVectorIndex.load(index_dir)
+    except FileNotFoundError:
+        return {}
+    return {
+        doc.metadata["content_hash"]: index.vectors[i]
+        for i, doc in enumerate(index.documents) if "content_hash" in doc.metadata
+    }
+
+def fill_db(collection_name="hospital_db", file_path=INGEST_SOURCES, backend=None):
     # Load environment variables (for API keys)
     load_dotenv()
-    
+    backend = backend or os.environ.get("VECTOR_BACKEND", "qdrant")
+
     # Check for required environment variables
     openai_api_key = os.environ.get("OPENAI_API_KEY")
     qdrant_url = os.environ.get("QDRANT_URL")
     qdrant_api_key = os.environ.get("QDRANT_API_KEY")
-    
-    if not all([openai_api_key, qdrant_url, qdrant_api_key]):
+
+    if backend == "local":
+        if not openai_api_key:
+            raise ValueError("Missing required environment variable: OPENAI_API_KEY")
+    elif not all([openai_api_key, qdrant_url, qdrant_api_key]):
         raise ValueError("Missing required environment variables: OPENAI_API_KEY, QDRANT_URL, or QDRANT_API_KEY")
-    
+
     # Initialize OpenAI embedding model
     embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-    
-    # Load document
-    loader = PyPDFLoader(file_path=file_path)
-    raw_documents = loader.load()
-    
-    # Split document
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=300,
-        chunk_overlap=100,
-        length_function=len,
-        is_separator_regex=False
-    )
-    chunks = text_splitter.split_documents(raw_documents)
-    
-    # Create or update Qdrant collection with embeddings
-    # If collection exists, it will add to it; to recreate, you'd need to delete it from Qdrant dashboard
-    vector_store = QdrantVectorStore.from_documents(
-        documents=chunks,
-        embedding=embeddings,
-        url=qdrant_url,
-        api_key=qdrant_api_key,
-        collection_name=collection_name,
-        force_recreate=True  # Set to True to recreate collection if it exists
-    )
-    
-    print(f"Added {len(chunks)} documents to Qdrant collection '{collection_name}' with OpenAI embeddings")
-    
-    return vector_store
+
+    # Load and split documents
+    start = time.perf_counter()
+    paths = resolve_sources(file_path)
+    chunks = split_documents(load_documents(paths))
+    parsed = time.perf_counter()
+
+    if backend == "local":
+        # Build the in-process index rag.py loads when VECTOR_BACKEND=local
+        index_dir = os.path.join(os.environ.get("LOCAL_INDEX_DIR", "./data/local_index"), collection_name)
+        vectors, embedded = embed_missing(chunks, existing_local_vectors(index_dir), embeddings)
+        index = LocalVectorIndex(
+            LocalVectorIndex.normalize([vectors[c.metadata["content_hash"]] for c in chunks]),
+            chunks,
+            embeddings
+        )
+        # Same string rag.RetrievalService.collection_version reports for it
+        version = f"{collection_name}@{index.save(index_dir)}"
+        target = index_dir
+    else:
+        client = QdrantClient(url=qdrant_url, api_key=qdrant_api_key)
+        vectors, embedded = embed_missing(chunks, existing_qdrant_vectors(client, collection_name), embeddings)
+        target = publish_qdrant(client, collection_name, chunks, vectors)
+        version = target
+
+    # BM25 over the same chunks, which rag.py consults before embedding a question.
+    # Servers that cannot see this directory, or find it tagged with another
+    # version, rebuild it from the collection instead
+    lexical_dir = os.path.join(os.environ.get("LEXICAL_INDEX_DIR", "./data/lexical_index"), collection_name)
+    BM25Index.from_documents(chunks, version=version).save(lexical_dir)
+
+    print(f"Ingested {len(chunks)} chunks from {len(paths)} source(s) into '{target}': "
+          f"{embedded} embedded, {len(chunks) - embedded} reused, "
+          f"parse {parsed - start:.2f}s, total {time.perf_counter() - start:.2f}s")
+
+    return {"chunks": len(chunks), "embedded": embedded, "target": target}
+
+def notify_refresh(collection_name="hospital_db"):
+    # Let a running server drop its cached vector stores for the recreated collection
+    refresh_url = os.environ.get("RAG_REFRESH_URL")
+    if not refresh_url:
+        return
+    try:
+        response = requests.post(
+            refresh_url,
+            params={"collection_name": collection_name},
+            headers={"X-Refresh-Token": os.environ.get("RAG_REFRESH_TOKEN", "")},
+            timeout=5
+        )
+        response.raise_for_status()
+        print(f"Notified {refresh_url} to refresh '{collection_name}'")
+    except Exception as e:
+        print(f"Failed to notify {refresh_url}: {e}")
 
 if __name__ == "__main__":
-    fill_db()
\ No newline at end of file
+    fill_db()
+    notify_refresh()
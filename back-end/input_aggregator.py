@@ -0,0 +1,84 @@
+import asyncio
+import base64
+import os
+
+# Coalesce browser buffers into upstream appends of about this much audio (0 = send every buffer)
+INPUT_TARGET_MS = int(os.environ.get("INPUT_TARGET_MS", "100"))
+# Never hold input audio longer than this before sending it. Audio arrives in
+# real time, so this has to exceed the target or batches never reach it
+INPUT_MAX_DELAY_MS = int(os.environ.get("INPUT_MAX_DELAY_MS", "150"))
+
+APPEND_PREFIX = '{"type": "input_audio_buffer.append", "audio": "'
+APPEND_SUFFIX = '"}'
+
+def append_event(base64_audio):
+    """The input_audio_buffer.append event as JSON text. Base64 needs no escaping, so no json.dumps pass."""
+    return APPEND_PREFIX + base64_audio + APPEND_SUFFIX
+
+class InputAggregator:
+    """
+    Batches upstream-bound PCM16 into appends of at least target_ms of
+    audio. Pending audio is flushed when it reaches the target, when the
+    oldest pending byte is max_delay_ms old, or when the caller flushes at
+    speech end. Pending chunks are kept as a list and joined once per event.
+
+    transform (e.g. a resampler's process) runs on the joined audio at
+    flush time, so it too is called once per event instead of per buffer.
+    """
+
+    def __init__(self, send, sample_rate, target_ms=INPUT_TARGET_MS, max_delay_ms=INPUT_MAX_DELAY_MS,
+                 transform=None):
+        # async send(text) -> bool
+        self.send = send
+        self.transform = transform
+        self.target_bytes = sample_rate * target_ms // 1000 * 2
+        self.max_delay = max_delay_ms / 1000
+        self.parts = []
+        self.pending_bytes = 0
+        self.events = 0
+        self.bytes_sent = 0
+        self._timer = None
+        self._deadline_task = None
+
+    async def add(self, pcm):
+        if not pcm:
+            return True
+        self.parts.append(pcm)
+        self.pending_bytes += len(pcm)
+        if self.pending_bytes >= self.target_bytes:
+            return await self.flush()
+        if self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self._on_deadline)
+        return True
+
+    def _on_deadline(self):
+        self._timer = None
+        self._deadline_task = asyncio.create_task(self.flush())
+
+    async def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self.parts:
+            return True
+        pcm = self.parts[0] if len(self.parts) == 1 else b"".join(self.parts)
+        self.parts = []
+        self.pending_bytes = 0
+        if self.transform is not None:
+            pcm = self.transform(pcm)
+        self.events += 1
+        self.bytes_sent += len(pcm)
+        return await self.send(append_event(base64.b64encode(pcm).decode("ascii")))
+
+    def close(self):
+        """Drop pending audio and stop the deadline timer."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._deadline_task is not None:
+            self._deadline_task.cancel()
+        self.parts = []
+        self.pending_bytes = 0
+
+    def stats(self):
+        return {"events": self.events, "bytes_sent": self.bytes_sent, "pending_bytes": self.pending_bytes}
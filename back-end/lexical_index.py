@@ -0,0 +1,150 @@
+import json
+import math
+import os
+import re
+import numpy as np
+from collections import Counter
+
+LEXICAL_FILE = "lexical.json"
+# A lexical hit is trusted without embedding the question when the top chunk
+# covers this share of the question's term weight (idf) ...
+LEXICAL_MIN_COVERAGE = float(os.environ.get("LEXICAL_MIN_COVERAGE", "0.6"))
+# ... and outscores the runner-up by this factor
+LEXICAL_MIN_MARGIN = float(os.environ.get("LEXICAL_MIN_MARGIN", "1.1"))
+
+_WORD = re.compile(r"\w+")
+STOPWORDS = frozenset("""
+a about an and any are as at be been but by can could do does for from get had has have how
+i if in is it its know like many me much my need of on or our please should so tell that the
+their there this to us want was we what when where which who whom why will with would you your
+""".split())
+
+def tokenize(text):
+    """Lowercased words without stopwords, with plurals folded onto the singular."""
+    tokens = []
+    for word in _WORD.findall(text.lower()):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 4 and word.endswith("ies"):
+            word = word[:-3] + "y"
+        elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+def document_key(doc):
+    """Identity of a chunk across the lexical and vector indexes."""
+    return doc.metadata.get("content_hash") or doc.page_content
+
+def reciprocal_rank_fusion(rankings, k, rrf_k=60):
+    """Fuse ranked lists of documents: each one scores sum(1 / (rrf_k + rank)) over the lists."""
+    scores = {}
+    docs = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = document_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            docs.setdefault(key, doc)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [docs[key] for key in best]
+
+class BM25Index:
+    """
+    Okapi BM25 over the same chunks fill_db.py embeds, held in memory. The
+    per-document side of the formula is fixed once the corpus is, so each
+    term's postings store final weights and a query is a sum over postings.
+
+    fill_db.py builds and saves it next to the vectors, tagged with the
+    collection version it was built from. rag.py loads it per collection
+    and rebuilds it from the collection itself when the tag does not match.
+    """
+
+    def __init__(self, documents, postings, idf, version=None):
+        self.documents = documents
+        # rag.RetrievalService.collection_version of the data it was built from
+        self.version = version
+        # term -> (document indices, weights)
+        self.postings = postings
+        self.idf = idf
+        self.max_idf = max(idf.values(), default=0.0)
+
+    @classmethod
+    def from_documents(cls, documents, k1=1.5, b=0.75, version=None):
+        documents = list(documents)
+        counts = [Counter(tokenize(doc.page_content)) for doc in documents]
+        lengths = np.array([sum(c.values()) for c in counts], dtype=np.float32)
+        average = float(lengths.mean()) if len(documents) else 0.0
+        n = len(documents)
+
+        by_term = {}
+        for i, c in enumerate(counts):
+            for term, tf in c.items():
+                by_term.setdefault(term, []).append((i, tf))
+        postings = {}
+        idf = {}
+        for term, entries in by_term.items():
+            idf[term] = math.log(1 + (n - len(entries) + 0.5) / (len(entries) + 0.5))
+            indices = np.array([i for i, _ in entries], dtype=np.int32)
+            tf = np.array([tf for _, tf in entries], dtype=np.float32)
+            norm = k1 * (1 - b + b * lengths[indices] / average)
+            postings[term] = (indices, (idf[term] * tf * (k1 + 1) / (tf + norm)).astype(np.float32))
+        return cls(documents, postings, idf, version)
+
+    def save(self, index_dir):
+        os.makedirs(index_dir, exist_ok=True)
+        tmp = os.path.join(index_dir, LEXICAL_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump({
+                "version": self.version,
+                "documents": [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in self.documents],
+                "idf": self.idf,
+                "postings": {term: [indices.tolist(), weights.tolist()]
+                             for term, (indices, weights) in self.postings.items()}
+            }, f)
+        os.replace(tmp, os.path.join(index_dir, LEXICAL_FILE))
+
+    @classmethod
+    def load(cls, index_dir):
+        from langchain_core.documents import Document
+        with open(os.path.join(index_dir, LEXICAL_FILE)) as f:
+            data = json.load(f)
+        documents = [Document(page_content=d["page_content"], metadata=d["metadata"]) for d in data["documents"]]
+        postings = {
+            term: (np.array(indices, dtype=np.int32), np.array(weights, dtype=np.float32))
+            for term, (indices, weights) in data["postings"].items()
+        }
+        return cls(documents, postings, data["idf"], data.get("version"))
+
+    def search(self, query, k=3):
+        """Return ([(index, score)] best first, coverage of the top hit) for a question."""
+        terms = set(tokenize(query))
+        if not terms or not self.documents:
+            return [], 0.0
+        scores = np.zeros(len(self.documents), dtype=np.float32)
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is not None:
+                scores[posting[0]] += posting[1]
+        k = min(k, len(self.documents))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        hits = [(int(i), float(scores[i])) for i in top if scores[i] > 0]
+        if not hits:
+            return [], 0.0
+
+        # Words the corpus has never seen count as fully informative and unmatched
+        total = sum(self.idf.get(term, self.max_idf) for term in terms)
+        best = hits[0][0]
+        matched = sum(self.idf[term] for term in terms
+                      if term in self.postings and best in self.postings[term][0])
+        return hits, matched / total
+
+    def confident(self, hits, coverage, min_coverage=LEXICAL_MIN_COVERAGE, min_margin=LEXICAL_MIN_MARGIN):
+        """Whether the lexical hits alone are good enough to answer from."""
+        if not hits or coverage < min_coverage:
+            return False
+        return len(hits) == 1 or hits[0][1] >= min_margin * hits[1][1]
+
+    def similarity_search(self, query, k=3):
+        hits, _ = self.search(query, k)
+        return [self.documents[i] for i, _ in hits]
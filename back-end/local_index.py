@@ -0,0 +1,118 @@
+import json
+import os
+import shutil
+import time
+import uuid
+import numpy as np
+from langchain_core.documents import Document
+
+VECTORS_FILE = "vectors.npy"
+DOCUMENTS_FILE = "documents.json"
+# Names the version directory holding the live vectors and documents
+CURRENT_FILE = "CURRENT"
+
+class LocalVectorIndex:
+    """
+    In-process vector index: a matrix of L2-normalized embeddings searched by
+    brute-force dot product. Saved as a .npy file next to the documents in a
+    version directory, and memory-mapped on load. Exposes the same
+    similarity_search* methods rag.py uses on QdrantVectorStore.
+
+    The hospital corpus is a few hundred 300-character chunks, so exact
+    search over the whole matrix takes microseconds and needs no ANN index.
+    """
+
+    def __init__(self, vectors, documents, embedding=None):
+        self.vectors = vectors
+        self.documents = documents
+        self.embedding = embedding
+
+    @staticmethod
+    def normalize(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    @classmethod
+    def from_documents(cls, documents, embedding):
+        texts = [doc.page_content for doc in documents]
+        vectors = cls.normalize(embedding.embed_documents(texts)) if texts else np.zeros((0, 0), np.float32)
+        return cls(vectors, list(documents), embedding)
+
+    def save(self, index_dir):
+        """
+        Write the vectors and documents into a new version directory, then
+        repoint CURRENT at it with one os.replace, so a reader or a crash
+        never pairs the vectors of one ingest with the documents of another.
+        """
+        os.makedirs(index_dir, exist_ok=True)
+        version = f"v{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+        version_dir = os.path.join(index_dir, version)
+        os.makedirs(version_dir)
+        with open(os.path.join(version_dir, VECTORS_FILE), "wb") as f:
+            np.save(f, np.ascontiguousarray(self.vectors, dtype=np.float32))
+        with open(os.path.join(version_dir, DOCUMENTS_FILE), "w") as f:
+            json.dump(
+                [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in self.documents], f
+            )
+        previous = self.current_version(index_dir)
+        pointer_tmp = os.path.join(index_dir, CURRENT_FILE + ".tmp")
+        with open(pointer_tmp, "w") as f:
+            f.write(version)
+        os.replace(pointer_tmp, os.path.join(index_dir, CURRENT_FILE))
+
+        # Keep the version just replaced for readers that resolved CURRENT a moment ago
+        for name in os.listdir(index_dir):
+            path = os.path.join(index_dir, name)
+            if name.startswith("v") and name not in (version, previous) and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+        for name in (VECTORS_FILE, DOCUMENTS_FILE):
+            # Files of the old flat layout
+            if os.path.exists(os.path.join(index_dir, name)):
+                os.remove(os.path.join(index_dir, name))
+        return version
+
+    @staticmethod
+    def current_version(index_dir):
+        """The version directory CURRENT points at, or None for an index in the old flat layout."""
+        try:
+            with open(os.path.join(index_dir, CURRENT_FILE)) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    @classmethod
+    def load(cls, index_dir, embedding=None, mmap=True):
+        version = cls.current_version(index_dir)
+        if version is not None:
+            index_dir = os.path.join(index_dir, version)
+        vectors = np.load(os.path.join(index_dir, VECTORS_FILE), mmap_mode="r" if mmap else None)
+        with open(os.path.join(index_dir, DOCUMENTS_FILE)) as f:
+            documents = [Document(page_content=d["page_content"], metadata=d["metadata"]) for d in json.load(f)]
+        if vectors.shape[0] != len(documents):
+            raise ValueError(
+                f"Index in {index_dir} has {vectors.shape[0]} vectors but {len(documents)} documents"
+            )
+        return cls(vectors, documents, embedding)
+
+    def search_by_vector(self, query_vector, k=3):
+        """Return [(index, score)] for the k most similar chunks, best first."""
+        if len(self.documents) == 0:
+            return []
+        query = self.normalize(query_vector)
+        scores = self.vectors @ query
+        k = min(k, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def similarity_search_by_vector(self, embedding, k=3, **kwargs):
+        return [self.documents[i] for i, _ in self.search_by_vector(embedding, k)]
+
+    def similarity_search_with_score(self, query, k=3, **kwargs):
+        hits = self.search_by_vector(self.embedding.embed_query(query), k)
+        return [(self.documents[i], score) for i, score in hits]
+
+    def similarity_search(self, query, k=3, **kwargs):
+        return self.similarity_search_by_vector(self.embedding.embed_query(query), k)
@@ -0,0 +1,209 @@
+from bisect import bisect_left
+import threading
+
+# Seconds, for stages that involve a network round trip
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Seconds, for in-process audio work on a single chunk
+PROCESSING_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+# Bytes, for the size of events sent upstream
+BYTE_BUCKETS = (256, 512, 1024, 2048, 4096, 8192, 16384)
+
+class Histogram:
+    """
+    Fixed-bucket histogram. observe() is a bisect and two increments, so it
+    is cheap enough for per-chunk use. Observations are made from the event
+    loop thread only, which is why there is no lock.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels}le="{bound}"}} {cumulative}'
+        cumulative += self.counts[-1]
+        yield f'{name}_bucket{{{labels}le="+Inf"}} {cumulative}'
+        labels = f"{{{labels.rstrip(',')}}}" if labels else ""
+        yield f"{name}_sum{labels} {self.sum}"
+        yield f"{name}_count{labels} {cumulative}"
+
+class Gauge:
+    """A value that is either set directly or read from a function at scrape time."""
+
+    def __init__(self):
+        self.value = 0
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set_function(self, function):
+        self.function = function
+
+    def samples(self, name, labels):
+        value = self.function() if self.function is not None else self.value
+        labels = labels.rstrip(",")
+        yield f"{name}{{{labels}}} {value}" if labels else f"{name} {value}"
+
+class Counter(Gauge):
+    """Monotonic count, exported with the counter type."""
+
+class Metric:
+    """
+    A named family with its label values fixed at registration. child()
+    returns the series for one label value, so hot paths look it up once
+    and keep the reference instead of building label sets per event.
+    """
+
+    def __init__(self, kind, name, help_text, factory, label=None, values=None):
+        self.kind = kind
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.children = {value: factory() for value in (values or (None,))}
+
+    def child(self, value=None):
+        return self.children[value]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for value, series in self.children.items():
+            labels = f'{self.label}="{value}",' if self.label else ""
+            lines.extend(series.samples(self.name, labels))
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS, label=None, values=None):
+        return self._register(Metric("histogram", name, help_text, lambda: Histogram(buckets), label, values))
+
+    def gauge(self, name, help_text, label=None, values=None):
+        return self._register(Metric("gauge", name, help_text, Gauge, label, values))
+
+    def counter(self, name, help_text, label=None, values=None):
+        return self._register(Metric("counter", name, help_text, Counter, label, values))
+
+    def _register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+speech_to_transcript = registry.histogram(
+    "speech_end_to_transcript_seconds",
+    "From upstream speech_stopped to the completed input transcript"
+).child()
+rag_stage = registry.histogram(
+    "rag_stage_seconds",
+    "Transcript to retrieval result, split into BM25 lookup, embedding, vector search and total",
+    label="stage", values=("lexical", "embedding", "search", "total")
+)
+retrieval_path = registry.counter(
+    "retrieval_path_total",
+    "Retrievals by how the chunks were found: BM25 alone (lexical), BM25 fused with "
+    "vector search (hybrid) or vector search alone (vector)",
+    label="path", values=("lexical", "hybrid", "vector")
+)
+prompt_bytes = registry.histogram(
+    "response_prompt_bytes",
+    "Size of each answer's response.create event as sent, and as the full-prompt form would have been (baseline)",
+    buckets=BYTE_BUCKETS, label="form", values=("sent", "baseline")
+)
+first_audio = registry.histogram(
+    "response_first_audio_seconds",
+    "From sending response.create to the first answer audio sent to the client"
+).child()
+audio_processing = registry.histogram(
+    "audio_processing_seconds",
+    "Per-chunk answer audio work: decode and resample (reconstruct), then framing or base64 (encode)",
+    buckets=PROCESSING_BUCKETS, label="stage", values=("reconstruct", "encode")
+)
+client_send = registry.histogram(
+    "client_send_seconds",
+    "Time spent in a single send to the browser websocket",
+    buckets=PROCESSING_BUCKETS + (0.25, 0.5, 1.0), label="kind", values=("json", "binary")
+)
+active_sessions = registry.gauge("active_sessions", "Open /ws sessions").child()
+threads = registry.gauge("process_threads", "Live Python threads").child()
+threads.set_function(threading.active_count)
+queued_frames = registry.gauge("queued_frames", "Audio frames waiting to be sent, across sessions").child()
+outbound_queued_bytes = registry.gauge(
+    "outbound_queued_bytes", "Bytes waiting in per-session outbound queues, across sessions"
+).child()
+outbound_dropped = registry.counter(
+    "outbound_dropped_frames_total", "Audio messages dropped because a client could not keep up"
+).child()
+outbound_blocked = registry.counter(
+    "outbound_blocked_total", "Times an upstream reader waited for space in a full outbound queue"
+).child()
+speculative_retrievals = registry.counter(
+    "speculative_retrievals_total",
+    "Retrievals started from partial transcripts, by outcome: reused (hit), "
+    "final transcript differed (miss), item superseded (abandoned)",
+    label="outcome", values=("hit", "miss", "abandoned")
+)
+speculative_saved = registry.histogram(
+    "speculative_saved_seconds",
+    "Retrieval time taken off the critical path when a speculative result was reused"
+).child()
+answer_cache_requests = registry.counter(
+    "answer_cache_requests_total", "Answer audio cache lookups by result",
+    label="result", values=("hit", "miss")
+)
+answer_cache_served_bytes = registry.counter(
+    "answer_cache_served_bytes_total", "PCM bytes replayed from the answer audio cache"
+).child()
+outbound_disconnects = registry.counter(
+    "outbound_disconnects_total", "Clients closed because their outbound queue overflowed"
+).child()
+barge_ins = registry.counter(
+    "barge_ins_total", "Answers cut short because the caller started talking, by what heard the speech first",
+    label="source", values=("upstream", "local")
+)
+barge_in_silence = registry.histogram(
+    "barge_in_silence_seconds",
+    "From detecting the caller's speech over an answer to the client confirming its playback stopped"
+).child()
+sessions_reaped = registry.counter(
+    "sessions_reaped_total", "Sessions closed by the reaper, by reason",
+    label="reason", values=("idle", "upstream_closed", "client_gone")
+)
+vad_dropped_bytes = registry.counter(
+    "vad_dropped_bytes_total", "Client audio the local VAD classified as silence and never sent upstream"
+).child()
+vad_onset_latency = registry.histogram(
+    "vad_onset_latency_seconds",
+    "From receiving the first speech frame of a turn to the local VAD releasing it upstream"
+).child()
+session_resident_bytes = registry.gauge(
+    "session_resident_bytes", "Bytes held in per-session buffers, across sessions"
+).child()
+ephemeral_key_requests = registry.counter(
+    "ephemeral_key_requests_total",
+    "getEphemeralKey requests by how they were served: pre-minted key (pool), "
+    "own upstream call (mint), or joined a call already in flight (shared)",
+    label="source", values=("pool", "mint", "shared")
+)
@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+import metrics
+
+logger = logging.getLogger("websocket-audio")
+
+# Per-session bounds on messages waiting for the browser
+OUTBOUND_MAX_FRAMES = int(os.environ.get("OUTBOUND_MAX_FRAMES", "256"))
+OUTBOUND_MAX_BYTES = int(os.environ.get("OUTBOUND_MAX_BYTES", str(1024 * 1024)))
+# What to do when a session's queue is full: "block", "drop_oldest" or "disconnect"
+OUTBOUND_POLICY = os.environ.get("OUTBOUND_POLICY", "block")
+# A single send taking longer than this means the client is gone
+OUTBOUND_SEND_TIMEOUT = float(os.environ.get("OUTBOUND_SEND_TIMEOUT", "10"))
+# Close code for clients that could not keep up (1013 = try again later)
+SLOW_CLIENT_CLOSE_CODE = 1013
+POLICIES = ("block", "drop_oldest", "disconnect")
+
+CLIENT_SEND_JSON_SECONDS = metrics.client_send.child("json")
+CLIENT_SEND_BINARY_SECONDS = metrics.client_send.child("binary")
+
+class OutboundQueue:
+    """
+    Bounded queue of messages for one browser websocket, drained by its own
+    writer task so a slow client never stalls the upstream reader directly.
+
+    When the queue is over max_frames or max_bytes, the policy decides:
+    - block: put() waits for space, which pushes back on the upstream reader
+      of this session only
+    - drop_oldest: the oldest droppable messages (audio chunks) are dropped
+    - disconnect: the client is closed with SLOW_CLIENT_CLOSE_CODE
+    Control messages (droppable=False) are never dropped.
+    """
+
+    def __init__(self, websocket, max_frames=OUTBOUND_MAX_FRAMES, max_bytes=OUTBOUND_MAX_BYTES,
+                 policy=OUTBOUND_POLICY, send_timeout=OUTBOUND_SEND_TIMEOUT):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown outbound policy {policy!r}, expected one of {POLICIES}")
+        self.websocket = websocket
+        self.max_frames = max_frames
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.send_timeout = send_timeout
+        # (is_bytes, payload, size, droppable)
+        self.items = deque()
+        self.bytes = 0
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        self.blocked = 0
+        # Bumped by drop_audio so audio that was waiting for space is not queued after the flush
+        self.generation = 0
+        self._has_items = asyncio.Event()
+        self._has_space = asyncio.Event()
+        self._writer = None
+
+    def depth(self):
+        return len(self.items)
+
+    def _over(self, size):
+        # A lone oversized message is still let through
+        return bool(self.items) and (len(self.items) >= self.max_frames or self.bytes + size > self.max_bytes)
+
+    async def put_json(self, message, droppable=True):
+        # Only the audio payload matters for the byte budget
+        size = len(message.get("event_data") or "") + 64
+        return await self.put(False, message, size, droppable)
+
+    async def put_bytes(self, frame, droppable=True):
+        return await self.put(True, frame, len(frame), droppable)
+
+    async def put(self, is_bytes, payload, size, droppable=True):
+        """Queue a message. Returns False if it was not queued (session closed or dropped)."""
+        if self.closed:
+            return False
+        if self._writer is None:
+            self._writer = asyncio.create_task(self.run_writer())
+
+        if self._over(size):
+            if self.policy == "block":
+                self.blocked += 1
+                metrics.outbound_blocked.inc()
+                generation = self.generation
+                while self._over(size) and not self.closed:
+                    self._has_space.clear()
+                    await self._has_space.wait()
+                if self.closed or (droppable and self.generation != generation):
+                    return False
+            elif self.policy == "drop_oldest":
+                self._drop_oldest(size)
+            else:
+                logger.warning("Closing slow client: outbound queue full")
+                metrics.outbound_disconnects.inc()
+                await self.close(SLOW_CLIENT_CLOSE_CODE)
+                return False
+
+        self.items.append((is_bytes, payload, size, droppable))
+        self.bytes += size
+        self._has_items.set()
+        return True
+
+    def _drop_oldest(self, size):
+        kept = deque()
+        while self.items and self._over(size):
+            item = self.items.popleft()
+            if item[3]:
+                self.bytes -= item[2]
+                self.dropped += 1
+                metrics.outbound_dropped.inc()
+            else:
+                kept.append(item)
+        # Control messages that were skipped over keep their place at the front
+        self.items.extendleft(reversed(kept))
+
+    def drop_audio(self):
+        """Drop every queued droppable message, e.g. answer audio the caller talked over. Returns how many."""
+        kept = deque(item for item in self.items if not item[3])
+        dropped = len(self.items) - len(kept)
+        self.items = kept
+        self.bytes = sum(item[2] for item in kept)
+        if not kept:
+            self._has_items.clear()
+        self.generation += 1
+        self._has_space.set()
+        return dropped
+
+    async def run_writer(self):
+        try:
+            while True:
+                await self._has_items.wait()
+                is_bytes, payload, size, _ = self.items.popleft()
+                self.bytes -= size
+                if not self.items:
+                    self._has_items.clear()
+                self._has_space.set()
+
+                start = time.perf_counter()
+                if is_bytes:
+                    await asyncio.wait_for(self.websocket.send_bytes(payload), self.send_timeout)
+                    CLIENT_SEND_BINARY_SECONDS.observe(time.perf_counter() - start)
+                else:
+                    await asyncio.wait_for(self.websocket.send_json(payload), self.send_timeout)
+                    CLIENT_SEND_JSON_SECONDS.observe(time.perf_counter() - start)
+                self.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Timed out or the socket is gone, nothing more will reach this client
+            logger.error(f"Outbound writer stopped: {e!r}")
+            await self.close()
+
+    async def close(self, code=None):
+        if self.closed:
+            return
+        self.closed = True
+        self.items.clear()
+        self.bytes = 0
+        self._has_space.set()
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        if code is not None:
+            try:
+                await self.websocket.close(code=code)
+            except Exception:
+                pass
+
+    def stats(self):
+        return {
+            "policy": self.policy,
+            "depth": len(self.items),
+            "bytes": self.bytes,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "blocked": self.blocked
+        }
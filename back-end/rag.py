@@ -1,49 +1,306 @@
-from openai import OpenAI
 from dotenv import load_dotenv
 import os
-from langchain_openai import OpenAIEmbeddings
-from langchain_qdrant import QdrantVectorStore
+import time
+import threading
+import logging
+import json
+from retrieval_cache import RetrievalCache
+from context_assembly import assemble_context
+# openai, qdrant_client, langchain_openai and langchain_qdrant take over a
+# second to import, so they are imported where first used, see warm()
 
 load_dotenv()
 
+logger = logging.getLogger("websocket-audio")
+
 # Make sure these environment variables are set in your .env file
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 QDRANT_URL = os.environ.get("QDRANT_URL")
 QDRANT_API_KEY = os.environ.get("QDRANT_API_KEY")
 DATA_PATH = "./data/hospital_data.pdf"
+# "qdrant" queries the remote collection, "local" the in-process index fill_db builds
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "qdrant")
+LOCAL_INDEX_DIR = os.environ.get("LOCAL_INDEX_DIR", "./data/local_index")
+# Keep-alive pool for the Qdrant HTTP client
+QDRANT_POOL_SIZE = int(os.environ.get("QDRANT_POOL_SIZE", "10"))
+QDRANT_KEEPALIVE_SECONDS = float(os.environ.get("QDRANT_KEEPALIVE_SECONDS", "60"))
+# Retrieval cache in front of embedding + vector search (size 0 disables it)
+RAG_CACHE_SIZE = int(os.environ.get("RAG_CACHE_SIZE", "512"))
+RAG_CACHE_TTL_SECONDS = float(os.environ.get("RAG_CACHE_TTL_SECONDS", "3600"))
+RAG_CACHE_SIMILARITY = float(os.environ.get("RAG_CACHE_SIMILARITY", "0.92"))
+# BM25 next to the vectors: confident lexical matches skip the embedding call,
+# the rest are fused with the vector results (HYBRID_RETRIEVAL=0 is vector only)
+HYBRID_RETRIEVAL = os.environ.get("HYBRID_RETRIEVAL", "1") == "1"
+LEXICAL_INDEX_DIR = os.environ.get("LEXICAL_INDEX_DIR", "./data/lexical_index")
+# Candidates each ranking contributes to reciprocal rank fusion, and its k constant
+HYBRID_CANDIDATES = int(os.environ.get("HYBRID_CANDIDATES", "10"))
+RRF_K = int(os.environ.get("RRF_K", "60"))
+# Keep the receptionist instructions in the realtime session and send only
+# merged context per answer (COMPACT_PROMPT=0 sends the full prompt each time)
+COMPACT_PROMPT = os.environ.get("COMPACT_PROMPT", "1") == "1"
 
-# Initialize OpenAI embedding model - same as used in fill_db.py
-embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
+EMBEDDING_MODEL = "text-embedding-3-small"
 
-def rag(question, collection_name="hospital_db"):
+def default_embeddings():
+    # Same model as fill_db.py uses
+    from langchain_openai import OpenAIEmbeddings
+    return OpenAIEmbeddings(model=EMBEDDING_MODEL)
+
+class RetrievalService:
     """
-    RAG function using Qdrant as vector store.
-    Returns a text response directly.
+    Long-lived retrieval state: one pooled Qdrant client, one vector store per
+    collection, one OpenAI client and the embedding client, built on first
+    use and reused for every question. With backend="local" the per-collection store is a
+    LocalVectorIndex loaded from index_dir instead of a remote collection.
+    With hybrid on, each collection also gets the BM25 index fill_db saved
+    under lexical_dir, or one built from the collection when that is missing
+    or stale. Call refresh() after fill_db recreates a collection.
     """
-    # Initialize the Qdrant vector store
-    vector_store = QdrantVectorStore.from_existing_collection(
-        url=QDRANT_URL, 
-        api_key=QDRANT_API_KEY,
-        collection_name=collection_name,
-        embedding=embeddings
-    )
-    
-    print("Querying collection with:", question)
-    
-    # Search for relevant documents
-    retriever = vector_store.as_retriever(search_kwargs={"k": 3})
-    contexts = retriever.invoke(question)
-    
-    # Format the retrieved contexts
-    formatted_contexts = []
-    for i, doc in enumerate(contexts):
-        formatted_contexts.append(f"Context {i+1}: {doc.page_content}")
-    
-    context_text = "\n\n".join(formatted_contexts)
-    
-    client = OpenAI()
-    
-    system_prompt = f"""You are a friendly and helpful virtual assistant for Greenview Medical Centre. 
+
+    def __init__(self, url=QDRANT_URL, api_key=QDRANT_API_KEY, embedding=None, k=3,
+                 backend=VECTOR_BACKEND, index_dir=LOCAL_INDEX_DIR, hybrid=HYBRID_RETRIEVAL,
+                 lexical_dir=LEXICAL_INDEX_DIR):
+        self.url = url
+        self.api_key = api_key
+        self._embedding = embedding
+        self.k = k
+        self.backend = backend
+        self.index_dir = index_dir
+        self.hybrid = hybrid
+        self.lexical_dir = lexical_dir
+        self._lock = threading.Lock()
+        self._client = None
+        self._openai_client = None
+        self._stores = {}
+        # collection -> BM25Index, or None when none could be built
+        self._lexical = {}
+        self._caches = {}
+        self._versions = {}
+
+    @property
+    def embedding(self):
+        if self._embedding is None:
+            embedding = default_embeddings()
+            with self._lock:
+                if self._embedding is None:
+                    self._embedding = embedding
+        return self._embedding
+
+    def client(self):
+        import httpx
+        from qdrant_client import QdrantClient
+        with self._lock:
+            if self._client is None:
+                self._client = QdrantClient(
+                    url=self.url,
+                    api_key=self.api_key,
+                    limits=httpx.Limits(
+                        max_connections=QDRANT_POOL_SIZE,
+                        max_keepalive_connections=QDRANT_POOL_SIZE,
+                        keepalive_expiry=QDRANT_KEEPALIVE_SECONDS
+                    )
+                )
+            return self._client
+
+    def openai_client(self):
+        from openai import OpenAI
+        with self._lock:
+            if self._openai_client is None:
+                self._openai_client = OpenAI()
+            return self._openai_client
+
+    def vector_store(self, collection_name="hospital_db"):
+        store = self._stores.get(collection_name)
+        if store is None:
+            if self.backend == "local":
+                from local_index import LocalVectorIndex
+                store = LocalVectorIndex.load(os.path.join(self.index_dir, collection_name), self.embedding)
+            else:
+                from langchain_qdrant import QdrantVectorStore
+                store = QdrantVectorStore(
+                    client=self.client(),
+                    collection_name=collection_name,
+                    embedding=self.embedding,
+                    # fill_db publishes collections behind an alias, which the
+                    # collection config check cannot resolve
+                    validate_collection_config=False
+                )
+            with self._lock:
+                store = self._stores.setdefault(collection_name, store)
+        return store
+
+    def lexical_index(self, collection_name="hospital_db"):
+        if not self.hybrid:
+            return None
+        if collection_name not in self._lexical:
+            from lexical_index import BM25Index
+            version = self.collection_version(collection_name)
+            try:
+                index = BM25Index.load(os.path.join(self.lexical_dir, collection_name))
+            except FileNotFoundError:
+                logger.warning(f"No lexical index for '{collection_name}', building it from the collection")
+                index = None
+            if index is not None and index.version != version:
+                # Built on another machine or before the last ingest
+                logger.warning(f"Lexical index for '{collection_name}' was built from {index.version}, "
+                               f"not {version}, rebuilding it from the collection")
+                index = None
+            if index is None:
+                try:
+                    index = BM25Index.from_documents(self.collection_documents(collection_name), version=version)
+                except Exception as e:
+                    logger.error(f"Could not build a lexical index for '{collection_name}', "
+                                 f"retrieval is vector only: {e}")
+            with self._lock:
+                self._lexical.setdefault(collection_name, index)
+        return self._lexical[collection_name]
+
+    def collection_documents(self, collection_name="hospital_db"):
+        """Every chunk stored in a collection, as the Documents a search returns."""
+        if self.backend == "local":
+            return self.vector_store(collection_name).documents
+        from langchain_core.documents import Document
+        documents = []
+        offset = None
+        while True:
+            # The resolved collection, so the chunks match the version the index is tagged with
+            points, offset = self.client().scroll(
+                collection_name=self.collection_version(collection_name),
+                limit=256,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False
+            )
+            documents.extend(
+                Document(page_content=point.payload.get("page_content", ""),
+                         metadata=point.payload.get("metadata") or {})
+                for point in points
+            )
+            if offset is None:
+                return documents
+
+    def warm(self, collection_name="hospital_db"):
+        """Import the clients and load the store up front so the first caller does not pay for it."""
+        self.embedding  # built on first access
+        self.vector_store(collection_name)
+        self.lexical_index(collection_name)
+
+    def collection_version(self, collection_name="hospital_db"):
+        """
+        Identifies the data currently behind a collection: the collection an
+        alias points at (fill_db publishes a new one per ingest), or the
+        version directory the local index's CURRENT names. Cached until refresh().
+        """
+        version = self._versions.get(collection_name)
+        if version is None:
+            if self.backend == "local":
+                from local_index import LocalVectorIndex, VECTORS_FILE
+                index_dir = os.path.join(self.index_dir, collection_name)
+                current = LocalVectorIndex.current_version(index_dir)
+                if current is None:
+                    # Old flat layout, identified by when it was written
+                    current = os.stat(os.path.join(index_dir, VECTORS_FILE)).st_mtime_ns
+                version = f"{collection_name}@{current}"
+            else:
+                # Same lookup as fill_db.publish_qdrant: the collection the alias resolves to
+                targets = [a.collection_name for a in self.client().get_aliases().aliases
+                           if a.alias_name == collection_name]
+                version = targets[0] if targets else collection_name
+            with self._lock:
+                version = self._versions.setdefault(collection_name, version)
+        return version
+
+    def cache(self, collection_name="hospital_db"):
+        if RAG_CACHE_SIZE <= 0:
+            return None
+        with self._lock:
+            cache = self._caches.get(collection_name)
+            if cache is None:
+                cache = RetrievalCache(RAG_CACHE_SIZE, RAG_CACHE_TTL_SECONDS, RAG_CACHE_SIMILARITY)
+                self._caches[collection_name] = cache
+            return cache
+
+    def cache_stats(self):
+        with self._lock:
+            caches = dict(self._caches)
+        return {name: cache.stats() for name, cache in caches.items()}
+
+    def retrieve(self, question, collection_name="hospital_db", timings=None):
+        """
+        Find the chunks for a question, going through the retrieval cache
+        when enabled. A confident BM25 match is returned without embedding
+        the question; otherwise the question is embedded and the vector
+        results are fused with the BM25 ones. If a timings dict is passed,
+        lexical_ms, embedding_ms, search_ms, cache ("exact", "semantic" or
+        "miss") and path ("lexical", "hybrid" or "vector") are recorded in it.
+        """
+        from lexical_index import reciprocal_rank_fusion
+        if timings is None:
+            timings = {}
+        cache = self.cache(collection_name)
+
+        if cache is not None:
+            contexts = cache.get_exact(question)
+            if contexts is not None:
+                timings["cache"] = "exact"
+                return contexts
+
+        lexical = self.lexical_index(collection_name)
+        lexical_docs = []
+        if lexical is not None:
+            start = time.perf_counter()
+            hits, coverage = lexical.search(question, k=max(self.k, HYBRID_CANDIDATES))
+            timings["lexical_ms"] = (time.perf_counter() - start) * 1000
+            lexical_docs = [lexical.documents[i] for i, _ in hits]
+            if lexical.confident(hits, coverage):
+                timings["path"] = "lexical"
+                return lexical_docs[:self.k]
+
+        start = time.perf_counter()
+        query_vector = self.embedding.embed_query(question)
+        timings["embedding_ms"] = (time.perf_counter() - start) * 1000
+
+        if cache is not None:
+            contexts = cache.get_semantic(query_vector)
+            if contexts is not None:
+                timings["cache"] = "semantic"
+                return contexts
+            timings["cache"] = "miss"
+
+        store = self.vector_store(collection_name)
+        start = time.perf_counter()
+        if lexical_docs:
+            vector_docs = store.similarity_search_by_vector(query_vector, k=max(self.k, HYBRID_CANDIDATES))
+            contexts = reciprocal_rank_fusion([vector_docs, lexical_docs], self.k, RRF_K)
+            timings["path"] = "hybrid"
+        else:
+            contexts = store.similarity_search_by_vector(query_vector, k=self.k)
+            timings["path"] = "vector"
+        timings["search_ms"] = (time.perf_counter() - start) * 1000
+
+        if cache is not None:
+            cache.put(question, query_vector, contexts)
+        return contexts
+
+    def refresh(self, collection_name=None):
+        """Drop cached stores and retrieval caches so the next query sees the new collection."""
+        with self._lock:
+            if collection_name is None:
+                self._stores.clear()
+                self._lexical.clear()
+                self._versions.clear()
+                caches = list(self._caches.values())
+            else:
+                self._stores.pop(collection_name, None)
+                self._lexical.pop(collection_name, None)
+                self._versions.pop(collection_name, None)
+                caches = [self._caches[collection_name]] if collection_name in self._caches else []
+        for cache in caches:
+            cache.invalidate()
+
+retrieval_service = RetrievalService()
+
+RECEPTIONIST_INSTRUCTIONS = """You are a friendly and helpful virtual assistant for Greenview Medical Centre. 
 
     Your behavior should follow these guidelines:
 
@@ -62,7 +319,26 @@ def rag(question, collection_name="hospital_db"):
     - Do not reference or use the Greenview Medical Centre data
     - Treat these as general inquiries requiring friendly assistance
     - Do not tell me about requesting translation services
+    """
+
+def format_contexts(contexts):
+    """Merged, budgeted context passages as one block of text."""
+    return "\n\n".join(f"Context {i+1}: {text}" for i, text in enumerate(assemble_context(contexts)))
+
+def rag(question, collection_name="hospital_db"):
+    """
+    RAG function using Qdrant as vector store.
+    Returns a text response directly.
+    """
+    print("Querying collection with:", question)
     
+    # Search for relevant documents
+    contexts = retrieval_service.retrieve(question, collection_name)
+    context_text = format_contexts(contexts)
+    
+    client = retrieval_service.openai_client()
+    
+    system_prompt = f"""{RECEPTIONIST_INSTRUCTIONS}
     Context data about Greenview Medical Centre:
     {context_text}
     """    
@@ -74,55 +350,60 @@ def rag(question, collection_name="hospital_db"):
     
     return response.choices[0].message.content
 
-
-def rag2(question, collection_name="hospital_db"):
+def legacy_response_event(question, contexts):
     """
-    RAG function using Qdrant as vector store.
-    Returns an event structure for out-of-band response handling.
+    The response.create rag2 sent before compact prompts: every retrieved
+    chunk verbatim inside a full copy of the instructions. Kept for
+    COMPACT_PROMPT=0 and to measure what compaction saves.
     """
-    # Initialize the Qdrant vector store
-    vector_store = QdrantVectorStore.from_existing_collection(
-        url=QDRANT_URL, 
-        api_key=QDRANT_API_KEY,
-        collection_name=collection_name,
-        embedding=embeddings
-    )
-    
-    print("Querying collection with:", question)
-    
-    # Search for relevant documents
-    retriever = vector_store.as_retriever(search_kwargs={"k": 3})
-    contexts = retriever.invoke(question)
-    
-    # Format the retrieved contexts
     formatted_contexts = []
     for i, doc in enumerate(contexts):
         formatted_contexts.append(f"Context {i+1}: {doc.page_content}")
-    
     context_text = "\n\n".join(formatted_contexts)
-    
-    system_prompt = f"""You are a friendly and helpful virtual assistant for Greenview Medical Centre. 
 
-    Your behavior should follow these guidelines:
+    return {
+        "type": "response.create",
+        "response": {
+            "conversation": "none",
+            "metadata": { "topic": "rag" },
+            "modalities": [ "text", "audio"],
+            "instructions": f"""{RECEPTIONIST_INSTRUCTIONS}
+    #Context: {context_text}
+    """,
+            "input": []
+        },
+    }
 
-    1. For greetings and general conversation (like "Hello", "How are you?", etc.):
-    - Respond in a warm, friendly manner as a helpful receptionist would
-    - Engage naturally without referencing any specific medical centre data
-    - Do not tell me about requesting translation services
-    
-    2. For questions specifically about Greenview Medical Centre:
-    - Answer ONLY using the information provided in the context data
-    - Do not make up or infer information not present in the provided data
-    - If the context doesn't contain the answer, politely acknowledge your limitations with: "I'm sorry, but I don't have that specific information about Greenview Medical Centre in my current data."
+def retrieve_context(question, collection_name="hospital_db", timings=None):
+    """Search for the chunks relevant to a question, the retrieval half of rag2."""
+    print("Querying collection with:", question)
+    return retrieval_service.retrieve(question, collection_name, timings)
 
-    3. For questions unrelated to Greenview Medical Centre:
-    - Respond conversationally as a helpful assistant
-    - Do not reference or use the Greenview Medical Centre data
-    - Treat these as general inquiries requiring friendly assistance
-    - Do not tell me about requesting translation services
-    
-    #Context: {context_text}
+def rag2(question, collection_name="hospital_db", timings=None):
+    """
+    RAG function using Qdrant as vector store.
+    Returns an event structure for out-of-band response handling.
+    """
+    if timings is None:
+        timings = {}
+    contexts = retrieve_context(question, collection_name, timings)
+    return response_event(question, contexts, timings)
+
+def response_event(question, contexts, timings=None):
     """
+    The response.create asking upstream to answer question from contexts.
+
+    With COMPACT_PROMPT the receptionist instructions live in the session
+    (see transcription.session_update_event), so the event only carries the
+    merged context and the question. timings gets baseline_prompt_bytes,
+    the size the legacy event would have had.
+    """
+    if timings is None:
+        timings = {}
+    legacy_event = legacy_response_event(question, contexts)
+    timings["baseline_prompt_bytes"] = len(json.dumps(legacy_event))
+    if not COMPACT_PROMPT:
+        return legacy_event
     
     event = {
         "type": "response.create",
@@ -136,8 +417,20 @@ def rag2(question, collection_name="hospital_db"):
             
             # Set any other available response fields
             "modalities": [ "text", "audio"],
-            "instructions": system_prompt,
-            "input": []
+            # No instructions: the session's apply. Input replaces the
+            # conversation for this response, so the question goes in too
+            "input": [
+                {
+                    "type": "message",
+                    "role": "system",
+                    "content": [{"type": "input_text", "text": "Context data about Greenview Medical Centre:\n" + format_contexts(contexts)}]
+                },
+                {
+                    "type": "message",
+                    "role": "user",
+                    "content": [{"type": "input_text", "text": question}]
+                }
+            ]
         },
     }
     
@@ -146,4 +439,4 @@ def rag2(question, collection_name="hospital_db"):
 
 if __name__ == "__main__":
     response = rag("Where is Greenview medical centre located?")
-    print(response)
\ No newline at end of file
+    print(response)
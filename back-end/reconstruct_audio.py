@@ -1,12 +1,15 @@
 import base64
 import numpy as np
+from audio_codec import (
+    decode_base64_chunks,
+    encode_pcm16_base64,
+    float_to_pcm16,
+    pcm16_to_float
+)
 
 def base64_decode_audio(encoded_str):
     try:
-        pcm_bytes = base64.b64decode(encoded_str)
-        int16_array = np.frombuffer(pcm_bytes, dtype=np.int16)
-        float32_array = int16_array.astype(np.float32) / 32767.0
-        return float32_array
+        return pcm16_to_float(base64.b64decode(encoded_str))
     except Exception as e:
         print(f"Error decoding audio: {e}")
         return np.array([], dtype=np.float32)
@@ -15,23 +18,14 @@ def reconstruct_audio(audio_chunks):
     if not audio_chunks or len(audio_chunks) == 0:
         print("No audio chunks to reconstruct")
         return np.array([], dtype=np.float32)
-        
-    decoded_chunks = []
-    for chunk in audio_chunks:
-        try:
-            decoded = base64_decode_audio(chunk)
-            if len(decoded) > 0:  # Only add non-empty chunks
-                decoded_chunks.append(decoded)
-        except Exception as e:
-            print(f"Error decoding chunk: {e}")
-            continue
-    
-    if not decoded_chunks:
+
+    pcm_bytes = decode_base64_chunks(audio_chunks)
+    if len(pcm_bytes) == 0:
         print("No valid audio chunks after decoding")
         return np.array([], dtype=np.float32)
-    
-    full_audio = np.concatenate(decoded_chunks)
-    return full_audio
+
+    # One conversion over the joined buffer instead of one per chunk
+    return pcm16_to_float(pcm_bytes)
 
 # Add this function for the transcription.py file
 def base64_encode_audio(float32_array):
@@ -40,19 +34,8 @@ def base64_encode_audio(float32_array):
         return ""
         
     try:
-        # Ensure the audio is properly clipped
-        clipped = np.clip(float32_array, -1.0, 1.0)
-        
-        # Convert to int16 (PCM format)
-        int16_data = np.int16(clipped * 32767)
-        
-        # Convert to bytes
-        pcm_bytes = int16_data.tobytes()
-        
-        # Encode to base64
-        encoded = base64.b64encode(pcm_bytes).decode('ascii')
-        
-        return encoded
+        # Clip and convert to int16 (PCM format), then encode to base64
+        return encode_pcm16_base64(float_to_pcm16(float32_array))
     except Exception as e:
         print(f"Error encoding audio: {e}")
         return ""
\ No newline at end of file
@@ -0,0 +1,109 @@
+from math import gcd
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+def design_lowpass(up, down, taps_per_phase=24, beta=8.0):
+    """
+    Kaiser-windowed sinc prototype for rational resampling by up/down. The
+    cutoff sits just under the lower of the two Nyquist rates, expressed at
+    the upsampled rate.
+    """
+    n_taps = up * taps_per_phase
+    cutoff = 0.5 / max(up, down) * 0.92
+    n = np.arange(n_taps) - (n_taps - 1) / 2
+    h = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(n_taps, beta)
+    # Unity DC gain per phase after zero stuffing
+    return (h / h.sum() * up).astype(np.float32)
+
+class StreamingResampler:
+    """
+    Polyphase FIR resampler for mono PCM16 streams. Filter history and the
+    output phase are carried across calls, so feeding a signal in arbitrary
+    chunks gives exactly the samples that resampling it in one go would.
+
+    Each output sample is a dot product of taps_per_phase input samples with
+    one polyphase branch. Outputs repeat their branch every `up` samples, so
+    each branch is a single strided matrix-vector product over a sliding
+    window view of the input, with no per-sample Python work or gather copy.
+    """
+
+    def __init__(self, from_rate, to_rate, taps_per_phase=24):
+        divisor = gcd(from_rate, to_rate)
+        self.from_rate = from_rate
+        self.to_rate = to_rate
+        self.up = to_rate // divisor
+        self.down = from_rate // divisor
+        self.taps_per_phase = taps_per_phase
+        h = design_lowpass(self.up, self.down, taps_per_phase)
+        # phases[p, k] = h[p + k * up] weights x[i - k]; stored reversed so that
+        # it lines up with the window buffer[i : i + taps_per_phase]
+        self.phases = np.ascontiguousarray(h.reshape(taps_per_phase, self.up).T[:, ::-1])
+        self.reset()
+
+    @property
+    def passthrough(self):
+        return self.up == self.down
+
+    def reset(self):
+        self._history = np.zeros(self.taps_per_phase - 1, dtype=np.float32)
+        # Position of the next output on the upsampled grid, relative to the next chunk
+        self._position = 0
+
+    def process_float(self, samples):
+        samples = np.asarray(samples, dtype=np.float32)
+        if self.passthrough:
+            return samples
+        n_in = samples.shape[0]
+        if n_in == 0:
+            # Nothing new: the history alone is shorter than one window
+            return np.empty(0, dtype=np.float32)
+        buffer = np.concatenate((self._history, samples))
+
+        end = n_in * self.up
+        n_out = max(0, -(-(end - self._position) // self.down))
+        output = np.empty(n_out, dtype=np.float32)
+        # window s covers buffer[s : s + T], i.e. x[s - T + 1 .. s] in chunk coordinates
+        windows = sliding_window_view(buffer, self.taps_per_phase)
+        for r in range(min(self.up, n_out)):
+            position = self._position + r * self.down
+            first_input, phase = divmod(position, self.up)
+            count = len(range(r, n_out, self.up))
+            rows = windows[first_input:first_input + self.down * (count - 1) + 1:self.down]
+            output[r::self.up] = rows @ self.phases[phase]
+
+        self._position += n_out * self.down - end
+        self._history = buffer[buffer.shape[0] - (self.taps_per_phase - 1):]
+        return output
+
+    def process(self, pcm_bytes):
+        """Resample a chunk of PCM16 bytes and return PCM16 bytes."""
+        if self.passthrough:
+            return pcm_bytes
+        samples = np.frombuffer(pcm_bytes, dtype=np.int16, count=len(pcm_bytes) // 2)
+        return self._to_pcm16(self.process_float(samples * (1.0 / 32768)))
+
+    def flush(self):
+        """Push the filter tail out at the end of a stream and reset the state."""
+        if self.passthrough:
+            return b""
+        tail = self.process_float(np.zeros(self.taps_per_phase // 2, dtype=np.float32))
+        self.reset()
+        return self._to_pcm16(tail)
+
+    @staticmethod
+    def _to_pcm16(samples):
+        scaled = np.multiply(samples, 32768, dtype=np.float32)
+        np.clip(scaled, -32768, 32767, out=scaled)
+        return np.rint(scaled).astype(np.int16).tobytes()
+
+def resample_offline(samples, from_rate, to_rate, taps_per_phase=24):
+    """
+    Reference implementation: zero-stuff, convolve with the same prototype
+    filter and decimate, over the whole signal at once.
+    """
+    divisor = gcd(from_rate, to_rate)
+    up, down = to_rate // divisor, from_rate // divisor
+    h = design_lowpass(up, down, taps_per_phase)
+    stuffed = np.zeros(len(samples) * up, dtype=np.float64)
+    stuffed[::up] = samples
+    return np.convolve(stuffed, h)[:len(stuffed):down]
@@ -0,0 +1,127 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+_NON_WORD = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+
+def normalize_question(text):
+    """Lowercase, drop punctuation and collapse whitespace so trivial variants share a key."""
+    text = _NON_WORD.sub(" ", text.lower())
+    return _SPACES.sub(" ", text).strip()
+
+class RetrievalCache:
+    """
+    Caches retrieved contexts for one collection. Lookups first try an exact
+    match on the normalized question, then (after the caller has embedded the
+    question) a semantic match: cosine similarity against the cached query
+    embeddings, accepted above similarity_threshold. Entries expire after
+    ttl_seconds and the least recently used entry is evicted once max_entries
+    is reached.
+    """
+
+    def __init__(self, max_entries=512, ttl_seconds=3600, similarity_threshold=0.92):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        # normalized question -> [slot, expires_at, contexts], in LRU order
+        self._entries = OrderedDict()
+        # Query embeddings live in one preallocated matrix, one row per slot
+        self._vectors = None
+        self._slot_keys = [None] * max_entries
+        self._free_slots = list(range(max_entries - 1, -1, -1))
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def get_exact(self, question):
+        key = normalize_question(question)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not self._alive(key, entry):
+                return None
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry[2]
+
+    def get_semantic(self, query_vector):
+        """Return cached contexts for the closest cached query, or None. Counts a miss on None."""
+        with self._lock:
+            if self._vectors is None or not self._entries:
+                self.misses += 1
+                return None
+            query = self._unit(query_vector)
+            scores = self._vectors @ query
+            # Empty slots are zero rows, so they can never clear the threshold
+            slot = int(np.argmax(scores))
+            key = self._slot_keys[slot]
+            if key is None or scores[slot] < self.similarity_threshold:
+                self.misses += 1
+                return None
+            entry = self._entries[key]
+            if not self._alive(key, entry):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.semantic_hits += 1
+            return entry[2]
+
+    def put(self, question, query_vector, contexts):
+        key = normalize_question(question)
+        with self._lock:
+            query = self._unit(query_vector)
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, query.shape[0]), dtype=np.float32)
+
+            entry = self._entries.get(key)
+            if entry is None:
+                if not self._free_slots:
+                    oldest_key = next(iter(self._entries))
+                    self._remove(oldest_key, self._entries[oldest_key])
+                slot = self._free_slots.pop()
+                entry = [slot, 0.0, None]
+                self._entries[key] = entry
+                self._slot_keys[slot] = key
+            entry[1] = time.monotonic() + self.ttl_seconds
+            entry[2] = contexts
+            self._vectors[entry[0]] = query
+            self._entries.move_to_end(key)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self._vectors = None
+            self._slot_keys = [None] * self.max_entries
+            self._free_slots = list(range(self.max_entries - 1, -1, -1))
+
+    def stats(self):
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0
+        }
+
+    def _alive(self, key, entry):
+        if entry[1] >= time.monotonic():
+            return True
+        self._remove(key, entry)
+        return False
+
+    def _remove(self, key, entry):
+        slot = entry[0]
+        del self._entries[key]
+        self._slot_keys[slot] = None
+        self._vectors[slot] = 0.0
+        self._free_slots.append(slot)
+
+    @staticmethod
+    def _unit(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
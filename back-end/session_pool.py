@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from websockets.protocol import State
+from transcription import open_configured_session
+
+logger = logging.getLogger("websocket-audio")
+
+# Number of connected, already configured upstream sessions to keep on hand (0 disables the pool)
+REALTIME_POOL_SIZE = int(os.environ.get("REALTIME_POOL_SIZE", "2"))
+# Idle sessions older than this are closed and replaced
+REALTIME_POOL_MAX_IDLE_SECONDS = float(os.environ.get("REALTIME_POOL_MAX_IDLE_SECONDS", "600"))
+# How often idle sessions are pinged
+REALTIME_POOL_HEALTH_INTERVAL = float(os.environ.get("REALTIME_POOL_HEALTH_INTERVAL", "30"))
+REALTIME_POOL_PING_TIMEOUT = 5.0
+
+class RealtimeSessionPool:
+    """
+    Keeps REALTIME_POOL_SIZE upstream realtime sessions connected and past
+    session.update, so a new caller does not pay the TLS handshake and the
+    session round-trips. A background task refills the pool, pings idle
+    sessions and evicts dead or too old ones.
+    """
+
+    def __init__(self, size=REALTIME_POOL_SIZE, max_idle_seconds=REALTIME_POOL_MAX_IDLE_SECONDS,
+                 health_interval=REALTIME_POOL_HEALTH_INTERVAL):
+        self.size = size
+        self.max_idle_seconds = max_idle_seconds
+        self.health_interval = health_interval
+        # (websocket, created_at) pairs, oldest on the left
+        self.idle = deque()
+        self.connecting = 0
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._wake = asyncio.Event()
+        self._refill_task = None
+        self._health_task = None
+        self._open_tasks = set()
+
+    async def start(self):
+        if self.size <= 0:
+            return
+        self._refill_task = asyncio.create_task(self._refill_loop())
+        self._health_task = asyncio.create_task(self._health_loop())
+
+    async def close(self):
+        for task in (self._refill_task, self._health_task, *self._open_tasks):
+            if task:
+                task.cancel()
+        self._refill_task = None
+        self._health_task = None
+        while self.idle:
+            ws, _ = self.idle.popleft()
+            await ws.close()
+
+    async def acquire(self):
+        """Return a ready upstream session, or None if the pool is empty."""
+        now = time.monotonic()
+        ws = None
+        while self.idle:
+            candidate, created_at = self.idle.pop()
+            if candidate.state is State.OPEN and now - created_at < self.max_idle_seconds:
+                ws = candidate
+                break
+            await self._evict(candidate)
+        if ws is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        self._wake.set()
+        return ws
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "idle": len(self.idle),
+            "connecting": self.connecting,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evicted": self.evicted
+        }
+
+    async def _evict(self, ws):
+        self.evicted += 1
+        try:
+            await ws.close()
+        except Exception:
+            pass
+
+    async def _open_one(self):
+        try:
+            ws = await open_configured_session()
+            self.idle.append((ws, time.monotonic()))
+        except Exception as e:
+            logger.error(f"Failed to pre-warm realtime session: {e}")
+            # Back off a little so a failing upstream is not hammered
+            await asyncio.sleep(1)
+        finally:
+            self.connecting -= 1
+            self._wake.set()
+
+    async def _refill_loop(self):
+        while True:
+            missing = self.size - len(self.idle) - self.connecting
+            for _ in range(max(missing, 0)):
+                self.connecting += 1
+                task = asyncio.create_task(self._open_one())
+                self._open_tasks.add(task)
+                task.add_done_callback(self._open_tasks.discard)
+            self._wake.clear()
+            await self._wake.wait()
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            for entry in list(self.idle):
+                ws, created_at = entry
+                healthy = ws.state is State.OPEN and time.monotonic() - created_at < self.max_idle_seconds
+                if healthy:
+                    try:
+                        pong = await ws.ping()
+                        await asyncio.wait_for(pong, timeout=REALTIME_POOL_PING_TIMEOUT)
+                    except Exception:
+                        healthy = False
+                # Skip sessions that were handed out while we were pinging
+                if not healthy and entry in self.idle:
+                    self.idle.remove(entry)
+                    await self._evict(ws)
+            self._wake.set()
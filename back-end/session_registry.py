@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+import metrics
+
+logger = logging.getLogger("websocket-audio")
+
+# Sessions with no message from the browser for this long are closed. Off (0)
+# by default: the page keeps its socket open between recordings and does not
+# reconnect, so only half-dead sessions are reaped unless this is set
+SESSION_IDLE_TIMEOUT = float(os.environ.get("SESSION_IDLE_TIMEOUT", "0"))
+# How often the reaper looks for idle or half-dead sessions
+SESSION_REAP_INTERVAL = float(os.environ.get("SESSION_REAP_INTERVAL", "15"))
+# A new session gets this long to finish connecting upstream before it counts as dead
+SESSION_START_GRACE = 15.0
+# Ids remembered per session for de-duplication
+SESSION_RECENT_IDS = int(os.environ.get("SESSION_RECENT_IDS", "64"))
+# Close codes: 1001 = going away (idle), 1011 = server side failure (upstream gone)
+IDLE_CLOSE_CODE = 1001
+UPSTREAM_CLOSED_CODE = 1011
+
+class RecentSet:
+    """A set that only remembers its maxlen most recently added members."""
+
+    def __init__(self, maxlen=SESSION_RECENT_IDS):
+        self.maxlen = maxlen
+        self._members = OrderedDict()
+
+    def add(self, member):
+        self._members[member] = None
+        self._members.move_to_end(member)
+        if len(self._members) > self.maxlen:
+            self._members.popitem(last=False)
+
+    def __contains__(self, member):
+        return member in self._members
+
+    def __len__(self):
+        return len(self._members)
+
+class SessionRegistry:
+    """
+    The open /ws sessions by connection id. A background task closes
+    sessions that are half-dead (upstream reader finished, or the outbound
+    writer gave up), since nothing else ever would, and, when
+    SESSION_IDLE_TIMEOUT is set, idle ones (no browser traffic for that long).
+
+    Whoever removes a session from the registry owns stopping it, so the
+    reaper and the websocket handler never both tear one down.
+    """
+
+    def __init__(self, idle_timeout=SESSION_IDLE_TIMEOUT, reap_interval=SESSION_REAP_INTERVAL):
+        self.idle_timeout = idle_timeout
+        self.reap_interval = reap_interval
+        # connection id -> (transcriber, registered_at)
+        self.sessions = {}
+        self.reaped = 0
+        self._reaper_task = None
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def __contains__(self, connection_id):
+        return connection_id in self.sessions
+
+    def get(self, connection_id):
+        entry = self.sessions.get(connection_id)
+        return entry[0] if entry else None
+
+    def transcribers(self):
+        return [transcriber for transcriber, _ in list(self.sessions.values())]
+
+    def add(self, transcriber):
+        connection_id = str(uuid.uuid4())
+        self.sessions[connection_id] = (transcriber, time.monotonic())
+        return connection_id
+
+    def remove(self, connection_id):
+        """Take a session out of the registry. Returns it, or None if it was already gone."""
+        entry = self.sessions.pop(connection_id, None)
+        return entry[0] if entry else None
+
+    async def start(self):
+        self._reaper_task = asyncio.create_task(self._reap_loop())
+
+    async def close(self):
+        if self._reaper_task:
+            self._reaper_task.cancel()
+            self._reaper_task = None
+
+    def _reap_reason(self, transcriber, registered_at, now):
+        if transcriber.outbound.closed:
+            return "client_gone"
+        reader = transcriber.reader_task
+        if now - registered_at >= SESSION_START_GRACE and (reader is None or reader.done()):
+            return "upstream_closed"
+        if self.idle_timeout > 0 and now - transcriber.last_client_activity >= self.idle_timeout:
+            return "idle"
+        return None
+
+    async def reap(self):
+        """Close every idle or half-dead session. Returns how many were closed."""
+        now = time.monotonic()
+        doomed = []
+        for connection_id, (transcriber, registered_at) in list(self.sessions.items()):
+            reason = self._reap_reason(transcriber, registered_at, now)
+            if reason is not None:
+                doomed.append((connection_id, reason))
+
+        for connection_id, reason in doomed:
+            transcriber = self.remove(connection_id)
+            if transcriber is None:
+                continue
+            self.reaped += 1
+            metrics.sessions_reaped.child(reason).inc()
+            logger.info(f"Reaping session {connection_id}: {reason}")
+            try:
+                await transcriber.client_websocket.close(
+                    code=IDLE_CLOSE_CODE if reason == "idle" else UPSTREAM_CLOSED_CODE
+                )
+            except Exception:
+                # Already closed or broken, which is often why it is being reaped
+                pass
+            await transcriber.stop_transcription()
+        return len(doomed)
+
+    async def _reap_loop(self):
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            try:
+                await self.reap()
+            except Exception as e:
+                logger.error(f"Session reaper failed: {e!r}")
+
+    def stats(self):
+        now = time.monotonic()
+        sessions = []
+        for connection_id, (transcriber, registered_at) in list(self.sessions.items()):
+            usage = transcriber.resident_bytes()
+            sessions.append({
+                "id": connection_id,
+                "age_s": round(now - registered_at, 1),
+                "idle_s": round(now - transcriber.last_client_activity, 1),
+                "resident_bytes": sum(usage.values()),
+                "breakdown": usage,
+                "vad": transcriber.vad.stats() if transcriber.vad is not None else None
+            })
+        return {
+            "sessions": len(sessions),
+            "resident_bytes": sum(session["resident_bytes"] for session in sessions),
+            "reaped": self.reaped,
+            "per_session": sessions
+        }
+
+    def resident_bytes(self):
+        return sum(sum(transcriber.resident_bytes().values()) for transcriber in self.transcribers())
@@ -0,0 +1,149 @@
+import asyncio
+import os
+import time
+from difflib import SequenceMatcher
+from retrieval_cache import normalize_question
+import metrics
+
+# Start retrieval from partial transcripts before the final one arrives
+SPECULATIVE_RETRIEVAL = os.environ.get("SPECULATIVE_RETRIEVAL", "true").lower() in ("1", "true", "yes")
+# A partial counts as stable after this long without a new delta, or when it ends a sentence
+SPECULATIVE_STABLE_MS = int(os.environ.get("SPECULATIVE_STABLE_MS", "200"))
+SPECULATIVE_MIN_WORDS = int(os.environ.get("SPECULATIVE_MIN_WORDS", "3"))
+# How close the final transcript must be to the speculated one (0..1, on normalized text)
+SPECULATIVE_MATCH = float(os.environ.get("SPECULATIVE_MATCH", "0.9"))
+# Retrievals started per item at most, each one costs an embedding call
+SPECULATIVE_MAX_ATTEMPTS = 2
+
+SPECULATION_HITS = metrics.speculative_retrievals.child("hit")
+SPECULATION_MISSES = metrics.speculative_retrievals.child("miss")
+SPECULATION_ABANDONED = metrics.speculative_retrievals.child("abandoned")
+
+def transcripts_match(a, b, threshold=SPECULATIVE_MATCH):
+    a, b = normalize_question(a), normalize_question(b)
+    return a == b or SequenceMatcher(None, a, b).ratio() >= threshold
+
+class Speculation:
+    """One item's partial transcript and the retrieval started from it, if any."""
+
+    def __init__(self, item_id):
+        self.item_id = item_id
+        self.partial = ""
+        self.query = None
+        self.task = None
+        self.started_at = None
+        self.finished_at = None
+        self.attempts = 0
+        self.timer = None
+
+    def cancel(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+
+class SpeculativeRetrieval:
+    """
+    Starts retrieval from input_audio_transcription.delta events, keyed by
+    item_id, once the partial transcript is stable: SPECULATIVE_STABLE_MS
+    without a new delta, or a partial ending in sentence punctuation. take()
+    hands the result to the final transcript when the two match closely
+    enough; otherwise the speculation is cancelled and the caller retrieves
+    as usual.
+
+    retrieve is an async callable(text) returning the retrieved context. The
+    blocking work runs in an executor thread, so a cancelled speculation
+    still finishes its embedding call; SPECULATIVE_MAX_ATTEMPTS caps that.
+    """
+
+    def __init__(self, retrieve, stable_ms=SPECULATIVE_STABLE_MS, min_words=SPECULATIVE_MIN_WORDS):
+        self.retrieve = retrieve
+        self.stable = stable_ms / 1000
+        self.min_words = min_words
+        self.items = {}
+
+    def on_delta(self, item_id, delta):
+        speculation = self.items.get(item_id)
+        if speculation is None:
+            # Only the newest item can still be answered, older partials are stale
+            self.cancel_all()
+            speculation = self.items[item_id] = Speculation(item_id)
+        speculation.partial += delta
+
+        if speculation.timer is not None:
+            speculation.timer.cancel()
+            speculation.timer = None
+        if speculation.partial.rstrip().endswith(("?", ".", "!")):
+            self._start(speculation)
+        else:
+            speculation.timer = asyncio.get_running_loop().call_later(self.stable, self._start, speculation)
+
+    def _start(self, speculation):
+        speculation.timer = None
+        text = speculation.partial.strip()
+        if len(text.split()) < self.min_words or speculation.attempts >= SPECULATIVE_MAX_ATTEMPTS:
+            return
+        if speculation.query is not None and transcripts_match(speculation.query, text):
+            # Already retrieving for (nearly) this text
+            return
+        speculation.cancel()
+        speculation.attempts += 1
+        speculation.query = text
+        speculation.started_at = time.perf_counter()
+        speculation.finished_at = None
+        speculation.task = asyncio.create_task(self._run(speculation, text))
+
+    async def _run(self, speculation, text):
+        result = await self.retrieve(text)
+        speculation.finished_at = time.perf_counter()
+        return result
+
+    async def take(self, item_id, transcript):
+        """
+        Return the speculative result for a final transcript, or None if
+        there is none usable. Waits for a matching speculation that is still
+        running, since it is ahead of a fresh retrieval either way.
+        """
+        speculation = self.items.pop(item_id, None)
+        if speculation is None:
+            return None
+        if speculation.timer is not None:
+            speculation.timer.cancel()
+            speculation.timer = None
+        if speculation.task is None:
+            return None
+        if speculation.task.cancelled() or not transcripts_match(speculation.query, transcript):
+            speculation.cancel()
+            SPECULATION_MISSES.inc()
+            return None
+
+        final_at = time.perf_counter()
+        try:
+            result = await asyncio.shield(speculation.task)
+        except asyncio.CancelledError:
+            speculation.cancel()
+            raise
+        except Exception:
+            SPECULATION_MISSES.inc()
+            return None
+        SPECULATION_HITS.inc()
+        # A fresh retrieval would have started at final_at and taken as long as this one did
+        duration = speculation.finished_at - speculation.started_at
+        metrics.speculative_saved.observe(min(final_at - speculation.started_at, duration))
+        return result
+
+    def discard(self, item_id):
+        """Forget an item whose answer did not need retrieval after all."""
+        speculation = self.items.pop(item_id, None)
+        if speculation is not None:
+            if speculation.task is not None:
+                SPECULATION_ABANDONED.inc()
+            speculation.cancel()
+
+    def cancel_all(self):
+        for speculation in self.items.values():
+            if speculation.task is not None:
+                SPECULATION_ABANDONED.inc()
+            speculation.cancel()
+        self.items.clear()
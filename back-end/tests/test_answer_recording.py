@@ -0,0 +1,65 @@
+import asyncio
+import base64
+import json
+
+import transcription
+from transcription import OpenAITranscriber
+
+class NullWebSocket:
+    async def send_json(self, data):
+        pass
+
+    async def send_bytes(self, data):
+        pass
+
+def delta(response_id, pcm):
+    return json.dumps({"type": "response.audio.delta", "response_id": response_id,
+                       "delta": base64.b64encode(pcm).decode("ascii")})
+
+def created(response_id):
+    return json.dumps({"type": "response.created", "response": {"id": response_id}})
+
+def done(response_id, status="completed"):
+    return json.dumps({"type": "response.done", "response": {"id": response_id, "status": status}})
+
+def test_overlapping_answers_are_recorded_under_their_own_key(monkeypatch):
+    stored = []
+    monkeypatch.setattr(transcription.answer_cache, "put", lambda key, pcm, rate: stored.append((key, len(pcm))))
+
+    async def run():
+        transcriber = OpenAITranscriber(NullWebSocket())
+        transcriber.pending_answer_key = "question A"
+        await transcriber.on_openai_message(created("resp_a"))
+        transcriber.pending_answer_key = "question B"
+        await transcriber.on_openai_message(created("resp_b"))
+        # The tail of A arrives after B started, then A ends cancelled
+        await transcriber.on_openai_message(delta("resp_a", b"\x01\x00" * 4800))
+        await transcriber.on_openai_message(done("resp_a", "cancelled"))
+        await transcriber.on_openai_message(delta("resp_b", b"\x02\x00" * 4800))
+        await transcriber.on_openai_message(json.dumps({"type": "response.audio.done", "response_id": "resp_b"}))
+        await transcriber.on_openai_message(done("resp_b"))
+        await transcriber.outbound.close()
+
+    asyncio.run(run())
+    assert [key for key, _ in stored] == ["question B"]
+
+def test_cached_answer_is_looked_up_off_the_event_loop(monkeypatch):
+    import threading
+    lookups = []
+    replayed = []
+    monkeypatch.setattr(transcription, "ANSWER_CACHE", True)
+    monkeypatch.setattr(transcription.rag.retrieval_service, "collection_version", lambda *args: "v1")
+    monkeypatch.setattr(transcription.answer_cache, "get",
+                        lambda key: lookups.append(threading.current_thread()) or (b"\x00\x00" * 160, 16000))
+
+    async def run():
+        transcriber = OpenAITranscriber(NullWebSocket())
+        async def replay(pcm, rate):
+            replayed.append(len(pcm))
+        transcriber.replay_answer = replay
+        await transcriber.answer_transcript("Where is the pharmacy?", "item_1")
+        await transcriber.outbound.close()
+
+    asyncio.run(run())
+    assert replayed == [320]
+    assert lookups and lookups[0] is not threading.main_thread()
@@ -0,0 +1,41 @@
+from langchain_core.documents import Document
+
+import rag
+from context_assembly import assemble_context, merge_chunks
+from fake_retrieval import StandInRetrievalService
+
+def located(text, start, source="doc.pdf", page=0):
+    return Document(page_content=text, metadata={"source": source, "page": page, "start_index": start})
+
+def test_overlapping_chunks_are_stitched():
+    text = "The pharmacy is on the Ground Floor, Main Lobby, and is open from 8 AM to 8 PM."
+    docs = [located(text[20:], 20), located(text[:40], 0)]
+    assert merge_chunks(docs) == [text]
+
+def test_chunks_without_start_index_are_kept_once():
+    docs = [
+        Document(page_content="Visiting hours are 10am to 8pm."),
+        Document(page_content="Visiting  hours are\n10am to 8pm."),
+        Document(page_content="Free parking is available."),
+    ]
+    assert merge_chunks(docs) == ["Visiting hours are 10am to 8pm.", "Free parking is available."]
+
+def test_located_and_unlocated_chunks_keep_rank_order():
+    docs = [
+        Document(page_content="Parking is free for the first hour."),
+        located("The lab is on the Ground Floor.", 0),
+        located("The lab is on the Ground Floor.", 0),
+    ]
+    assert merge_chunks(docs) == ["Parking is free for the first hour.", "The lab is on the Ground Floor."]
+
+def test_budget_trims_the_last_passage():
+    docs = [Document(page_content="word " * 40), Document(page_content="other " * 200)]
+    texts = assemble_context(docs, token_budget=80)
+    assert texts[0] == " ".join(["word"] * 40)
+    assert texts[1].endswith(" ...") and len(texts[1]) <= 30 * 4 + 4
+
+def test_rag2_sends_stand_in_context(monkeypatch):
+    monkeypatch.setattr(rag, "retrieval_service", StandInRetrievalService())
+    event = rag.rag2("What are the visiting hours?")
+    context = event["response"]["input"][0]["content"][0]["text"]
+    assert "Visiting hours are 10am to 8pm" in context
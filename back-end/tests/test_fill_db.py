@@ -0,0 +1,15 @@
+from langchain_core.documents import Document
+from qdrant_client import QdrantClient
+
+import fill_db
+
+def test_ingests_in_the_same_second_get_their_own_shadow(monkeypatch):
+    monkeypatch.setattr(fill_db.time, "time", lambda: 1700000000.0)
+    client = QdrantClient(":memory:")
+    chunks = [Document(page_content="The pharmacy is on the ground floor", metadata={"source": "hospital_data.pdf", "page": 0, "start_index": 0, "content_hash": "a"})]
+    first = fill_db.publish_qdrant(client, "hospital_db", chunks, {"a": [1.0, 0.0, 0.0, 0.0]})
+    second = fill_db.publish_qdrant(client, "hospital_db", chunks, {"a": [0.0, 1.0, 0.0, 0.0]})
+    assert first != second
+    aliases = {a.alias_name: a.collection_name for a in client.get_aliases().aliases}
+    assert aliases == {"hospital_db": second}
+    assert not client.collection_exists(first)
@@ -0,0 +1,39 @@
+import os
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from local_index import CURRENT_FILE, DOCUMENTS_FILE, VECTORS_FILE, LocalVectorIndex
+
+def make_index(n):
+    vectors = LocalVectorIndex.normalize(np.eye(n, 4, dtype=np.float32) + 0.1)
+    return LocalVectorIndex(vectors, [Document(page_content=f"chunk {i}", metadata={}) for i in range(n)])
+
+def test_save_swaps_one_pointer(tmp_path):
+    first = make_index(2).save(tmp_path)
+    second = make_index(3).save(tmp_path)
+    assert LocalVectorIndex.current_version(tmp_path) == second != first
+    loaded = LocalVectorIndex.load(tmp_path)
+    assert loaded.vectors.shape[0] == len(loaded.documents) == 3
+
+    # Only the live version and the one it replaced are kept
+    third = make_index(1).save(tmp_path)
+    assert sorted(os.listdir(tmp_path)) == sorted([CURRENT_FILE, second, third])
+
+def test_load_refuses_mismatched_files(tmp_path):
+    version = make_index(3).save(tmp_path)
+    make_index(2).save(tmp_path / "other")
+    other = LocalVectorIndex.current_version(tmp_path / "other")
+    os.replace(tmp_path / "other" / other / DOCUMENTS_FILE, tmp_path / version / DOCUMENTS_FILE)
+    with pytest.raises(ValueError):
+        LocalVectorIndex.load(tmp_path)
+
+def test_loads_the_old_flat_layout(tmp_path):
+    index = make_index(2)
+    version = index.save(tmp_path)
+    for name in (VECTORS_FILE, DOCUMENTS_FILE):
+        os.replace(tmp_path / version / name, tmp_path / name)
+    os.remove(tmp_path / CURRENT_FILE)
+    assert LocalVectorIndex.current_version(tmp_path) is None
+    assert len(LocalVectorIndex.load(tmp_path).documents) == 2
@@ -0,0 +1,48 @@
+from qdrant_client import QdrantClient, models
+
+import rag
+
+def test_collection_version_resolves_the_alias():
+    client = QdrantClient(":memory:")
+    client.create_collection("hospital_db_1", vectors_config=models.VectorParams(size=4, distance=models.Distance.COSINE))
+    client.update_collection_aliases(change_aliases_operations=[models.CreateAliasOperation(
+        create_alias=models.CreateAlias(collection_name="hospital_db_1", alias_name="hospital_db")
+    )])
+    service = rag.RetrievalService(backend="qdrant")
+    service._client = client
+    assert service.collection_version("hospital_db") == "hospital_db_1"
+
+def test_stale_lexical_index_is_rebuilt_from_the_collection(tmp_path, caplog):
+    from langchain_core.documents import Document
+    from fake_retrieval import HashingEmbeddings
+    from lexical_index import BM25Index
+    from local_index import LocalVectorIndex
+
+    embedding = HashingEmbeddings(dimension=64)
+    docs = [Document(page_content=text, metadata={}) for text in ("Parking costs two pounds", "The pharmacy is on the ground floor")]
+    LocalVectorIndex.from_documents(docs, embedding).save(tmp_path / "index" / "hospital_db")
+    BM25Index.from_documents([Document(page_content="Old visiting hours", metadata={})], version="hospital_db@v0").save(
+        tmp_path / "lexical" / "hospital_db"
+    )
+    service = rag.RetrievalService(embedding=embedding, backend="local", hybrid=True,
+                                   index_dir=str(tmp_path / "index"), lexical_dir=str(tmp_path / "lexical"))
+    index = service.lexical_index("hospital_db")
+    assert "rebuilding it from the collection" in caplog.text
+    assert index.version == service.collection_version("hospital_db")
+    assert [doc.page_content for doc in index.similarity_search("pharmacy")] == ["The pharmacy is on the ground floor"]
+
+def test_missing_lexical_index_is_built_from_qdrant(tmp_path):
+    client = QdrantClient(":memory:")
+    client.create_collection("hospital_db_1", vectors_config=models.VectorParams(size=4, distance=models.Distance.COSINE))
+    client.upsert("hospital_db_1", points=[models.PointStruct(
+        id=1, vector=[1.0, 0.0, 0.0, 0.0],
+        payload={"page_content": "The pharmacy is on the ground floor", "metadata": {"content_hash": "a"}}
+    )])
+    client.update_collection_aliases(change_aliases_operations=[models.CreateAliasOperation(
+        create_alias=models.CreateAlias(collection_name="hospital_db_1", alias_name="hospital_db")
+    )])
+    service = rag.RetrievalService(backend="qdrant", hybrid=True, lexical_dir=str(tmp_path))
+    service._client = client
+    index = service.lexical_index("hospital_db")
+    assert index.version == "hospital_db_1"
+    assert index.documents[0].metadata == {"content_hash": "a"}
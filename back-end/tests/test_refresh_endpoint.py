@@ -0,0 +1,16 @@
+from fastapi.testclient import TestClient
+
+import app
+
+def test_refresh_requires_the_shared_token(monkeypatch):
+    client = TestClient(app.app)
+    monkeypatch.setattr(app, "RAG_REFRESH_TOKEN", None)
+    assert client.post("/refreshRetrieval", headers={"X-Refresh-Token": ""}).status_code == 403
+
+    monkeypatch.setattr(app, "RAG_REFRESH_TOKEN", "s3cret")
+    assert client.post("/refreshRetrieval").status_code == 403
+    assert client.post("/refreshRetrieval", headers={"X-Refresh-Token": "wrong"}).status_code == 403
+    cleared = []
+    monkeypatch.setattr(app.answer_cache, "clear", lambda: cleared.append(True))
+    response = client.post("/refreshRetrieval", headers={"X-Refresh-Token": "s3cret"})
+    assert response.status_code == 200 and cleared
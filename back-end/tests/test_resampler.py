@@ -0,0 +1,42 @@
+import numpy as np
+
+from resampler import StreamingResampler, resample_offline
+
+def sine(rate, seconds=0.5, freq=440):
+    t = np.arange(int(rate * seconds)) / rate
+    return (np.sin(2 * np.pi * freq * t) * 0.5).astype(np.float32)
+
+def test_empty_input_returns_nothing():
+    resampler = StreamingResampler(24000, 16000)
+    assert resampler.process(b"") == b""
+    # A lone odd byte cannot form a sample either
+    assert resampler.process(b"\x01") == b""
+    assert len(resampler.flush()) > 0
+
+def test_empty_chunk_does_not_disturb_the_stream():
+    pcm = (sine(24000) * 32767).astype(np.int16).tobytes()
+    whole = StreamingResampler(24000, 16000)
+    expected = whole.process(pcm) + whole.flush()
+    chunked = StreamingResampler(24000, 16000)
+    got = chunked.process(pcm[:4800]) + chunked.process(b"") + chunked.process(pcm[4800:]) + chunked.flush()
+    assert got == expected
+
+def test_chunked_matches_offline():
+    for from_rate, to_rate in ((16000, 24000), (24000, 16000), (44100, 16000)):
+        samples = sine(from_rate)
+        resampler = StreamingResampler(from_rate, to_rate)
+        pieces = [resampler.process_float(chunk) for chunk in np.array_split(samples, 7)]
+        streamed = np.concatenate(pieces)
+        reference = resample_offline(samples, from_rate, to_rate)[:len(streamed)]
+        np.testing.assert_allclose(streamed, reference, atol=1e-4)
+
+def test_output_length_follows_the_rate_ratio():
+    resampler = StreamingResampler(16000, 24000)
+    out = sum(len(resampler.process_float(np.zeros(320, dtype=np.float32))) for _ in range(50))
+    assert out == 50 * 480
+
+def test_same_rate_is_passthrough():
+    resampler = StreamingResampler(16000, 16000)
+    assert resampler.passthrough
+    assert resampler.process(b"\x01\x02") == b"\x01\x02"
+    assert resampler.flush() == b""
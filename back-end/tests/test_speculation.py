@@ -0,0 +1,46 @@
+import asyncio
+import json
+
+import rag
+import transcription
+from fake_retrieval import StandInRetrievalService
+from transcription import OpenAITranscriber
+
+class NullWebSocket:
+    async def send_json(self, data):
+        pass
+
+    async def send_bytes(self, data):
+        pass
+
+class RecordingUpstream:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, message):
+        self.sent.append(json.loads(message))
+
+def test_speculation_hit_asks_the_final_transcript(monkeypatch):
+    service = StandInRetrievalService()
+    questions = []
+    retrieve = service.retrieve
+    monkeypatch.setattr(service, "retrieve", lambda question, *args: questions.append(question) or retrieve(question, *args))
+    monkeypatch.setattr(rag, "retrieval_service", service)
+    monkeypatch.setattr(transcription, "ANSWER_CACHE", False)
+
+    async def run():
+        transcriber = OpenAITranscriber(NullWebSocket())
+        transcriber.openai_ws = RecordingUpstream()
+        # Ends in a full stop, so retrieval starts straight away
+        transcriber.speculation.on_delta("item_1", "What time does the pharmacy close on Satur.")
+        await transcriber.speculation.items["item_1"].task
+        await transcriber.answer_transcript("What time does the pharmacy close on Saturday?", "item_1")
+        await transcriber.outbound.close()
+        return transcriber.openai_ws.sent
+
+    sent = asyncio.run(run())
+    # Retrieval ran once, for the partial, and was reused
+    assert questions == ["What time does the pharmacy close on Satur."]
+    user_item = sent[0]["response"]["input"][-1]
+    assert user_item["role"] == "user"
+    assert user_item["content"][0]["text"] == "What time does the pharmacy close on Saturday?"
@@ -0,0 +1,33 @@
+import time
+
+import numpy as np
+
+from vad import VoiceActivityGate
+
+RATE = 16000
+FRAME = RATE // 50
+
+def tone(frames):
+    t = np.arange(frames * FRAME) / RATE
+    return (np.sin(2 * np.pi * 220 * t) * 8000).astype(np.int16).tobytes()
+
+def silence(frames):
+    return bytes(frames * FRAME * 2)
+
+def test_onset_latency_is_measured_across_chunks():
+    gate = VoiceActivityGate(RATE, min_speech_frames=2, prefix_padding_ms=100)
+    assert gate.process(silence(20)) == b""
+    # One speech frame: not enough to open the gate yet
+    assert gate.process(tone(1)) == b""
+    time.sleep(0.05)
+    forwarded = gate.process(tone(1))
+    assert gate.open and gate.speech_onsets == 1
+    # Prefix (5 frames, including the first speech frame) plus the frame that opened the gate
+    assert len(forwarded) == 6 * FRAME * 2
+    assert gate.last_onset_latency_ms >= 50
+
+def test_dropped_bytes_count_silence_that_left_the_prefix():
+    gate = VoiceActivityGate(RATE, prefix_padding_ms=100)
+    gate.process(silence(20))
+    assert gate.bytes_dropped == 15 * FRAME * 2
+    assert gate.stats()["bytes_saved"] == 20 * FRAME * 2
@@ -0,0 +1,18 @@
+from fastapi.testclient import TestClient
+
+import app
+import metrics
+from transcription import OpenAITranscriber
+
+def test_failed_setup_undoes_the_session_bookkeeping(monkeypatch):
+    async def broken(self, session_pool=None):
+        raise ConnectionError("upstream refused")
+    monkeypatch.setattr(OpenAITranscriber, "initialize_websockets", broken)
+    before = metrics.active_sessions.value
+
+    client = TestClient(app.app)
+    with client.websocket_connect("/ws?binary=1") as ws:
+        assert ws.receive_json()["event_type"] == "protocol_selected"
+
+    assert metrics.active_sessions.value == before
+    assert len(app.sessions) == 0
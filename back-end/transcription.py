@@ -1,216 +1,415 @@
 import json
-import websocket
 import time
 import base64
 import os
-import struct
 from dotenv import load_dotenv
-import threading
 import asyncio
-from reconstruct_audio import reconstruct_audio
-from rag import rag2
-from threading import Lock
-from utils import (
-    amplify_audio,
-    base64_encode_audio,
-    float_to_16bit_pcm
-)
+import logging
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from websockets.asyncio.client import connect
+from websockets.protocol import State
+from audio_codec import encode_pcm16_base64
+from audio_protocol import FRAME_AUDIO_OUTPUT, pack_frame
+from resampler import StreamingResampler
+from vad import VoiceActivityGate
+from outbound import OutboundQueue
+from input_aggregator import INPUT_TARGET_MS, InputAggregator, append_event
+from speculation import SPECULATIVE_RETRIEVAL, SpeculativeRetrieval
+# Through the module, so a swapped in retrieval_service is picked up
+import rag
+from answer_cache import ANSWER_CACHE, answer_cache, answer_key
+from session_registry import SESSION_RECENT_IDS, RecentSet
+import metrics
 
 #LOG_FILENAME = "logs.txt"
-    
+
+logger = logging.getLogger("websocket-audio")
+
+# Relay response.audio.delta chunks to the client as they arrive instead of
+# buffering the whole response until response.audio.done
+STREAM_AUDIO = os.environ.get("STREAM_AUDIO", "true").lower() in ("1", "true", "yes")
+# Coalesce deltas until at least this many PCM bytes are pending (0 = forward every delta)
+STREAM_MIN_CHUNK_BYTES = int(os.environ.get("STREAM_MIN_CHUNK_BYTES", "0"))
+# The realtime session speaks PCM16 at 24 kHz, the browser captures and plays
+# at CLIENT_SAMPLE_RATE (page.js uses a 16 kHz AudioContext)
+REALTIME_SAMPLE_RATE = 24000
+CLIENT_SAMPLE_RATE = int(os.environ.get("CLIENT_SAMPLE_RATE", "16000"))
+# Rate of the audio we send to the client
+OUTPUT_SAMPLE_RATE = CLIENT_SAMPLE_RATE
+# Drop silent input frames locally before they are sent upstream
+LOCAL_VAD = os.environ.get("LOCAL_VAD", "true").lower() in ("1", "true", "yes")
+VAD_ENERGY_DB = float(os.environ.get("VAD_ENERGY_DB", "-45"))
+# Must stay above turn_detection.silence_duration_ms so the server still sees the turn end
+VAD_HANGOVER_MS = int(os.environ.get("VAD_HANGOVER_MS", "800"))
+PREFIX_PADDING_MS = 300
+# Overridable so the load tests can point at a local stand-in server
+OPENAI_REALTIME_URL = os.environ.get(
+    "OPENAI_REALTIME_URL",
+    "wss://api.openai.com/v1/realtime?model=gpt-4o-mini-realtime-preview"
+)
+# Retrieval does blocking HTTP calls, so it runs on a small shared pool off the event loop
+RAG_WORKERS = int(os.environ.get("RAG_WORKERS", "8"))
+rag_executor = ThreadPoolExecutor(max_workers=RAG_WORKERS, thread_name_prefix="rag")
+# Upper bound on connect + session.created/session.updated before giving up
+REALTIME_CONNECT_TIMEOUT = float(os.environ.get("REALTIME_CONNECT_TIMEOUT", "10"))
+# whisper-1 delivers the transcript in one piece; gpt-4o-transcribe and
+# gpt-4o-mini-transcribe stream deltas, which speculative retrieval feeds on
+INPUT_TRANSCRIPTION_MODEL = os.environ.get("INPUT_TRANSCRIPTION_MODEL", "whisper-1")
+# Cap on answer audio held for one response when STREAM_AUDIO is off (~60 s at 24 kHz)
+MAX_BUFFERED_AUDIO_BYTES = int(os.environ.get("MAX_BUFFERED_AUDIO_BYTES", str(24000 * 2 * 60)))
+# Cancel the answer in progress when the caller starts talking over it
+BARGE_IN = os.environ.get("BARGE_IN", "true").lower() in ("1", "true", "yes")
+# Also act on the local VAD, which hears the caller before upstream's speech_started arrives
+BARGE_IN_LOCAL_VAD = os.environ.get("BARGE_IN_LOCAL_VAD", "true").lower() in ("1", "true", "yes")
+
+# Series bound once here so the hot path never builds label sets
+RAG_LEXICAL_SECONDS = metrics.rag_stage.child("lexical")
+RAG_EMBEDDING_SECONDS = metrics.rag_stage.child("embedding")
+RAG_SEARCH_SECONDS = metrics.rag_stage.child("search")
+RAG_TOTAL_SECONDS = metrics.rag_stage.child("total")
+AUDIO_RECONSTRUCT_SECONDS = metrics.audio_processing.child("reconstruct")
+AUDIO_ENCODE_SECONDS = metrics.audio_processing.child("encode")
+PROMPT_BYTES_SENT = metrics.prompt_bytes.child("sent")
+PROMPT_BYTES_BASELINE = metrics.prompt_bytes.child("baseline")
+BARGE_INS = {source: metrics.barge_ins.child(source) for source in ("upstream", "local")}
+
+def session_update_event():
+    return {
+        "type": "session.update",
+        "session": {
+            # With compact prompts the answers rely on these, see rag.response_event
+            "instructions": rag.RECEPTIONIST_INSTRUCTIONS if rag.COMPACT_PROMPT
+                            else "Your job is to transcript audio you're given, and create speech of text you're given.",
+            "input_audio_transcription": {
+                "model": INPUT_TRANSCRIPTION_MODEL,
+                "language": "en"
+            },
+            "turn_detection": {
+                "type": "server_vad",
+                "threshold": 0.5,
+                "prefix_padding_ms": PREFIX_PADDING_MS,
+                "silence_duration_ms": 500,
+                "create_response": False,
+                "interrupt_response": False
+            },
+            "voice": "ballad"
+        }
+    }
+
+async def connect_realtime():
+    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+    if not OPENAI_API_KEY:
+        raise ValueError("Missing OPENAI_API_KEY")
+
+    headers = {"Authorization": "Bearer " + OPENAI_API_KEY, "OpenAI-Beta": "realtime=v1"}
+    return await asyncio.wait_for(
+        connect(OPENAI_REALTIME_URL, additional_headers=headers, max_size=None),
+        timeout=REALTIME_CONNECT_TIMEOUT
+    )
+
+async def open_configured_session():
+    """
+    Connect upstream and run the session.created -> session.update ->
+    session.updated handshake up front. Used to pre-warm pooled sessions.
+    """
+    ws = await connect_realtime()
+    try:
+        async def handshake():
+            async for message in ws:
+                data = json.loads(message)
+                if data['type'] == "session.created":
+                    await ws.send(json.dumps(session_update_event()))
+                elif data['type'] == "session.updated":
+                    return
+            raise ConnectionError("Realtime socket closed during handshake")
+
+        await asyncio.wait_for(handshake(), timeout=REALTIME_CONNECT_TIMEOUT)
+        return ws
+    except BaseException:
+        await ws.close()
+        raise
+
 class OpenAITranscriber:
-    openai_ws = None
-    _ws_lock = Lock()
-    openai_thread = None
-    
-    def __init__(self, client_websocket):
+    """
+    One caller's realtime session. The upstream socket runs as a coroutine on
+    the server's event loop, so a session costs a task rather than a thread.
+    """
+
+    def __init__(self, client_websocket, binary_audio=False):
         self.client_websocket = client_websocket
+        # Everything for the browser goes through this bounded queue and its writer task
+        self.outbound = OutboundQueue(client_websocket)
+        # Send response audio as binary frames (see audio_protocol) instead of base64 JSON
+        self.binary_audio = binary_audio
+        self.openai_ws = None
+        self.reader_task = None
+        # Set once upstream confirms our session.update, see wait_until_ready
+        self.ready = asyncio.Event()
         self.stream_active = False
         self.sent_audio = False
-        self.current_audio = []
+        # Answer audio as raw PCM16 when STREAM_AUDIO is off, one buffer reused across responses
+        self.current_audio = bytearray()
         self.sent_rag = False
-        self._sent_rag_lock = Lock()
-        self.item_ids = []
-        self.processed_message_ids = set()
-        self.processed_transcripts = set()
-        self.processed_audio_responses = set()
+        # Only the most recent ids are kept, a session may run for hours
+        self.item_ids = deque(maxlen=SESSION_RECENT_IDS)
+        self.processed_message_ids = RecentSet()
+        self.processed_transcripts = RecentSet()
+        self.processed_audio_responses = RecentSet()
         self.last_transcript = None
-        
+        # Last message from the browser, for the idle session reaper
+        self.last_client_activity = time.monotonic()
+        # In-flight retrieval for the latest transcript, see answer_transcript
+        self.rag_task = None
+        # Early retrieval from partial transcripts, per item_id
+        self.speculation = SpeculativeRetrieval(self.retrieve_answer) if SPECULATIVE_RETRIEVAL else None
+        # Streaming relay state
+        self.response_seq = 0
+        self.response_id = None
+        self.response_stream = 0
+        self.pending_audio = []
+        self.pending_audio_bytes = 0
+        # Rate conversion between the browser and the realtime session, state kept across chunks
+        self.input_resampler = StreamingResampler(CLIENT_SAMPLE_RATE, REALTIME_SAMPLE_RATE)
+        self.output_resampler = StreamingResampler(REALTIME_SAMPLE_RATE, CLIENT_SAMPLE_RATE)
+        self.vad = VoiceActivityGate(
+            CLIENT_SAMPLE_RATE,
+            energy_db=VAD_ENERGY_DB,
+            hangover_ms=VAD_HANGOVER_MS,
+            prefix_padding_ms=PREFIX_PADDING_MS
+        ) if LOCAL_VAD else None
+        # Batches upstream appends at the client rate and resamples once per batch
+        self.input_aggregator = InputAggregator(
+            self.send_upstream_text, CLIENT_SAMPLE_RATE, transform=self.input_resampler.process
+        ) if INPUT_TARGET_MS > 0 else None
+        # Answer audio being captured for the answer cache, see on response.created
+        self.pending_answer_key = None
+        self.recording_key = None
+        self.recording = None
+        # The response whose audio is being recorded, only its deltas and done count
+        self.recording_response_id = None
+        self.response_requested_at = None
+        self.first_audio_sent = False
+        self.time_to_first_audio_ms = None
+        self.speech_stopped_at = None
+        # Barge-in state: the upstream response being generated, and the one we
+        # cancelled, whose late deltas are ignored
+        self.awaiting_response = False
+        self.cancel_next_response = False
+        self.active_response_id = None
+        self.active_item_id = None
+        self.active_in_conversation = False
+        self.cancelled_response_id = None
+        # Audio of the active response sent to the client, and when the client should finish playing it
+        self.response_audio_ms = 0.0
+        self.playback_until = 0.0
+        self.barge_in_at = None
+
 
         # file = open("logs.txt", "w")
         # file.write("")
         # file.close()
-        
+
         load_dotenv()
-        self.initialize_websockets()
-        
+
     async def test(self):
         message = {
             "event_type": "checking connectivity",
             "event_data": "connection established"
         }
-        await self.client_websocket.send_json(message)
+        await self.send_json_to_client(message)
 
     def is_openai_connected(self):
-        return (self.openai_ws and hasattr(self.openai_ws, 'sock') 
-            and self.openai_ws.sock and self.openai_ws.sock.connected)
-        
-    def initialize_websockets(self):
+        return self.openai_ws is not None and self.openai_ws.state is State.OPEN
+
+    async def initialize_websockets(self, session_pool=None):
         try:
-            OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-            
-            if not OPENAI_API_KEY:
-                raise ValueError("Missing OPENAI_API_KEY")
-            
-            headers = ["Authorization: Bearer " + OPENAI_API_KEY, "OpenAI-Beta: realtime=v1"]
-            
-            self.openai_ws = websocket.WebSocketApp(
-                url="wss://api.openai.com/v1/realtime?model=gpt-4o-mini-realtime-preview",
-                header=headers,
-                on_open=self.on_openai_open,
-                on_message=self.on_openai_message,
-                on_error=self.on_error,
-                on_close=self.on_openai_close
-            )
-            
-            self.openai_thread = threading.Thread(
-                target=self.openai_ws.run_forever,
-                daemon=True
-            )
-            self.openai_thread.start()
-            time.sleep(1)  # Give time for connection
+            pooled_ws = await session_pool.acquire() if session_pool else None
+            if pooled_ws is not None:
+                # Already connected and configured, nothing left to wait for
+                self.openai_ws = pooled_ws
+                self.ready.set()
+            else:
+                self.openai_ws = await connect_realtime()
+            self.on_openai_open()
+            self.reader_task = asyncio.create_task(self.run_openai_reader())
         except Exception as e:
-            pass
-            #print(f"WebSocket initialization failed: {e}")
-            #log(f"WebSocket initialization failed: {e}", LOG_FILENAME)    
-        # Add these new methods for better connection management
-    
-    def on_openai_close(self, ws, close_status_code, close_msg):
+            logger.error(f"WebSocket initialization failed: {e}")
+            #log(f"WebSocket initialization failed: {e}", LOG_FILENAME)
+
+    async def wait_until_ready(self, timeout=REALTIME_CONNECT_TIMEOUT):
+        """Wait for session.updated from upstream. Returns False on timeout or a dead socket."""
+        if self.reader_task is None:
+            return False
+        ready = asyncio.create_task(self.ready.wait())
+        done, _ = await asyncio.wait({ready, self.reader_task}, timeout=timeout,
+                                     return_when=asyncio.FIRST_COMPLETED)
+        if ready not in done:
+            ready.cancel()
+            return False
+        return True
+
+    async def run_openai_reader(self):
+        try:
+            async for message in self.openai_ws:
+                try:
+                    await self.on_openai_message(message)
+                except Exception as e:
+                    self.on_error(e)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.on_error(e)
+        finally:
+            self.on_openai_close(self.openai_ws.close_code, self.openai_ws.close_reason)
+
+    def on_openai_close(self, close_status_code, close_msg):
         pass
         #print(f"OpenAI WebSocket closed: {close_status_code} - {close_msg}")
         #log(f"OpenAI WebSocket closed: {close_status_code} - {close_msg}", LOG_FILENAME)
-        
-    def on_client_close(self, ws, close_status_code, close_msg):
-        pass
-        #print(f"Client WebSocket closed: {close_status_code} - {close_msg}")
-        #log(f"Client WebSocket closed: {close_status_code} - {close_msg}", LOG_FILENAME)
-        
-    def on_client_open(self, ws):
-        pass
-        #print("Client WebSocket connection established")
-        #log("Client WebSocket connection established", LOG_FILENAME)   
 
     def set_client_websocket(self, client_websocket):
         self.client_websocket = client_websocket
+        self.outbound.websocket = client_websocket
 
-    def process_audio_chunk(self, indata, frames, time, status):
-        if status:
-            pass
-            #print("Status:", status)
-            #log("Status:" + str(status), LOG_FILENAME)
-        if not self.stream_active or self.openai_ws is None:
-            return
-            
-        audio_chunk = indata[:, 0]  # if mono, or pick a single channel
-        amplified_chunk = amplify_audio(audio_chunk)
-            
-        self.send_audio_to_openai(amplified_chunk)
-    
-    def send_audio_to_openai(self, base64_audio):
-        #log("\n>> Sending audio to openai\n\n", LOG_FILENAME)
-        with self._ws_lock:
-            try:
-                if not self.is_openai_connected():
-                    #print("OpenAI socket not connected, cannot send audio")
-                    return False
+    async def send_audio_to_openai(self, base64_audio):
+        if self.input_resampler.passthrough and self.vad is None and self.input_aggregator is None:
+            return await self.append_input_audio(base64_audio)
+        return await self.send_pcm_to_openai(base64.b64decode(base64_audio))
 
-                event = {
-                    "type": "input_audio_buffer.append",
-                    "audio": base64_audio
-                }
-                self.openai_ws.send(json.dumps(event))
+    async def send_pcm_to_openai(self, pcm):
+        speaking = self.vad is not None and self.vad.open
+        if self.vad is not None:
+            onsets, dropped = self.vad.speech_onsets, self.vad.bytes_dropped
+            pcm = self.vad.process(pcm)
+            if self.vad.bytes_dropped != dropped:
+                metrics.vad_dropped_bytes.inc(self.vad.bytes_dropped - dropped)
+            if self.vad.speech_onsets != onsets:
+                metrics.vad_onset_latency.observe(self.vad.last_onset_latency_ms / 1000)
+                if BARGE_IN and BARGE_IN_LOCAL_VAD:
+                    await self.barge_in("local")
+
+        if self.input_aggregator is None:
+            if not pcm:
+                # Silence, nothing to send
                 return True
-                
-            except Exception as e:
-                #print(f"Error sending audio to OpenAI: {str(e)}")
-                #log(f"Error sending audio to OpenAI: {str(e)}", LOG_FILENAME)
+            return await self.append_input_audio(encode_pcm16_base64(self.input_resampler.process(pcm)))
+
+        sent = await self.input_aggregator.add(pcm)
+        if speaking and not self.vad.open:
+            # The gate just closed, send the end of the turn now rather than on the deadline
+            sent = await self.input_aggregator.flush() and sent
+        return sent
+
+    async def append_input_audio(self, base64_audio):
+        return await self.send_upstream_text(append_event(base64_audio))
+
+    async def send_upstream_text(self, text):
+        #log("\n>> Sending audio to openai\n\n", LOG_FILENAME)
+        try:
+            if not self.is_openai_connected():
+                #print("OpenAI socket not connected, cannot send audio")
                 return False
-                            
-    def on_openai_open(self, ws):
+
+            await self.openai_ws.send(text)
+            return True
+
+        except Exception as e:
+            #print(f"Error sending audio to OpenAI: {str(e)}")
+            #log(f"Error sending audio to OpenAI: {str(e)}", LOG_FILENAME)
+            return False
+
+    def on_openai_open(self):
         pass
         #print("Connected to OpenAI server.")
         #log("Connected to OpenAI server.", LOG_FILENAME)
-                
-        
-    def websocket_working(self, socket_name):
-        if(socket_name == "client"):
-            return self.client_websocket is not None and self.client_websocket.sock is not None and self.client_websocket.sock.connected
-        elif(socket_name == "openai"):
-            return self.openai_ws is not None and self.openai_ws.sock is not None and self.openai_ws.sock.connected
-        
-    def on_openai_message(self, ws, message):
+
+    async def on_openai_message(self, message):
         data = json.loads(message)
-        
+
         #print("Raw message received from OpenAI")
         #log("Raw message received from OpenAI", LOG_FILENAME)
         ##print(data)
         #log(data, LOG_FILENAME)
-         # Create event loop if none exists
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
         if(data['type'] == "session.created"):
-            event = {
-                "type": "session.update",
-                "session": {
-                    "instructions": "Your job is to transcript audio you're given, and create speech of text you're given.",
-                    "input_audio_transcription": {
-                        "model": "whisper-1",
-                        "language": "en"
-                    },
-                    "turn_detection": {
-                        "type": "server_vad",
-                        "threshold": 0.5,
-                        "prefix_padding_ms": 300,
-                        "silence_duration_ms": 500,
-                        "create_response": False,
-                        "interrupt_response": False
-                    },
-                    "voice": "ballad"
-                }
-            }
-            if(self.websocket_working("openai")):
-                self.openai_ws.send(json.dumps(event))
-            
+            event = session_update_event()
+            if(self.is_openai_connected()):
+                await self.openai_ws.send(json.dumps(event))
+
+        elif(data['type'] == "session.updated"):
+            self.ready.set()
+
+        elif(data['type'] == "input_audio_buffer.speech_started"):
+            if BARGE_IN:
+                await self.barge_in("upstream")
+
+        elif(data['type'] == "input_audio_buffer.speech_stopped"):
+            self.speech_stopped_at = time.perf_counter()
+
+        elif(data['type'] == "conversation.item.input_audio_transcription.delta"):
+            if self.speculation is not None:
+                self.speculation.on_delta(data['item_id'], data.get('delta', ''))
+
         elif(data['type'] == "conversation.item.input_audio_transcription.completed"):
+            if self.speech_stopped_at is not None:
+                metrics.speech_to_transcript.observe(time.perf_counter() - self.speech_stopped_at)
+                self.speech_stopped_at = None
             transcript = data['transcript']
             item_id = data['item_id']
-            event = rag2(transcript)
-            self.openai_ws.send(json.dumps(event))
-            
+            if item_id in self.processed_transcripts:
+                # Already answered, e.g. a redelivered event
+                return
+            self.processed_transcripts.add(item_id)
+            self.item_ids.append(item_id)
+            # A newer transcript makes any lookup still in flight stale
+            if self.rag_task and not self.rag_task.done():
+                self.rag_task.cancel()
+            self.rag_task = asyncio.create_task(self.answer_transcript(transcript, item_id))
+
         elif(data['type'] == "response.text.delta"):
             pass
             #print(data)
             #log(data, LOG_FILENAME)
-            
+
         elif(data['type'] == "response.audio.delta"):
             #print(data)
             #log(data, LOG_FILENAME)
-            self.current_audio.append(data['delta'])
+            if self.cancelled_response_id is not None and data.get('response_id') == self.cancelled_response_id:
+                # Still in flight when we cancelled it
+                return
+            if STREAM_AUDIO:
+                await self.relay_audio_delta(data)
+                return
+            if len(self.current_audio) >= MAX_BUFFERED_AUDIO_BYTES:
+                return
+            self.current_audio += base64.b64decode(data['delta'])
             #log("Data added into array", LOG_FILENAME)
-            
+
         elif(data['type'] == "response.audio.done"): #and self.sent_audio == True):
+            if self.cancelled_response_id is not None and data.get('response_id') == self.cancelled_response_id:
+                return
+            if STREAM_AUDIO:
+                await self.flush_audio_stream(final=True)
+                return
             if(len(self.current_audio) >= 0):
                 #log("Appropriate length", LOG_FILENAME)
-                to_send_audio = reconstruct_audio(self.current_audio)
+                # PCM16 passthrough, no float round trip before resampling to the client rate
+                start = time.perf_counter()
+                self.output_resampler.reset()
+                to_send_audio = self.output_resampler.process(self.current_audio) + self.output_resampler.flush()
+                AUDIO_RECONSTRUCT_SECONDS.observe(time.perf_counter() - start)
+                self.record_answer_audio(to_send_audio, data.get('response_id'))
+                self.schedule_playback(len(to_send_audio))
                 #print(to_send_audio)
                 if (len(to_send_audio) > 0):
                     #log(f"Audio data length: {len(to_send_audio)}", LOG_FILENAME)
-                    base_64_audio = base64_encode_audio(to_send_audio) #encoding before sending
+                    start = time.perf_counter()
+                    base_64_audio = encode_pcm16_base64(to_send_audio) #encoding before sending
+                    AUDIO_ENCODE_SECONDS.observe(time.perf_counter() - start)
                     if base_64_audio:
-                        loop.run_until_complete(self.send_to_client(base_64_audio))
+                        await self.send_to_client(base_64_audio)
                         #print("Message sent")
                         #log("Message sen", LOG_FILENAME)
                     else:
@@ -219,12 +418,44 @@ class OpenAITranscriber:
                 else:
                     pass
                     #log("Reconstructed audio is empty", LOG_FILENAME)
-                self.current_audio = []
+                self.current_audio.clear()
             else:
                 #log("Insufficient length", LOG_FILENAME)
                 return
-                
+
+        elif(data['type'] == "response.created"):
+            response = data.get('response', {})
+            self.awaiting_response = False
+            if self.cancel_next_response:
+                # The caller barged in before upstream had even started this answer
+                self.cancel_next_response = False
+                await self.cancel_response(response.get('id'))
+                return
+            self.active_response_id = response.get('id')
+            self.active_item_id = None
+            # Out-of-band answers ("conversation": "none") leave nothing to truncate
+            self.active_in_conversation = response.get('conversation_id') is not None
+            self.response_audio_ms = 0.0
+            if self.pending_answer_key is not None:
+                # This is the answer we asked for, capture its audio for the answer cache
+                self.recording_key = self.pending_answer_key
+                self.recording = bytearray()
+                self.recording_response_id = response.get('id')
+                self.pending_answer_key = None
+
+        elif(data['type'] == "response.output_item.added"):
+            if data.get('response_id') == self.active_response_id:
+                self.active_item_id = data.get('item', {}).get('id')
+
         elif(data['type'] == "response.done"):
+            response_id = data.get('response', {}).get('id')
+            self.processed_audio_responses.add(response_id)
+            if response_id == self.active_response_id:
+                self.active_response_id = None
+            if response_id == self.cancelled_response_id:
+                self.cancelled_response_id = None
+            if self.recording is not None and response_id == self.recording_response_id:
+                await self.store_answer_audio(data.get('response', {}).get('status'))
             try:
                 if(data['metadata']['topic'] == "rag"):
                     rag_response = data['response']['output']['content']['text']
@@ -236,15 +467,307 @@ class OpenAITranscriber:
             pass
             #print("Received event:", json.dumps(data, indent=2) + '\n')
             #log("Received event:" + json.dumps(data, indent=2) + '\n', LOG_FILENAME)
-                
-    def on_error(self, ws, error):
+
+    async def answer_transcript(self, transcript, item_id):
+        """
+        Retrieve context for a transcript and ask upstream for the answer.
+        Runs as its own task so the reader keeps relaying audio meanwhile.
+        """
+        try:
+            start = time.perf_counter()
+            key = await self.answer_cache_key(transcript)
+            if key is not None:
+                # Loads the index and maps the file, off the event loop like put
+                cached = await asyncio.to_thread(answer_cache.get, key)
+                if cached is not None:
+                    if self.speculation is not None:
+                        self.speculation.discard(item_id)
+                    await self.replay_answer(*cached)
+                    logger.info(f"Answered {item_id} from the answer audio cache ({len(cached[0])} bytes)")
+                    return
+
+            result = None
+            if self.speculation is not None:
+                result = await self.speculation.take(item_id, transcript)
+            speculated = result is not None
+            if result is None:
+                result = await self.retrieve_answer(transcript)
+            contexts, timings = result
+            # From the final transcript: a speculative result only carries the
+            # context, the partial it was retrieved for may be cut short
+            event = rag.response_event(transcript, contexts, timings)
+            # Time retrieval added after the final transcript, near zero when speculation won
+            RAG_TOTAL_SECONDS.observe(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            self.pending_answer_key = key
+            self.awaiting_response = True
+            payload = json.dumps(event)
+            await self.openai_ws.send(payload)
+            PROMPT_BYTES_SENT.observe(len(payload))
+            if "baseline_prompt_bytes" in timings:
+                PROMPT_BYTES_BASELINE.observe(timings["baseline_prompt_bytes"])
+            timings["send_ms"] = (time.perf_counter() - start) * 1000
+            self.response_requested_at = time.perf_counter()
+            self.first_audio_sent = False
+            logger.info(
+                f"RAG timings for {item_id} (cache {timings.get('cache', 'off')}, "
+                f"path {timings.get('path', '-')}, {'speculative' if speculated else 'on final'}): "
+                f"lexical {timings.get('lexical_ms', 0):.1f} ms, embedding {timings.get('embedding_ms', 0):.1f} ms, "
+                f"search {timings.get('search_ms', 0):.1f} ms, send {timings['send_ms']:.1f} ms, "
+                f"prompt {len(payload)} bytes (baseline {timings.get('baseline_prompt_bytes', 0)})"
+            )
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            self.on_error(e)
+
+    async def answer_cache_key(self, transcript):
+        """Answer cache key for a transcript, or None when the cache is off or the version is unknown."""
+        if not ANSWER_CACHE:
+            return None
+        try:
+            # Cached after the first call, which may ask Qdrant for the alias target
+            loop = asyncio.get_running_loop()
+            version = await loop.run_in_executor(rag_executor, rag.retrieval_service.collection_version)
+        except Exception as e:
+            self.on_error(e)
+            return None
+        return answer_key(transcript, f"{version}@{OUTPUT_SAMPLE_RATE}")
+
+    async def replay_answer(self, pcm, sample_rate):
+        """Send cached answer audio to the client the same way a streamed answer is sent."""
+        self.response_requested_at = time.perf_counter()
+        self.first_audio_sent = False
+        if not STREAM_AUDIO:
+            self.record_first_audio()
+            self.schedule_playback(len(pcm))
+            await self.send_to_client(encode_pcm16_base64(pcm))
+            return
+        self.response_id = "cached_" + uuid.uuid4().hex[:12]
+        self.response_stream += 1
+        self.response_seq = 0
+        # 100 ms per chunk, as upstream deltas roughly are
+        chunk_bytes = sample_rate // 10 * 2
+        for offset in range(0, len(pcm), chunk_bytes):
+            await self.send_audio_chunk(pcm[offset:offset + chunk_bytes])
+        await self.send_audio_done()
+
+    async def barge_in(self, source):
+        """
+        The caller started talking over an answer: cancel it upstream, drop
+        the audio still queued for the client and tell the client to silence
+        what it already has. Returns False if there was nothing to interrupt.
+        """
+        answering = self.rag_task is not None and not self.rag_task.done()
+        playing = self.playback_until > time.monotonic()
+        if not (answering or playing or self.awaiting_response or self.active_response_id):
+            return False
+        self.barge_in_at = time.perf_counter()
+        BARGE_INS[source].inc()
+
+        if answering:
+            # Retrieval or a cached replay for the question being talked over
+            self.rag_task.cancel()
+            self.rag_task = None
+        if self.active_response_id is not None:
+            await self.cancel_response(self.active_response_id)
+        elif self.awaiting_response:
+            # response.create is out but response.created has not arrived, cancel it when it does
+            self.cancel_next_response = True
+        self.awaiting_response = False
+        self.pending_answer_key = None
+        self.recording = None
+        self.recording_key = None
+        self.recording_response_id = None
+
+        self.pending_audio = []
+        self.pending_audio_bytes = 0
+        self.current_audio.clear()
+        self.output_resampler.reset()
+        dropped = self.outbound.drop_audio()
+        message = {
+            "event_type": "audio_flush",
+            "response_id": self.response_id,
+            "stream": self.response_stream
+        }
+        self.response_id = None
+        self.response_seq = 0
+        self.playback_until = 0.0
+        await self.send_json_to_client(message)
+        logger.info(f"Barge-in ({source}): dropped {dropped} queued audio messages")
+        return True
+
+    async def cancel_response(self, response_id):
+        self.cancelled_response_id = response_id
+        self.active_response_id = None
+        await self.send_upstream_text(json.dumps({"type": "response.cancel", "response_id": response_id}))
+        if self.active_in_conversation and self.active_item_id is not None:
+            # Cut upstream's copy of the answer back to what the caller actually heard
+            played_ms = self.response_audio_ms - max(0.0, self.playback_until - time.monotonic()) * 1000
+            await self.send_upstream_text(json.dumps({
+                "type": "conversation.item.truncate",
+                "item_id": self.active_item_id,
+                "content_index": 0,
+                "audio_end_ms": max(0, int(played_ms))
+            }))
+        self.active_item_id = None
+        self.active_in_conversation = False
+
+    def on_client_flushed(self):
+        """The client acknowledged an audio_flush, its playback is silent now."""
+        if self.barge_in_at is None:
+            return
+        metrics.barge_in_silence.observe(time.perf_counter() - self.barge_in_at)
+        self.barge_in_at = None
+
+    def schedule_playback(self, pcm_size):
+        # The client plays chunks back to back, so this tracks when it will fall silent
+        duration = pcm_size / 2 / OUTPUT_SAMPLE_RATE
+        self.playback_until = max(self.playback_until, time.monotonic()) + duration
+        self.response_audio_ms += duration * 1000
+
+    def record_answer_audio(self, pcm_bytes, response_id):
+        if self.recording is None or response_id != self.recording_response_id:
+            return
+        if len(self.recording) + len(pcm_bytes) > answer_cache.max_bytes:
+            # Too long to ever fit, stop capturing
+            self.recording = None
+            return
+        self.recording += pcm_bytes
+
+    async def store_answer_audio(self, status):
+        recording, key = self.recording, self.recording_key
+        self.recording = None
+        self.recording_key = None
+        self.recording_response_id = None
+        # Only complete answers are worth replaying
+        if status == "completed" and recording:
+            await asyncio.to_thread(answer_cache.put, key, recording, OUTPUT_SAMPLE_RATE)
+
+    async def retrieve_answer(self, transcript):
+        """Run retrieval on the retrieval pool. Returns (context documents, timings)."""
+        timings = {}
+        loop = asyncio.get_running_loop()
+        contexts = await loop.run_in_executor(rag_executor, partial(rag.retrieve_context, transcript, timings=timings))
+        if "lexical_ms" in timings:
+            RAG_LEXICAL_SECONDS.observe(timings["lexical_ms"] / 1000)
+        if "path" in timings:
+            metrics.retrieval_path.child(timings["path"]).inc()
+        if "embedding_ms" in timings:
+            RAG_EMBEDDING_SECONDS.observe(timings["embedding_ms"] / 1000)
+        if "search_ms" in timings:
+            RAG_SEARCH_SECONDS.observe(timings["search_ms"] / 1000)
+        return contexts, timings
+
+    def on_error(self, error):
         if isinstance(error, Exception):
             error_msg = str(error)
         else:
             error_msg = error
         #print("Error:", error_msg)
         #log("Error:" + error_msg, LOG_FILENAME)
-    
+
+    async def relay_audio_delta(self, data):
+        response_id = data.get('response_id')
+        if response_id != self.response_id:
+            # A new response started, so sequence numbers restart from zero
+            self.response_id = response_id
+            self.response_stream += 1
+            self.response_seq = 0
+            self.pending_audio = []
+            self.pending_audio_bytes = 0
+            self.output_resampler.reset()
+
+        pcm_bytes = base64.b64decode(data['delta'])
+        self.pending_audio.append(pcm_bytes)
+        self.pending_audio_bytes += len(pcm_bytes)
+        if self.pending_audio_bytes >= STREAM_MIN_CHUNK_BYTES:
+            await self.flush_audio_stream()
+
+    async def flush_audio_stream(self, final=False):
+        pcm_bytes = b''
+        start = time.perf_counter()
+        if self.pending_audio:
+            pcm_bytes = self.output_resampler.process(b''.join(self.pending_audio))
+            self.pending_audio = []
+            self.pending_audio_bytes = 0
+        if final:
+            pcm_bytes += self.output_resampler.flush()
+        if pcm_bytes:
+            AUDIO_RECONSTRUCT_SECONDS.observe(time.perf_counter() - start)
+            self.record_answer_audio(pcm_bytes, self.response_id)
+            await self.send_audio_chunk(pcm_bytes)
+        if final:
+            await self.send_audio_done()
+
+    async def send_audio_chunk(self, pcm_bytes):
+        encode_start = time.perf_counter()
+        self.record_first_audio()
+        self.schedule_playback(len(pcm_bytes))
+        if self.binary_audio:
+            frame = pack_frame(FRAME_AUDIO_OUTPUT, self.response_stream, self.response_seq, pcm_bytes)
+            self.response_seq += 1
+            AUDIO_ENCODE_SECONDS.observe(time.perf_counter() - encode_start)
+            await self.send_bytes_to_client(frame)
+        else:
+            message = {
+                "event_type": "audio_response_chunk",
+                "event_data": encode_pcm16_base64(pcm_bytes),
+                "response_id": self.response_id,
+                "seq": self.response_seq,
+                "sample_rate": OUTPUT_SAMPLE_RATE
+            }
+            self.response_seq += 1
+            AUDIO_ENCODE_SECONDS.observe(time.perf_counter() - encode_start)
+            await self.send_json_to_client(message, droppable=True)
+
+    async def send_audio_done(self):
+        message = {
+            "event_type": "audio_response_done",
+            "response_id": self.response_id,
+            "stream": self.response_stream,
+            "seq": self.response_seq
+        }
+        await self.send_json_to_client(message)
+        self.response_id = None
+        self.response_seq = 0
+
+    def record_first_audio(self):
+        if self.first_audio_sent or self.response_requested_at is None:
+            return
+        self.first_audio_sent = True
+        elapsed_ms = (time.perf_counter() - self.response_requested_at) * 1000
+        self.time_to_first_audio_ms = elapsed_ms
+        metrics.first_audio.observe(elapsed_ms / 1000)
+        logger.info(f"Time to first audio byte: {elapsed_ms:.1f} ms")
+
+    def touch(self):
+        self.last_client_activity = time.monotonic()
+
+    def resident_bytes(self):
+        """Bytes this session holds in buffers, by where they sit."""
+        return {
+            "answer_audio": len(self.current_audio) + self.pending_audio_bytes
+                            + (len(self.recording) if self.recording is not None else 0),
+            "outbound": self.outbound.bytes,
+            "input": (self.input_aggregator.pending_bytes if self.input_aggregator is not None else 0)
+                     + (self.vad.buffered_bytes() if self.vad is not None else 0),
+            "recent_ids": 64 * (len(self.item_ids) + len(self.processed_message_ids)
+                                + len(self.processed_transcripts) + len(self.processed_audio_responses))
+        }
+
+    def queued_frames(self):
+        """Answer audio received from upstream or queued for the client but not yet sent."""
+        return len(self.pending_audio) + self.outbound.depth()
+
+    async def send_json_to_client(self, message, droppable=False):
+        # Audio chunks may be dropped under the drop_oldest policy, control messages never are
+        return await self.outbound.put_json(message, droppable)
+
+    async def send_bytes_to_client(self, frame):
+        return await self.outbound.put_bytes(frame)
+
     async def send_to_client(self, base_64_audio):
         if not base_64_audio:
             #log("Attempted to send empty audio data", LOG_FILENAME)
@@ -253,39 +776,52 @@ class OpenAITranscriber:
                     "event_type": "audio_response_transmitting",
                     "event_data": base_64_audio
                 }
-        try:
-            await self.client_websocket.send_json(message)    
-        except Exception as e:
-            pass
-            #print(e)
-            #log(str(e), LOG_FILENAME)
-        
-    def stop_transcription(self):
+        await self.send_json_to_client(message, droppable=True)
+
+    async def stop_transcription(self):
         self.stream_active = False
-        
+        if self.vad is not None:
+            logger.info(f"Local VAD stats: {self.vad.stats()}")
+        logger.info(f"Outbound queue stats: {self.outbound.stats()}")
+        if self.input_aggregator is not None:
+            logger.info(f"Input aggregator stats: {self.input_aggregator.stats()}")
+            self.input_aggregator.close()
+        await self.outbound.close()
+
+        if self.rag_task:
+            self.rag_task.cancel()
+            self.rag_task = None
+        if self.speculation is not None:
+            self.speculation.cancel_all()
+        if self.reader_task:
+            self.reader_task.cancel()
+            self.reader_task = None
         if self.openai_ws:
-            self.openai_ws.close()
+            await self.openai_ws.close()
             self.openai_ws = None
-            
+
         return True
-    
-    def get_voice_output(self, text):
+
+    async def get_voice_output(self, text):
         event = {
             "type": "session.update"
-        } 
-        self.openai_ws.send(json.dumps(event))       
-        
+        }
+        await self.openai_ws.send(json.dumps(event))
+
 if __name__ == "__main__":
     #print("Entering main function")
     #log("Entering main function", LOG_FILENAME)
-    transcriber = OpenAITranscriber()
-    # Keep the main thread alive to prevent immediate exit
+    async def main():
+        transcriber = OpenAITranscriber(None)
+        await transcriber.initialize_websockets()
+        try:
+            #print("Transcription running. Press Ctrl+C to exit...")
+            await transcriber.reader_task
+        finally:
+            #print("Stopping transcription...")
+            await transcriber.stop_transcription()
+
     try:
-        #print("Transcription running. Press Ctrl+C to exit...")
-        #log("Transcription running. Press Ctrl+C to exit...", LOG_FILENAME)
-        while True:
-            time.sleep(2.5)
+        asyncio.run(main())
     except KeyboardInterrupt:
-        #print("Stopping transcription...")
-        #log("Stopping transcription...", LOG_FILENAME)
-        transcriber.stop_transcription()
+        pass
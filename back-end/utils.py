@@ -1,6 +1,9 @@
-import base64
 import json
-import struct
+from audio_codec import (
+    apply_gain,
+    encode_pcm16_base64,
+    float_to_pcm16
+)
 
 # def resetb64():
 #     file = open("b64audio.txt", "w")
@@ -26,18 +29,13 @@ import struct
 #             text = str(text)
 #         file.write(text + '\n')
         
-def amplify_audio(audio_data, gain=3.0):
-    """Amplify audio by multiplying by gain factor and clipping to prevent distortion"""
-    amplified = audio_data * gain
-    # Clipping is handled by the caller functions
-    return amplified
+def amplify_audio(audio_data, gain=3.0, out=None):
+    """Amplify audio by multiplying by gain factor and clipping to prevent distortion.
+    Pass out=audio_data to amplify in place."""
+    return apply_gain(audio_data, gain, out=out)
 
 def float_to_16bit_pcm(float32_array):
-    clipped = [max(-1.0, min(1.0, x)) for x in float32_array]
-    pcm16 = b''.join(struct.pack('<h', int(x * 32767)) for x in clipped)
-    return pcm16
+    return float_to_pcm16(float32_array).tobytes()
 
 def base64_encode_audio(float32_array):
-    pcm_bytes = float_to_16bit_pcm(float32_array)
-    encoded = base64.b64encode(pcm_bytes).decode('ascii')
-    return encoded
\ No newline at end of file
+    return encode_pcm16_base64(float_to_pcm16(float32_array))
\ No newline at end of file
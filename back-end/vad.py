@@ -0,0 +1,115 @@
+import time
+from collections import deque
+import numpy as np
+
+class VoiceActivityGate:
+    """
+    Local VAD that keeps silence from being streamed upstream. Each chunk is
+    cut into frame_ms frames; per-frame RMS energy (dBFS) and zero-crossing
+    rate are computed in one vectorized pass. A frame counts as speech when
+    it is above energy_db with a speech-like zero-crossing rate, or clearly
+    louder than the threshold.
+
+    The gate opens after min_speech_frames speech frames and first releases
+    the last prefix_padding_ms of held-back audio, matching the session's
+    turn_detection.prefix_padding_ms. It stays open for hangover_ms after
+    the last speech frame. That must be longer than the server VAD's
+    silence_duration_ms so upstream still sees the end of the turn.
+    """
+
+    def __init__(self, sample_rate, frame_ms=20, energy_db=-45.0, zcr_max=0.5,
+                 hangover_ms=800, prefix_padding_ms=300, min_speech_frames=2):
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
+        self.frame_samples = sample_rate * frame_ms // 1000
+        self.energy_db = energy_db
+        self.zcr_max = zcr_max
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        self.min_speech_frames = min_speech_frames
+        self.prefix = deque(maxlen=max(1, prefix_padding_ms // frame_ms))
+        self.open = False
+        self.hangover = 0
+        self.speech_run = 0
+        self.bytes_in = 0
+        self.bytes_forwarded = 0
+        # Silence that was never sent: frames that fell out of the prefix unreleased
+        self.bytes_dropped = 0
+        self.speech_onsets = 0
+        # From receiving the first speech frame of a run to returning it for upstream
+        self.last_onset_latency_ms = None
+        self._run_started_at = None
+        self._remainder = b""
+
+    def classify(self, samples):
+        """Return a bool per complete frame in samples (int16), True for speech."""
+        n_frames = samples.shape[0] // self.frame_samples
+        frames = samples[:n_frames * self.frame_samples].reshape(n_frames, self.frame_samples)
+        frames = frames.astype(np.float32) * (1.0 / 32768)
+        rms = np.sqrt(np.mean(frames * frames, axis=1)) + 1e-10
+        energy_db = 20 * np.log10(rms)
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / self.frame_samples
+        return (energy_db > self.energy_db + 10) | ((energy_db > self.energy_db) & (zcr < self.zcr_max))
+
+    def process(self, pcm):
+        """Take a chunk of PCM16 bytes, return the bytes that should go upstream (may be empty)."""
+        received_at = time.perf_counter()
+        data = self._remainder + bytes(pcm)
+        self.bytes_in += len(pcm)
+        frame_bytes = self.frame_samples * 2
+        n_frames = len(data) // frame_bytes
+        self._remainder = data[n_frames * frame_bytes:]
+        if n_frames == 0:
+            return b""
+
+        speech = self.classify(np.frombuffer(data, dtype=np.int16, count=n_frames * self.frame_samples))
+        forward = []
+        opened = False
+        for i in range(n_frames):
+            frame = data[i * frame_bytes:(i + 1) * frame_bytes]
+            if speech[i]:
+                self.speech_run += 1
+                if self.speech_run == 1:
+                    self._run_started_at = received_at
+                self.hangover = self.hangover_frames
+            else:
+                self.speech_run = 0
+
+            if self.open:
+                forward.append(frame)
+                if not speech[i]:
+                    self.hangover -= 1
+                    if self.hangover <= 0:
+                        self.open = False
+            elif self.speech_run >= self.min_speech_frames:
+                self.open = True
+                opened = True
+                self.speech_onsets += 1
+                # The prefix already holds the earlier speech frames of this run
+                forward.extend(self.prefix)
+                forward.append(frame)
+                self.prefix.clear()
+            else:
+                if len(self.prefix) == self.prefix.maxlen:
+                    self.bytes_dropped += len(self.prefix[0])
+                self.prefix.append(frame)
+
+        forwarded = b"".join(forward)
+        self.bytes_forwarded += len(forwarded)
+        if opened:
+            self.last_onset_latency_ms = (time.perf_counter() - self._run_started_at) * 1000
+        return forwarded
+
+    def buffered_bytes(self):
+        """Audio held back for the prefix and the partial frame."""
+        return sum(len(frame) for frame in self.prefix) + len(self._remainder)
+
+    def stats(self):
+        return {
+            "bytes_in": self.bytes_in,
+            "bytes_forwarded": self.bytes_forwarded,
+            "bytes_saved": self.bytes_in - self.bytes_forwarded - len(self._remainder),
+            "bytes_dropped": self.bytes_dropped,
+            "speech_onsets": self.speech_onsets,
+            "last_onset_latency_ms": self.last_onset_latency_ms
+        }
@@ -3,6 +3,13 @@ import { useEffect, useRef, useState } from "react";
 import Image from "next/image";
 import styles from "./page.module.css";
 
+// Send and receive audio as binary frames (8-byte header + raw PCM16) instead of base64 JSON
+const USE_BINARY_AUDIO = true;
+const FRAME_HEADER_SIZE = 8;
+const FRAME_VERSION = 1;
+const FRAME_AUDIO_INPUT = 1;
+const FRAME_AUDIO_OUTPUT = 2;
+
 export default function Home() {
   const [isRecording, setIsRecording] = useState(false);
   const [logMessages, setLogMessages] = useState([]);
@@ -21,6 +28,18 @@ export default function Home() {
   // Audio queue and playback state
   const audioQueueRef = useRef([]);
   const isPlayingRef = useRef(false);
+  // Streaming playback state: chunks are scheduled back to back on one context
+  const playbackContextRef = useRef(null);
+  const nextPlayTimeRef = useRef(0);
+  const streamResponseIdRef = useRef(null);
+  const streamNextSeqRef = useRef(0);
+  const streamPendingRef = useRef(new Map());
+  // Everything currently scheduled or playing, so barge-in can silence it at once
+  const activeSourcesRef = useRef(new Set());
+  const legacySourceRef = useRef(null);
+  const binaryAudioRef = useRef(false);
+  const outputSampleRateRef = useRef(24000);
+  const inputSeqRef = useRef(0);
 
   const log = (message) => {
     console.log(`[${new Date().toLocaleTimeString()}] ${message}`);
@@ -87,22 +106,57 @@ export default function Home() {
       catch(error){
         log(`WebSocket connection error: ${error.message}`);
       }
-      socketRef.current = new WebSocket('wss://hospitalreceptionist.axonbuild.com/ws');
+      const wsUrl = 'wss://hospitalreceptionist.axonbuild.com/ws';
+      socketRef.current = new WebSocket(USE_BINARY_AUDIO ? `${wsUrl}?binary=1` : wsUrl);
+      socketRef.current.binaryType = "arraybuffer";
       socketRef.current.onmessage = (event) => {
+        if (event.data instanceof ArrayBuffer) {
+          handleBinaryFrame(event.data);
+          return;
+        }
         log(`Received WebSocket message: ${event.data.substring(0, 50)}...`);
         try {
           const data = JSON.parse(event.data);
           log(`Parsed data: ${JSON.stringify(data, null, 2)}`);
 
+          if (data.event_type === "protocol_selected" && data.event_data === "binary") {
+            binaryAudioRef.current = true;
+            outputSampleRateRef.current = data.sample_rate || 24000;
+            log("Server accepted binary audio frames");
+          }
+
           if (data.event_type === "checking connectivity" && data.event_data === "connection established") {
             setConnectionReady(true);
             log("Server connection confirmed - ready to record");
             getEphemeralKey();
           }
 
+          if (data.event_type === "checking connectivity" && data.event_data === "connection failed") {
+            setConnectionReady(false);
+            log("Server could not reach the voice service - reload to try again");
+          }
+
           if (data.event_type === "audio_response_transmitting") {
             handleAudioResponse(data.event_data);
           }
+
+          if (data.event_type === "audio_response_chunk") {
+            handleAudioChunk(data);
+          }
+
+          if (data.event_type === "audio_response_done") {
+            log(`Audio stream ${data.response_id} finished after ${data.seq} chunks`);
+          }
+
+          if (data.event_type === "audio_flush") {
+            // The caller started talking over the answer
+            flushPlayback();
+            socketRef.current.send(JSON.stringify({
+              event_type: "audio_flushed",
+              response_id: data.response_id
+            }));
+            log(`Playback flushed for barge-in (${data.response_id})`);
+          }
         } catch (e) {
           log(`Error handling message: ${e.message}`);
         }
@@ -114,6 +168,7 @@ export default function Home() {
 
       socketRef.current.onclose = (event) => {
         log(`WebSocket closed: ${event.code} ${event.reason}`);
+        setConnectionReady(false);
       };
 
       log("WebSockets initialized - waiting for confirmation");
@@ -233,6 +288,10 @@ export default function Home() {
           if (socketRef.current?.readyState === WebSocket.OPEN) {
             const inputData = e.inputBuffer.getChannelData(0);
             const pcm16 = float32ToInt16(inputData);
+            if (binaryAudioRef.current) {
+              socketRef.current.send(packInputFrame(pcm16));
+              return;
+            }
             const base64data = btoa(
               String.fromCharCode.apply(null, new Uint8Array(pcm16.buffer))
             );
@@ -306,17 +365,19 @@ export default function Home() {
           const source = audioContext.createBufferSource();
           source.buffer = audioBuffer;
           
-          // IMPORTANT: Set the playback rate to ensure correct speed
-          source.playbackRate.value = 1.5;
+          // The server resamples responses to 16 kHz, so play at normal speed
+          source.playbackRate.value = 1.0;
           
           // Connect to destination and play
           source.connect(audioContext.destination);
           
           source.onended = () => {
             log("Audio playback finished");
+            legacySourceRef.current = null;
             playNextAudio();
           };
           
+          legacySourceRef.current = source;
           source.start(0);
           log("Audio playback started successfully");
         },
@@ -350,6 +411,121 @@ export default function Home() {
       log("Currently playing audio, new audio added to queue and will play when current audio finishes");
     }
   };
+  const base64ToInt16 = (base64Data) => {
+    const binaryString = atob(base64Data);
+    const bytes = new Uint8Array(binaryString.length);
+    for (let i = 0; i < binaryString.length; i++) {
+      bytes[i] = binaryString.charCodeAt(i);
+    }
+    return new Int16Array(bytes.buffer, 0, bytes.length >> 1);
+  };
+
+  const packInputFrame = (pcm16) => {
+    const frame = new ArrayBuffer(FRAME_HEADER_SIZE + pcm16.byteLength);
+    const header = new DataView(frame);
+    header.setUint8(0, FRAME_VERSION);
+    header.setUint8(1, FRAME_AUDIO_INPUT);
+    header.setUint16(2, 0, true);
+    header.setUint32(4, inputSeqRef.current++, true);
+    new Int16Array(frame, FRAME_HEADER_SIZE).set(pcm16);
+    return frame;
+  };
+
+  const handleBinaryFrame = (buffer) => {
+    if (buffer.byteLength < FRAME_HEADER_SIZE) {
+      return;
+    }
+    const header = new DataView(buffer);
+    if (header.getUint8(0) !== FRAME_VERSION || header.getUint8(1) !== FRAME_AUDIO_OUTPUT) {
+      return;
+    }
+    handleAudioChunk({
+      response_id: header.getUint16(2, true),
+      seq: header.getUint32(4, true),
+      samples: new Int16Array(buffer.slice(FRAME_HEADER_SIZE)),
+      sample_rate: outputSampleRateRef.current
+    });
+  };
+
+  const scheduleChunk = (samples, sampleRate) => {
+    if (!playbackContextRef.current || playbackContextRef.current.state === 'closed') {
+      playbackContextRef.current = new (window.AudioContext || window.webkitAudioContext)();
+      nextPlayTimeRef.current = 0;
+    }
+    const audioContext = playbackContextRef.current;
+    if (samples.length === 0) {
+      return;
+    }
+
+    const audioBuffer = audioContext.createBuffer(1, samples.length, sampleRate);
+    const channel = audioBuffer.getChannelData(0);
+    for (let i = 0; i < samples.length; i++) {
+      channel[i] = samples[i] / 0x7FFF;
+    }
+
+    const source = audioContext.createBufferSource();
+    source.buffer = audioBuffer;
+    source.connect(audioContext.destination);
+
+    // Start each chunk exactly where the previous one ends so there are no gaps
+    const startAt = Math.max(audioContext.currentTime, nextPlayTimeRef.current);
+    activeSourcesRef.current.add(source);
+    source.onended = () => activeSourcesRef.current.delete(source);
+    source.start(startAt);
+    nextPlayTimeRef.current = startAt + audioBuffer.duration;
+  };
+
+  const flushPlayback = () => {
+    audioQueueRef.current = [];
+    if (legacySourceRef.current) {
+      legacySourceRef.current.onended = null;
+      try {
+        legacySourceRef.current.stop();
+      } catch (e) {}
+      legacySourceRef.current = null;
+    }
+    isPlayingRef.current = false;
+
+    activeSourcesRef.current.forEach((source) => {
+      try {
+        source.stop();
+      } catch (e) {}
+    });
+    activeSourcesRef.current.clear();
+    nextPlayTimeRef.current = 0;
+    streamResponseIdRef.current = null;
+    streamPendingRef.current = new Map();
+  };
+
+  const handleAudioChunk = (data) => {
+    if (data.response_id !== streamResponseIdRef.current) {
+      streamResponseIdRef.current = data.response_id;
+      streamNextSeqRef.current = 0;
+      streamPendingRef.current = new Map();
+    }
+
+    // The socket is ordered, so a gap means the server dropped chunks for a slow
+    // connection; skip ahead rather than wait for chunks that will never come
+    if (data.seq > streamNextSeqRef.current && !streamPendingRef.current.has(streamNextSeqRef.current)) {
+      log(`Skipped ${data.seq - streamNextSeqRef.current} dropped audio chunks`);
+      streamNextSeqRef.current = data.seq;
+    }
+
+    // Chunks may arrive out of order, so only play the contiguous run from nextSeq
+    streamPendingRef.current.set(data.seq, data);
+    while (streamPendingRef.current.has(streamNextSeqRef.current)) {
+      const chunk = streamPendingRef.current.get(streamNextSeqRef.current);
+      streamPendingRef.current.delete(streamNextSeqRef.current);
+      try {
+        const samples = chunk.samples || base64ToInt16(chunk.event_data);
+        scheduleChunk(samples, chunk.sample_rate || 24000);
+      } catch (error) {
+        log(`Error scheduling audio chunk ${chunk.seq}: ${error.message}`);
+      }
+      streamNextSeqRef.current += 1;
+    }
+  };
+
   // Improved WAV creation function with correct sample rate
   const createWavFromPCM = (pcmData) => {
     const numChannels = 1;